@@ -0,0 +1,82 @@
+import os
+
+import streamlit as st
+
+import profiling
+
+
+# ================= 管理员页面 =================
+# 通过 ?admin=<token> 访问，token 取自环境变量 SCORE_ADMIN_TOKEN 或 secrets 的 [admin] token。
+# 评分员看不到入口；未配置 token 时页面完全关闭。
+
+def get_admin_token():
+    token = os.environ.get("SCORE_ADMIN_TOKEN")
+    if token:
+        return token
+    try:
+        return st.secrets.get("admin", {}).get("token")
+    except Exception:
+        # 本地版可能没有 secrets.toml
+        return None
+
+
+def is_admin_request():
+    token = get_admin_token()
+    return bool(token) and st.query_params.get("admin") == token
+
+
+def _bucket_label(i, upper):
+    if upper == float("inf"):
+        return f"{i:02d} >{profiling.BUCKETS_MS[i - 1]}ms"
+    return f"{i:02d} ≤{upper}ms"
+
+
+def render_timings(window_s):
+    if not profiling.ENABLED:
+        st.info("计时未开启：以环境变量 SCORE_PROFILE=1 启动后，这里会显示各环节的耗时分布。")
+        return
+
+    summary = profiling.recorder.summary(window_s)
+    if not summary:
+        st.write("统计窗口内还没有数据。")
+        return
+
+    st.dataframe(
+        [
+            {"环节": name, "次数": s["count"], "均值(ms)": round(s["mean_ms"], 2), "p50": round(s["p50_ms"], 2),
+             "p95": round(s["p95_ms"], 2), "p99": round(s["p99_ms"], 2), "最大": round(s["max_ms"], 2)}
+            for name, s in summary.items()
+        ],
+        hide_index=True,
+    )
+
+    import pandas as pd
+    for name, s in summary.items():
+        with st.expander(f"{name} 耗时分布"):
+            labels = [_bucket_label(i, upper) for i, upper in enumerate(s["histogram"])]
+            st.bar_chart(pd.DataFrame({"次数": list(s["histogram"].values())}, index=labels))
+
+
+def render_admin_page(metrics=None):
+    """
+    metrics: {标题: 返回 dict 或 list 的函数}，各脚本把自己的连接池 / 队列 / 缓存指标传进来；
+    返回 list（每行一个 dict）时按表格显示。
+    """
+    st.title("🛠️ 运行状态")
+    window_s = st.selectbox("统计窗口", [60, 300, 900, 3600], index=1, format_func=lambda s: f"最近 {s // 60} 分钟")
+
+    st.subheader("热路径耗时")
+    render_timings(window_s)
+    if profiling.DUMP_PATH:
+        st.caption(f"原始记录同时写入 {profiling.DUMP_PATH} (JSON lines)")
+
+    for title, fn in (metrics or {}).items():
+        st.subheader(title)
+        try:
+            value = fn()
+            if isinstance(value, list):
+                st.dataframe(value, hide_index=True)
+            else:
+                st.json(value)
+        except Exception as e:
+            st.error(f"{title} 读取失败: {e}")
@@ -1,300 +1,254 @@
-import streamlit as st
-import mysql.connector
-import random
-import os
-import time
-from datetime import datetime
-
-# ================= 配置区域 =================
-# 阿里云 OSS 图片前缀
-CLOUD_BASE_URL = "https://score-1.oss-cn-beijing.aliyuncs.com/Image_3600/"
-
-
-# ================= 1. 数据库连接 (MySQL/TiDB) =================
-
-def get_db_connection():
-    # 从 Streamlit Secrets 读取配置
-    db_config = st.secrets["connections"]["tidb"]
-
-    return mysql.connector.connect(
-        host=db_config["host"],
-        user=db_config["user"],
-        password=db_config["password"],
-        port=db_config["port"],
-        database=db_config["database"],
-        autocommit=True  # 自动提交事务
-    )
-
-
-def init_db():
-    """初始化数据库表"""
-    conn = get_db_connection()
-    c = conn.cursor()
-    # MySQL 建表语法
-    c.execute('''
-              CREATE TABLE IF NOT EXISTS annotations
-              (
-                  user_id
-                  VARCHAR
-              (
-                  50
-              ),
-                  group_id VARCHAR
-              (
-                  50
-              ),
-                  image_name VARCHAR
-              (
-                  255
-              ),
-                  score_content INT,
-                  score_aesthetic INT,
-                  score_quality INT,
-                  timestamp DATETIME,
-                  PRIMARY KEY
-              (
-                  user_id,
-                  image_name
-              )
-                  )
-              ''')
-    conn.close()
-
-
-# 初始化运行一次
-try:
-    init_db()
-except Exception as e:
-    st.error(f"数据库连接失败，请检查 Secrets 配置。错误信息: {e}")
-
-
-# ================= 2. 核心逻辑功能 =================
-
-def get_cloud_image_list(user_id, group_id_str):
-    """读取 Github 上的 image_names.txt"""
-    txt_file = "image_names.txt"
-    if not os.path.exists(txt_file):
-        st.error("❌ 找不到 image_names.txt")
-        return []
-
-    with open(txt_file, "r", encoding="utf-8") as f:
-        all_images = [line.strip() for line in f.readlines()]
-
-    # 分组逻辑
-    target_folder = group_id_str.replace(" ", "_")  # Group 1 -> Group_1
-    current_group_images = [img for img in all_images if img.startswith(target_folder + "/")]
-
-    if not current_group_images:
-        return []
-
-    # 随机打乱
-    seed_val = sum(ord(c) for c in user_id)
-    rng = random.Random(seed_val)
-    rng.shuffle(current_group_images)
-
-    return current_group_images
-
-
-def get_completed_images(user_id):
-    """从 MySQL 读取该用户已完成的图片"""
-    try:
-        conn = get_db_connection()
-        c = conn.cursor()
-        # 注意：MySQL 占位符是 %s
-        c.execute("SELECT image_name FROM annotations WHERE user_id = %s", (user_id,))
-        result = {row[0] for row in c.fetchall()}
-        conn.close()
-        return result
-    except Exception as e:
-        return set()
-
-
-def save_to_db(user_id, group_id, img_path, s1, s2, s3):
-    timestamp = datetime.now().strftime("%Y-%m-%d %H:%M:%S")
-    conn = None
-    try:
-        conn = get_db_connection()
-        c = conn.cursor()
-
-        # MySQL 的 "INSERT OR REPLACE" 写法是 "REPLACE INTO"
-        query = """
-                REPLACE \
-                INTO annotations 
-            (user_id, group_id, image_name, score_content, score_aesthetic, score_quality, timestamp)
-            VALUES ( \
-                %s, \
-                %s, \
-                %s, \
-                %s, \
-                %s, \
-                %s, \
-                %s \
-                ) \
-                """
-        values = (user_id, group_id, img_path, s1, s2, s3, timestamp)
-
-        c.execute(query, values)
-        # 因为设置了 autocommit=True，所以不需要 conn.commit()
-        return True
-    except Exception as e:
-        st.error(f"保存失败: {e}")
-        return False
-    finally:
-        if conn and conn.is_connected():
-            conn.close()
-
-
-# ================= 3. 交互检测与 UI (保持不变) =================
-
-def mark_content_touched(): st.session_state['touched_content'] = True
-
-
-def mark_aesthetic_touched(): st.session_state['touched_aesthetic'] = True
-
-
-def mark_quality_touched(): st.session_state['touched_quality'] = True
-
-
-@st.dialog("⚠️ 还有未确认的评分")
-def show_warning_dialog():
-    st.write("为了保证实验数据的有效性，**所有三个维度**都必须经过您的确认。")
-    st.warning("检测到您有滑块未被移动过。")
-    st.write("即使您认为 50 分是合适的，也请**轻微拖动一下滑块**（例如拖到 51 再拖回 50），让系统确认您已思考过。")
-    if st.button("我明白了，去修改", type="primary"):
-        st.rerun()
-
-
-def render_blind_slider(label, key, touch_callback):
-    st.markdown(f"#### {label}")
-    current_val = st.session_state.get(key, 50)
-    rating_text = ""
-    if 0 <= current_val <= 20:
-        rating_text = "极差"
-    elif 21 <= current_val <= 40:
-        rating_text = "差"
-    elif 41 <= current_val <= 60:
-        rating_text = "中等"
-    elif 61 <= current_val <= 80:
-        rating_text = "好"
-    elif 81 <= current_val <= 100:
-        rating_text = "极好"
-    st.markdown(f"<div class='current-rating'>当前评价: {rating_text}</div>", unsafe_allow_html=True)
-    val = st.slider(label, 0, 100, key=key, label_visibility="collapsed", on_change=touch_callback, format=" ")
-    html_oneline = "<div style='position: relative; width: 100%; height: 30px; margin-top: -25px; font-size: 0.8rem; color: #888; line-height: 1.1; pointer-events: none;'><div style='position: absolute; left: 0%; transform: translateX(-50%); text-align: center; white-space: nowrap;'>|<br>极差</div><div style='position: absolute; left: 25%; transform: translateX(-50%); text-align: center; white-space: nowrap;'>|<br>差</div><div style='position: absolute; left: 50%; transform: translateX(-50%); text-align: center; white-space: nowrap;'>|<br>中等</div><div style='position: absolute; left: 75%; transform: translateX(-50%); text-align: center; white-space: nowrap;'>|<br>好</div><div style='position: absolute; left: 100%; transform: translateX(-50%); text-align: center; white-space: nowrap;'>|<br>极好</div></div>"
-    st.markdown(html_oneline, unsafe_allow_html=True)
-    return val
-
-
-# ================= 5. 主程序 =================
-
-def main():
-    st.set_page_config(page_title="Underwater Aesthetics", layout="wide")
-    st.markdown("""
-        <style>
-        header[data-testid="stHeader"] { display: none !important; }
-        div[data-testid="stThumbValue"], div[data-testid="stTickBarMin"], div[data-testid="stTickBarMax"] { opacity: 0 !important; display: none !important; }
-        .current-rating { font-size: 1.1rem; font-weight: bold; color: #FF4B4B; margin-bottom: 5px; }
-        .block-container { padding-top: 20px !important; padding-bottom: 2rem !important; }
-        div[data-testid="stImage"] { display: flex; justify-content: center; }
-        </style>
-    """, unsafe_allow_html=True)
-
-    with st.sidebar:
-        st.title("🌊 实验登录")
-        user_id = st.text_input("User ID", placeholder="输入编号 (如 User_01)").strip()
-        group_id_ui = st.selectbox("Select Group", [f"Group {i}" for i in range(1, 7)])
-        st.info("⚠️ 注意：必须滑动所有三个滑块才能提交。")
-
-    if not user_id:
-        st.title("👋 欢迎参加实验")
-        st.write("请在左侧侧边栏输入 ID 并选择分组。")
-        return
-
-    session_key = f"{user_id}_{group_id_ui}"
-    if 'session_key' not in st.session_state or st.session_state['session_key'] != session_key:
-        st.session_state['session_key'] = session_key
-        img_list = get_cloud_image_list(user_id, group_id_ui)
-        st.session_state['image_list'] = img_list
-        if not img_list: st.stop()
-
-        completed = get_completed_images(user_id)
-        start_idx = 0
-        for idx, name in enumerate(img_list):
-            if name not in completed:
-                start_idx = idx
-                break
-        if len(img_list) > 0 and start_idx == 0 and img_list[0] in completed:
-            start_idx = len(img_list) - 1
-        st.session_state['current_index'] = start_idx
-        st.session_state['s_content'] = 50
-        st.session_state['s_aesthetic'] = 50
-        st.session_state['s_quality'] = 50
-        st.session_state['touched_content'] = False
-        st.session_state['touched_aesthetic'] = False
-        st.session_state['touched_quality'] = False
-
-    img_list = st.session_state['image_list']
-    idx = st.session_state['current_index']
-
-    if idx >= len(img_list):
-        st.success("🎉 本组实验已全部完成！")
-        return
-
-    current_img_rel_path = img_list[idx]
-
-    try:
-        full_image_url = CLOUD_BASE_URL + current_img_rel_path
-        col1, col2, col3 = st.columns([1, 1, 1])
-        with col2:
-            st.image(full_image_url, width=300)
-    except Exception as e:
-        st.error(f"Error loading image: {e}")
-
-    st.markdown("---")
-
-    with st.container():
-        c1, spacer1, c2, spacer2, c3 = st.columns([10, 1, 10, 1, 10])
-        with c1: render_blind_slider("1. 内容 (Content)", "s_content", mark_content_touched)
-        with spacer1: st.empty()
-        with c2: render_blind_slider("2. 美学 (Aesthetics)", "s_aesthetic", mark_aesthetic_touched)
-        with spacer2: st.empty()
-        with c3: render_blind_slider("3. 质量 (Quality)", "s_quality", mark_quality_touched)
-
-    st.markdown("---")
-
-    def next_action():
-        if not (st.session_state.get('touched_content', False) and st.session_state.get('touched_aesthetic',
-                                                                                        False) and st.session_state.get(
-                'touched_quality', False)):
-            show_warning_dialog()
-            return
-
-        with st.spinner("正在保存数据..."):
-            saved = save_to_db(user_id, group_id_ui, current_img_rel_path, st.session_state['s_content'],
-                               st.session_state['s_aesthetic'], st.session_state['s_quality'])
-
-        if saved:
-            if st.session_state['current_index'] < len(img_list) - 1:
-                st.session_state['current_index'] += 1
-                st.session_state['s_content'] = 50
-                st.session_state['s_aesthetic'] = 50
-                st.session_state['s_quality'] = 50
-                st.session_state['touched_content'] = False
-                st.session_state['touched_aesthetic'] = False
-                st.session_state['touched_quality'] = False
-            else:
-                st.balloons()
-
-    def prev_action():
-        if st.session_state['current_index'] > 0:
-            st.session_state['current_index'] -= 1
-
-    b1, b2, b3 = st.columns([1, 2, 1])
-    with b1:
-        if idx > 0: st.button("⬅️ 上一张", on_click=prev_action, use_container_width=True)
-    with b3:
-        st.button("下一张 ➡️", on_click=next_action, type="primary", use_container_width=True)
-
-
-if __name__ == "__main__":
-    main()
\ No newline at end of file
+import streamlit as st
+import os
+import time
+
+import dwell
+from admin_page import is_admin_request, render_admin_page
+from dedup import new_request_id
+from manifest import get_group_images
+from ordering import get_ordering_service
+from prefetch import get_prefetcher, render_prefetch
+from profiling import timed
+from progress_store import get_progress_store
+from storage import get_storage
+
+# ================= 配置区域 =================
+# 阿里云 OSS 图片前缀
+# 可用环境变量 SCORE_IMAGE_BASE_URL 指向本地缓存代理 (image_proxy.py)，以 / 结尾
+CLOUD_BASE_URL = os.environ.get("SCORE_IMAGE_BASE_URL", "https://score-1.oss-cn-beijing.aliyuncs.com/Image_3600/")
+# 预加载后续图片的张数，0 表示关闭
+PREFETCH_DEPTH = 3
+
+
+# ================= 1. 数据库连接 (MySQL/TiDB) =================
+
+@timed()
+def init_db():
+    """存储后端按配置选择（默认 MySQL/TiDB），每个进程只创建一次并补跑迁移"""
+    return get_storage()
+
+
+# 初始化运行一次
+try:
+    init_db()
+except Exception as e:
+    st.error(f"数据库连接失败，请检查 Secrets 配置。错误信息: {e}")
+
+
+# ================= 2. 核心逻辑功能 =================
+
+@timed()
+def get_cloud_image_list(user_id, group_id_str):
+    """从 image_names.txt 的分组索引中取出本组图片"""
+    txt_file = "image_names.txt"
+    if not os.path.exists(txt_file):
+        st.error("❌ 找不到 image_names.txt")
+        return []
+
+    # 分组逻辑
+    target_folder = group_id_str.replace(" ", "_")  # Group 1 -> Group_1
+    # 清单按分组建好索引并跨会话缓存；每个评分员的顺序由 ordering 计算并缓存
+    current_group_images = get_group_images(target_folder, txt_file)
+
+    if not current_group_images:
+        return []
+
+    return get_ordering_service().order(user_id, group_id_str, current_group_images, get_storage())
+
+
+@timed()
+def save_to_db(user_id, group_id, img_path, s1, s2, s3, request_id, dwell_ms=None):
+    """
+    经后台写入线程保存，与 app.py 共用同一条写路径（含增量统计）。
+    request_id 相同的重复提交会被丢弃，见 dedup.py；dwell_ms 见 dwell.py。
+    """
+    timestamp, submitted_us = dwell.submission_time()
+    try:
+        if get_storage().submit((user_id, group_id, img_path, s1, s2, s3, timestamp, request_id, dwell_ms, submitted_us)):
+            return True
+        st.warning("这次提交与之前的重复，已忽略（请勿连续点击）。")
+        return False
+    except Exception as e:
+        st.error(f"保存失败: {e}")
+        return False
+
+
+# ================= 3. 交互检测与 UI (保持不变) =================
+
+def mark_content_touched(): st.session_state['touched_content'] = True
+
+
+def mark_aesthetic_touched(): st.session_state['touched_aesthetic'] = True
+
+
+def mark_quality_touched(): st.session_state['touched_quality'] = True
+
+
+@st.dialog("⚠️ 还有未确认的评分")
+def show_warning_dialog():
+    st.write("为了保证实验数据的有效性，**所有三个维度**都必须经过您的确认。")
+    st.warning("检测到您有滑块未被移动过。")
+    st.write("即使您认为 50 分是合适的，也请**轻微拖动一下滑块**（例如拖到 51 再拖回 50），让系统确认您已思考过。")
+    if st.button("我明白了，去修改", type="primary"):
+        st.rerun()
+
+
+def render_blind_slider(label, key, touch_callback):
+    st.markdown(f"#### {label}")
+    current_val = st.session_state.get(key, 50)
+    rating_text = ""
+    if 0 <= current_val <= 20:
+        rating_text = "极差"
+    elif 21 <= current_val <= 40:
+        rating_text = "差"
+    elif 41 <= current_val <= 60:
+        rating_text = "中等"
+    elif 61 <= current_val <= 80:
+        rating_text = "好"
+    elif 81 <= current_val <= 100:
+        rating_text = "极好"
+    st.markdown(f"<div class='current-rating'>当前评价: {rating_text}</div>", unsafe_allow_html=True)
+    val = st.slider(label, 0, 100, key=key, label_visibility="collapsed", on_change=touch_callback, format=" ")
+    html_oneline = "<div style='position: relative; width: 100%; height: 30px; margin-top: -25px; font-size: 0.8rem; color: #888; line-height: 1.1; pointer-events: none;'><div style='position: absolute; left: 0%; transform: translateX(-50%); text-align: center; white-space: nowrap;'>|<br>极差</div><div style='position: absolute; left: 25%; transform: translateX(-50%); text-align: center; white-space: nowrap;'>|<br>差</div><div style='position: absolute; left: 50%; transform: translateX(-50%); text-align: center; white-space: nowrap;'>|<br>中等</div><div style='position: absolute; left: 75%; transform: translateX(-50%); text-align: center; white-space: nowrap;'>|<br>好</div><div style='position: absolute; left: 100%; transform: translateX(-50%); text-align: center; white-space: nowrap;'>|<br>极好</div></div>"
+    st.markdown(html_oneline, unsafe_allow_html=True)
+    return val
+
+
+# ================= 5. 主程序 =================
+
+@timed()
+def main():
+    st.set_page_config(page_title="Underwater Aesthetics", layout="wide")
+
+    # 管理员通过 ?admin=<token> 查看运行状态，不进入评分流程
+    if is_admin_request():
+        render_admin_page({
+            "存储后端": lambda: get_storage().metrics(),
+            "图片预加载": lambda: get_prefetcher(PREFETCH_DEPTH).metrics(),
+            "图片顺序": lambda: get_ordering_service().metrics(),
+            "分组评分统计 (本进程)": lambda: get_storage().group_summary(),
+            "评分进度缓存": lambda: get_progress_store().metrics(),
+            "评分质量 (本进程)": lambda: get_storage().quality.report(),
+            "评分时长 (按分组)": lambda: get_storage().timing_report("group_id"),
+            "评分时长 (按评分员)": lambda: get_storage().timing_report("user_id"),
+            "SQL 语句": lambda: get_storage().statement_report(),
+        })
+        return
+    st.markdown("""
+        <style>
+        header[data-testid="stHeader"] { display: none !important; }
+        div[data-testid="stThumbValue"], div[data-testid="stTickBarMin"], div[data-testid="stTickBarMax"] { opacity: 0 !important; display: none !important; }
+        .current-rating { font-size: 1.1rem; font-weight: bold; color: #FF4B4B; margin-bottom: 5px; }
+        .block-container { padding-top: 20px !important; padding-bottom: 2rem !important; }
+        div[data-testid="stImage"] { display: flex; justify-content: center; }
+        </style>
+    """, unsafe_allow_html=True)
+
+    with st.sidebar:
+        st.title("🌊 实验登录")
+        user_id = st.text_input("User ID", placeholder="输入编号 (如 User_01)").strip()
+        group_id_ui = st.selectbox("Select Group", [f"Group {i}" for i in range(1, 7)])
+        st.info("⚠️ 注意：必须滑动所有三个滑块才能提交。")
+
+    if not user_id:
+        st.title("👋 欢迎参加实验")
+        st.write("请在左侧侧边栏输入 ID 并选择分组。")
+        return
+
+    session_key = f"{user_id}_{group_id_ui}"
+    if 'session_key' not in st.session_state or st.session_state['session_key'] != session_key:
+        st.session_state['session_key'] = session_key
+        img_list = get_cloud_image_list(user_id, group_id_ui)
+        st.session_state['image_list'] = img_list
+        if not img_list: st.stop()
+
+        # 位置优先取共享进度表，换副本 / 重启后都能接着评；没有记录时按已完成的图片推算
+        # （只查本组进度，覆盖索引一次往返；写入队列里还没落库的评分也算已完成）
+        start_idx = get_progress_store().get(user_id, group_id_ui)
+        if start_idx is None:
+            _, start_idx = get_storage().resume_state(user_id, group_id_ui, img_list)
+        start_idx = min(start_idx, len(img_list) - 1)
+        st.session_state['current_index'] = start_idx
+        st.session_state['s_content'] = 50
+        st.session_state['s_aesthetic'] = 50
+        st.session_state['s_quality'] = 50
+        st.session_state['touched_content'] = False
+        st.session_state['touched_aesthetic'] = False
+        st.session_state['touched_quality'] = False
+        st.session_state['request_id'] = new_request_id()
+
+    img_list = st.session_state['image_list']
+    idx = st.session_state['current_index']
+
+    if idx >= len(img_list):
+        st.success("🎉 本组实验已全部完成！")
+        return
+
+    current_img_rel_path = img_list[idx]
+    dwell.mark_shown(idx)
+
+    try:
+        full_image_url = CLOUD_BASE_URL + current_img_rel_path
+        col1, col2, col3 = st.columns([1, 1, 1])
+        with col2:
+            st.image(full_image_url, width=300)
+    except Exception as e:
+        st.error(f"Error loading image: {e}")
+
+    # 评当前图时让浏览器先下载后面几张，点"下一张"直接命中缓存
+    render_prefetch(img_list, idx, CLOUD_BASE_URL, PREFETCH_DEPTH)
+
+    st.markdown("---")
+
+    with st.container():
+        c1, spacer1, c2, spacer2, c3 = st.columns([10, 1, 10, 1, 10])
+        with c1: render_blind_slider("1. 内容 (Content)", "s_content", mark_content_touched)
+        with spacer1: st.empty()
+        with c2: render_blind_slider("2. 美学 (Aesthetics)", "s_aesthetic", mark_aesthetic_touched)
+        with spacer2: st.empty()
+        with c3: render_blind_slider("3. 质量 (Quality)", "s_quality", mark_quality_touched)
+
+    st.markdown("---")
+
+    def next_action():
+        if not (st.session_state.get('touched_content', False) and st.session_state.get('touched_aesthetic',
+                                                                                        False) and st.session_state.get(
+                'touched_quality', False)):
+            show_warning_dialog()
+            return
+
+        with st.spinner("正在保存数据..."):
+            saved = save_to_db(user_id, group_id_ui, current_img_rel_path, st.session_state['s_content'],
+                               st.session_state['s_aesthetic'], st.session_state['s_quality'],
+                               st.session_state['request_id'], dwell.dwell_ms(idx))
+
+        if saved:
+            # 每次保存成功都换新的请求 ID：停在最后一张改分再提交不会被当成重复丢弃
+            st.session_state['request_id'] = new_request_id()
+            if st.session_state['current_index'] < len(img_list) - 1:
+                st.session_state['current_index'] += 1
+                get_progress_store().set(user_id, group_id_ui, st.session_state['current_index'])
+                st.session_state['s_content'] = 50
+                st.session_state['s_aesthetic'] = 50
+                st.session_state['s_quality'] = 50
+                st.session_state['touched_content'] = False
+                st.session_state['touched_aesthetic'] = False
+                st.session_state['touched_quality'] = False
+            else:
+                st.balloons()
+
+    def prev_action():
+        if st.session_state['current_index'] > 0:
+            st.session_state['current_index'] -= 1
+            get_progress_store().set(user_id, group_id_ui, st.session_state['current_index'])
+            st.session_state['request_id'] = new_request_id()
+
+    b1, b2, b3 = st.columns([1, 2, 1])
+    with b1:
+        if idx > 0: st.button("⬅️ 上一张", on_click=prev_action, use_container_width=True)
+    with b3:
+        st.button("下一张 ➡️", on_click=next_action, type="primary", use_container_width=True)
+
+
+if __name__ == "__main__":
+    main()
@@ -1,301 +1,385 @@
-import streamlit as st
-import mysql.connector
-import random
-import os
-import time
-from datetime import datetime
-
-# ================= 配置区域 =================
-CLOUD_BASE_URL = "https://score-1.oss-cn-beijing.aliyuncs.com/Image_3600/"
-
-
-# ================= 1. 数据库连接 =================
-
-def get_db_connection():
-    db_config = st.secrets["connections"]["tidb"]
-    return mysql.connector.connect(
-        host=db_config["host"],
-        user=db_config["user"],
-        password=db_config["password"],
-        port=db_config["port"],
-        database=db_config["database"],
-        autocommit=True
-    )
-
-
-def init_db():
-    try:
-        conn = get_db_connection()
-        c = conn.cursor()
-        c.execute('''
-                  CREATE TABLE IF NOT EXISTS annotations
-                  (
-                      user_id
-                      VARCHAR
-                  (
-                      50
-                  ),
-                      group_id VARCHAR
-                  (
-                      50
-                  ),
-                      image_name VARCHAR
-                  (
-                      255
-                  ),
-                      score_content INT,
-                      score_aesthetic INT,
-                      score_quality INT,
-                      timestamp DATETIME,
-                      PRIMARY KEY
-                  (
-                      user_id,
-                      image_name
-                  )
-                      )
-                  ''')
-        conn.close()
-    except Exception as e:
-        print(f"DB Init Error: {e}")
-
-
-try:
-    init_db()
-except Exception as e:
-    st.error(f"数据库连接失败: {e}")
-
-
-# ================= 2. 核心逻辑 =================
-
-def get_cloud_image_list(user_id, group_id_str):
-    txt_file = "image_names.txt"
-    if not os.path.exists(txt_file):
-        st.error("❌ 找不到 image_names.txt")
-        return []
-
-    with open(txt_file, "r", encoding="utf-8") as f:
-        all_images = [line.strip() for line in f.readlines()]
-
-    target_folder = group_id_str.replace(" ", "_")
-    current_group_images = [img for img in all_images if img.startswith(target_folder + "/")]
-
-    if not current_group_images:
-        return []
-
-    seed_val = sum(ord(c) for c in user_id)
-    rng = random.Random(seed_val)
-    rng.shuffle(current_group_images)
-
-    return current_group_images
-
-
-def get_completed_images(user_id):
-    try:
-        conn = get_db_connection()
-        c = conn.cursor()
-        c.execute("SELECT image_name FROM annotations WHERE user_id = %s", (user_id,))
-        result = {row[0] for row in c.fetchall()}
-        conn.close()
-        return result
-    except Exception as e:
-        return set()
-
-
-def save_to_db(user_id, group_id, img_path, s1, s2, s3):
-    timestamp = datetime.now().strftime("%Y-%m-%d %H:%M:%S")
-    conn = None
-    try:
-        conn = get_db_connection()
-        c = conn.cursor()
-        query = """
-                REPLACE \
-                INTO annotations 
-                (user_id, group_id, image_name, score_content, score_aesthetic, score_quality, timestamp)
-                VALUES ( \
-                %s, \
-                %s, \
-                %s, \
-                %s, \
-                %s, \
-                %s, \
-                %s \
-                )
-                """
-        values = (user_id, group_id, img_path, s1, s2, s3, timestamp)
-        c.execute(query, values)
-        return True
-    except Exception as e:
-        st.error(f"保存失败: {e}")
-        return False
-    finally:
-        if conn and conn.is_connected():
-            conn.close()
-
-
-# ================= 3. UI 组件 (无状态渲染) =================
-
-def render_blind_slider(label, unique_key):
-    """
-    渲染滑块。
-    unique_key: 必须是随图片变化的唯一值，这样切图时滑块会自动重置，防止报错。
-    """
-    # 强制文字不换行 CSS
-    st.markdown(f"""
-        <div style="
-            font-size: 1.1rem; 
-            font-weight: 600; 
-            white-space: nowrap; 
-            overflow: visible;
-            margin-bottom: 5px;
-            color: white; 
-        ">
-        {label}
-        </div>
-        """, unsafe_allow_html=True)
-
-    # 这里的 key 是动态的 (例如 s_content_5)，所以每次换图都是一个新控件
-    # 默认值 50，无需手动 session_state 赋值
-    val = st.slider(
-        label, 0, 100, 50,
-        key=unique_key,
-        label_visibility="collapsed",
-        format=" "
-    )
-
-    html_oneline = "<div style='position: relative; width: 100%; height: 30px; margin-top: -25px; font-size: 0.8rem; color: #888; line-height: 1.1; pointer-events: none;'><div style='position: absolute; left: 0%; transform: translateX(-50%); text-align: center; white-space: nowrap;'>|<br>极差</div><div style='position: absolute; left: 25%; transform: translateX(-50%); text-align: center; white-space: nowrap;'>|<br>差</div><div style='position: absolute; left: 50%; transform: translateX(-50%); text-align: center; white-space: nowrap;'>|<br>中等</div><div style='position: absolute; left: 75%; transform: translateX(-50%); text-align: center; white-space: nowrap;'>|<br>好</div><div style='position: absolute; left: 100%; transform: translateX(-50%); text-align: center; white-space: nowrap;'>|<br>极好</div></div>"
-    st.markdown(html_oneline, unsafe_allow_html=True)
-    return val  # 虽然在 Form 里用不到返回值，但保持逻辑完整
-
-
-# ================= 4. 主程序 =================
-
-def main():
-    st.set_page_config(page_title="Underwater Aesthetics", layout="wide")
-
-    st.markdown("""
-        <style>
-        header[data-testid="stHeader"] { display: none !important; }
-        div[data-testid="stThumbValue"], div[data-testid="stTickBarMin"], div[data-testid="stTickBarMax"] { opacity: 0 !important; display: none !important; }
-
-        .block-container { 
-            padding-top: 1rem !important; 
-            padding-bottom: 2rem !important; 
-            max-width: 95% !important; 
-        }
-        div[data-testid="stImage"] { display: flex; justify-content: center; }
-        div[data-testid="column"] { gap: 0.5rem; }
-        div.stButton > button { width: 100%; border-radius: 8px; height: 3em; }
-        </style>
-    """, unsafe_allow_html=True)
-
-    with st.sidebar:
-        st.title("🌊 实验登录")
-        user_id = st.text_input("User ID", placeholder="User_01").strip()
-        group_id_ui = st.selectbox("Select Group", [f"Group {i}" for i in range(1, 7)])
-
-    if not user_id:
-        st.title("👋 欢迎参加实验")
-        st.write("请在左侧侧边栏输入 ID 并选择分组。")
-        return
-
-    session_key = f"{user_id}_{group_id_ui}"
-    if 'session_key' not in st.session_state or st.session_state['session_key'] != session_key:
-        st.session_state['session_key'] = session_key
-        img_list = get_cloud_image_list(user_id, group_id_ui)
-        st.session_state['image_list'] = img_list
-        if not img_list: st.stop()
-
-        completed = get_completed_images(user_id)
-        start_idx = 0
-        for idx, name in enumerate(img_list):
-            if name not in completed:
-                start_idx = idx
-                break
-        if len(img_list) > 0 and start_idx == 0 and img_list[0] in completed:
-            start_idx = len(img_list) - 1
-        st.session_state['current_index'] = start_idx
-
-    img_list = st.session_state['image_list']
-    idx = st.session_state['current_index']
-
-    if idx >= len(img_list):
-        st.success("🎉 本组实验已全部完成！")
-        return
-
-    current_img_rel_path = img_list[idx]
-
-    # --- 图片显示 (Form外) ---
-    try:
-        full_image_url = CLOUD_BASE_URL + current_img_rel_path
-        col1, col2, col3 = st.columns([1, 10, 1])
-        with col2:
-            st.image(full_image_url, width="stretch")
-    except Exception as e:
-        st.error(f"Error loading image: {e}")
-
-    st.markdown("---")
-
-    # --- 评分表单 ---
-    # 使用 Form 解决卡顿问题
-    with st.form(key=f"rating_form_{idx}"):  # Form key 也可以动态，确保完全隔离
-
-        c1, spacer1, c2, spacer2, c3 = st.columns([10, 1, 10, 1, 10])
-
-        # 关键修改：Key 绑定了当前的 idx
-        # 当 idx 改变时，Key 改变，Streamlit 自动创建新滑块（默认值50），无需手动重置！
-        # 从而避免了 StreamlitAPIException
-        k_content = f"s_content_{idx}"
-        k_aesthetic = f"s_aesthetic_{idx}"
-        k_quality = f"s_quality_{idx}"
-
-        with c1:
-            render_blind_slider("1. 内容 (Content)", k_content)
-        with spacer1:
-            st.empty()
-        with c2:
-            render_blind_slider("2. 美学 (Aesthetics)", k_aesthetic)
-        with spacer2:
-            st.empty()
-        with c3:
-            render_blind_slider("3. 质量 (Quality)", k_quality)
-
-        st.write("")
-
-        b1, b2, b3 = st.columns([1, 2, 1])
-        with b1:
-            if idx > 0:
-                prev_clicked = st.form_submit_button("⬅️ 上一张", width="stretch")
-            else:
-                prev_clicked = False
-                st.empty()
-        with b3:
-            next_clicked = st.form_submit_button("下一张 ➡️", type="primary", width="stretch")
-
-    # --- 逻辑处理 ---
-
-    if next_clicked:
-        # 获取当前动态 Key 的值
-        val_content = st.session_state.get(k_content, 50)
-        val_aesthetic = st.session_state.get(k_aesthetic, 50)
-        val_quality = st.session_state.get(k_quality, 50)
-
-        with st.spinner("Saving..."):
-            save_to_db(user_id, group_id_ui, current_img_rel_path,
-                       val_content, val_aesthetic, val_quality)
-
-        if st.session_state['current_index'] < len(img_list) - 1:
-            st.session_state['current_index'] += 1
-            # 注意：这里不需要手动重置 session_state 了！
-            # 因为下一张图的 Key 是 s_content_{idx+1}，是全新的，自动就是 50。
-            st.rerun()
-        else:
-            st.balloons()
-
-    if prev_clicked:
-        if st.session_state['current_index'] > 0:
-            st.session_state['current_index'] -= 1
-            st.rerun()
-
-
-if __name__ == "__main__":
-    main()
\ No newline at end of file
+import streamlit as st
+import os
+import time
+
+import dwell
+from admin_page import is_admin_request, render_admin_page
+from dedup import new_request_id
+from manifest import get_group_images
+from ordering import get_ordering_service
+from prefetch import get_prefetcher, render_prefetch
+from profiling import timed
+from progress_store import get_progress_store
+from session_model import HISTORY_SIZE, RatingSession, evict_widget_keys, session_metrics
+from storage import get_storage
+
+# ================= 配置区域 =================
+# 可用环境变量 SCORE_IMAGE_BASE_URL 指向本地缓存代理 (image_proxy.py)，以 / 结尾
+CLOUD_BASE_URL = os.environ.get("SCORE_IMAGE_BASE_URL", "https://score-1.oss-cn-beijing.aliyuncs.com/Image_3600/")
+# 预加载后续图片的张数，0 表示关闭
+PREFETCH_DEPTH = 3
+# 批量评分：每页显示的图片数，大于 1 时开启（一页只提交一次、一次写入）
+BATCH_SIZE = int(os.environ.get("SCORE_BATCH_SIZE", "1"))
+
+# (滑块标题, session_state 键前缀)
+RATING_DIMENSIONS = [
+    ("1. 内容 (Content)", "s_content"),
+    ("2. 美学 (Aesthetics)", "s_aesthetic"),
+    ("3. 质量 (Quality)", "s_quality"),
+]
+# 按图片下标生成的控件 key 前缀，换图后清理
+INDEXED_KEY_PREFIXES = tuple(prefix for _, prefix in RATING_DIMENSIONS) + ("confirm_50",)
+
+
+# ================= 1. 数据库连接 =================
+
+@timed()
+def init_db():
+    """存储后端按配置选择（默认 MySQL/TiDB），每个进程只创建一次并补跑迁移"""
+    return get_storage()
+
+
+try:
+    init_db()
+except Exception as e:
+    st.error(f"数据库连接失败: {e}")
+
+
+# ================= 2. 核心逻辑 =================
+
+@timed()
+def get_cloud_image_list(user_id, group_id_str):
+    txt_file = "image_names.txt"
+    if not os.path.exists(txt_file):
+        st.error("❌ 找不到 image_names.txt")
+        return []
+
+    target_folder = group_id_str.replace(" ", "_")
+    # 清单按分组建好索引并跨会话缓存；每个评分员的顺序由 ordering 计算并缓存
+    current_group_images = get_group_images(target_folder, txt_file)
+
+    if not current_group_images:
+        return []
+
+    return get_ordering_service().order(user_id, group_id_str, current_group_images, get_storage())
+
+
+@timed()
+def save_to_db(user_id, group_id, img_path, s1, s2, s3, request_id, dwell_ms=None):
+    """
+    交给后台写入线程，立即返回；真正的写入由 write_queue 攒批交给存储后端完成。
+    request_id 相同的重复提交（双击、rerun 重放）会被丢弃，见 dedup.py。
+    dwell_ms: 这张图从显示到提交的毫秒数，见 dwell.py。
+    """
+    timestamp, submitted_us = dwell.submission_time()
+    try:
+        if get_storage().submit((user_id, group_id, img_path, s1, s2, s3, timestamp, request_id, dwell_ms, submitted_us)):
+            return True
+        st.warning("这次提交与之前的重复，已忽略（请勿连续点击）。")
+        return False
+    except Exception as e:
+        st.error(f"保存失败: {e}")
+        return False
+
+
+@timed()
+def save_many_to_db(user_id, group_id, ratings, request_id, dwell_ms=None):
+    """
+    ratings: [(img_path, s1, s2, s3), ...]；整页一起入队，写线程一个事务写完。
+    每条的请求 ID 为 "{request_id}-{页内序号}"；dwell_ms 为整页的停留时间，每条都记同一个值。
+    """
+    timestamp, submitted_us = dwell.submission_time()
+    try:
+        queued = get_storage().submit_many([(user_id, group_id, img_path, s1, s2, s3, timestamp, f"{request_id}-{i}",
+                                             dwell_ms, submitted_us)
+                                            for i, (img_path, s1, s2, s3) in enumerate(ratings)])
+        if queued:
+            return True
+        st.warning("这次提交与之前的重复，已忽略（请勿连续点击）。")
+        return False
+    except Exception as e:
+        st.error(f"保存失败: {e}")
+        return False
+
+
+# ================= 3. UI 组件 (无状态渲染) =================
+
+def render_blind_slider(label, unique_key, value=50):
+    """
+    渲染滑块。
+    unique_key: 必须是随图片变化的唯一值，这样切图时滑块会自动重置，防止报错。
+    value: 初始值；返回上一张时回填之前提交的评分。
+    """
+    # 强制文字不换行 CSS
+    st.markdown(f"""
+        <div style="
+            font-size: 1.1rem; 
+            font-weight: 600; 
+            white-space: nowrap; 
+            overflow: visible;
+            margin-bottom: 5px;
+            color: white; 
+        ">
+        {label}
+        </div>
+        """, unsafe_allow_html=True)
+
+    # 这里的 key 是动态的 (例如 s_content_5)，所以每次换图都是一个新控件
+    # 初始值由参数给出，无需手动 session_state 赋值
+    val = st.slider(
+        label, 0, 100, value,
+        key=unique_key,
+        label_visibility="collapsed",
+        format=" "
+    )
+
+    html_oneline = "<div style='position: relative; width: 100%; height: 30px; margin-top: -25px; font-size: 0.8rem; color: #888; line-height: 1.1; pointer-events: none;'><div style='position: absolute; left: 0%; transform: translateX(-50%); text-align: center; white-space: nowrap;'>|<br>极差</div><div style='position: absolute; left: 25%; transform: translateX(-50%); text-align: center; white-space: nowrap;'>|<br>差</div><div style='position: absolute; left: 50%; transform: translateX(-50%); text-align: center; white-space: nowrap;'>|<br>中等</div><div style='position: absolute; left: 75%; transform: translateX(-50%); text-align: center; white-space: nowrap;'>|<br>好</div><div style='position: absolute; left: 100%; transform: translateX(-50%); text-align: center; white-space: nowrap;'>|<br>极好</div></div>"
+    st.markdown(html_oneline, unsafe_allow_html=True)
+    return val  # 虽然在 Form 里用不到返回值，但保持逻辑完整
+
+
+# ================= 4. 批量评分模式 =================
+
+def render_batch_page(user_id, group_id_ui, rs):
+    """
+    一页显示 BATCH_SIZE 张图，每张三个滑块，放在同一个 st.form 里，
+    拖动滑块不触发 rerun，整页只在提交时 rerun 一次并一次写入。
+    滑块 key 仍按图片下标 (s_content_{i})，与单张模式一致。
+    """
+    img_list, idx = rs.images, rs.index
+    page = img_list[idx:idx + BATCH_SIZE]
+    # 上次提交时仍有滑块停在 50 的图片下标
+    flagged = st.session_state.get('batch_flagged', set())
+
+    st.caption(f"第 {idx + 1}–{idx + len(page)} 张 / 共 {len(img_list)} 张")
+    if flagged:
+        st.warning(f"第 {'、'.join(str(i + 1) for i in sorted(flagged))} 张还有滑块停在默认的 50 分。"
+                   "请拖动确认，或勾选\"确认保留 50 分\"后再提交。")
+
+    with st.form(key=f"batch_form_{idx}"):
+        for offset, rel_path in enumerate(page):
+            i = idx + offset
+            c_img, c_sliders = st.columns([5, 6])
+            with c_img:
+                st.image(CLOUD_BASE_URL + rel_path, caption=f"第 {i + 1} 张", width="stretch")
+            with c_sliders:
+                for (label, prefix), value in zip(RATING_DIMENSIONS, rs.recalled(i)):
+                    render_blind_slider(label, f"{prefix}_{i}", value)
+                if i in flagged:
+                    st.checkbox("确认保留 50 分", key=f"confirm_50_{i}")
+            st.markdown("---")
+
+        b1, b2, b3 = st.columns([1, 2, 1])
+        with b1:
+            if idx > 0:
+                prev_clicked = st.form_submit_button("⬅️ 上一页", width="stretch")
+            else:
+                prev_clicked = False
+                st.empty()
+        with b3:
+            next_clicked = st.form_submit_button("提交本页 ➡️", type="primary", width="stretch")
+
+    # 评本页时让浏览器先下载下一页的前几张
+    render_prefetch(img_list, idx + len(page) - 1, CLOUD_BASE_URL, PREFETCH_DEPTH)
+
+    if next_clicked:
+        ratings = []
+        untouched = set()
+        for offset, rel_path in enumerate(page):
+            i = idx + offset
+            scores = [st.session_state.get(f"{prefix}_{i}", 50) for _, prefix in RATING_DIMENSIONS]
+            # 表单里的滑块不能挂 on_change：仍是默认值 50 的视为未确认，需逐张勾选确认
+            if 50 in scores and not st.session_state.get(f"confirm_50_{i}", False):
+                untouched.add(i)
+            ratings.append((rel_path, *scores))
+
+        if untouched:
+            st.session_state['batch_flagged'] = untouched
+            st.rerun()
+
+        if save_many_to_db(user_id, group_id_ui, ratings, rs.request_id, dwell.dwell_ms(idx)):
+            for offset, (_, *scores) in enumerate(ratings):
+                rs.record(idx + offset, scores)
+            st.session_state['batch_flagged'] = set()
+            rs.move_to(idx + len(page))
+            get_progress_store().set(user_id, group_id_ui, rs.index)
+            st.rerun()
+
+    if prev_clicked:
+        st.session_state['batch_flagged'] = set()
+        rs.move_to(idx - BATCH_SIZE)
+        get_progress_store().set(user_id, group_id_ui, rs.index)
+        st.rerun()
+
+
+# ================= 5. 主程序 =================
+
+@timed()
+def main():
+    st.set_page_config(page_title="Underwater Aesthetics", layout="wide")
+
+    # 管理员通过 ?admin=<token> 查看运行状态，不进入评分流程
+    if is_admin_request():
+        render_admin_page({
+            "存储后端": lambda: get_storage().metrics(),
+            "图片预加载": lambda: get_prefetcher(PREFETCH_DEPTH).metrics(),
+            "图片顺序": lambda: get_ordering_service().metrics(),
+            "分组评分统计 (本进程)": lambda: get_storage().group_summary(),
+            "会话状态": session_metrics,
+            "评分进度缓存": lambda: get_progress_store().metrics(),
+            "评分质量 (本进程)": lambda: get_storage().quality.report(),
+            "评分时长 (按分组)": lambda: get_storage().timing_report("group_id"),
+            "评分时长 (按评分员)": lambda: get_storage().timing_report("user_id"),
+            "SQL 语句": lambda: get_storage().statement_report(),
+        })
+        return
+
+    st.markdown("""
+        <style>
+        header[data-testid="stHeader"] { display: none !important; }
+        div[data-testid="stThumbValue"], div[data-testid="stTickBarMin"], div[data-testid="stTickBarMax"] { opacity: 0 !important; display: none !important; }
+
+        .block-container { 
+            padding-top: 1rem !important; 
+            padding-bottom: 2rem !important; 
+            max-width: 95% !important; 
+        }
+        div[data-testid="stImage"] { display: flex; justify-content: center; }
+        div[data-testid="column"] { gap: 0.5rem; }
+        div.stButton > button { width: 100%; border-radius: 8px; height: 3em; }
+        </style>
+    """, unsafe_allow_html=True)
+
+    with st.sidebar:
+        st.title("🌊 实验登录")
+        user_id = st.text_input("User ID", placeholder="User_01").strip()
+        group_id_ui = st.selectbox("Select Group", [f"Group {i}" for i in range(1, 7)])
+
+    if not user_id:
+        st.title("👋 欢迎参加实验")
+        st.write("请在左侧侧边栏输入 ID 并选择分组。")
+        return
+
+    # 后台写入状态：pending 为已提交但尚未落库的评分
+    write_status = get_storage().user_status(user_id)
+    with st.sidebar:
+        st.caption(f"💾 已保存 {write_status['committed']} · 写入中 {write_status['pending']}")
+    if write_status['failed']:
+        st.warning(f"有 {write_status['failed']} 条评分保存失败，重新进入本组时会再次出现，请重新评分。")
+
+    # 整个评分进度只存在一个 RatingSession 里（见 session_model.py）
+    session_key = f"{user_id}_{group_id_ui}"
+    rs = st.session_state.get('rating_session')
+    if rs is None or rs.key != session_key:
+        img_list = get_cloud_image_list(user_id, group_id_ui)
+        if not img_list: st.stop()
+
+        # 位置优先取共享进度表，换副本 / 重启后都能接着评；没有记录时按已完成的图片推算
+        # （只查本组进度，覆盖索引一次往返；写入队列里还没落库的评分也算已完成）
+        start_idx = get_progress_store().get(user_id, group_id_ui)
+        if start_idx is None:
+            _, start_idx = get_storage().resume_state(user_id, group_id_ui, img_list)
+        start_idx = min(start_idx, len(img_list) - 1)
+        # 一页提交 BATCH_SIZE 条评分，窗口放得下两页，回到上一页时滑块才能回填
+        rs = st.session_state['rating_session'] = RatingSession(
+            session_key, img_list, start_idx, history_size=max(HISTORY_SIZE, 2 * BATCH_SIZE))
+
+    img_list = rs.images
+    idx = rs.index
+
+    # 之前图片的滑块 / 确认框 key 不再需要，session_state 不随进度增长
+    evict_widget_keys(INDEXED_KEY_PREFIXES, range(idx, idx + max(BATCH_SIZE, 1)))
+
+    if idx >= len(img_list):
+        st.success("🎉 本组实验已全部完成！")
+        return
+    dwell.mark_shown(idx)
+
+    if BATCH_SIZE > 1:
+        render_batch_page(user_id, group_id_ui, rs)
+        return
+
+    current_img_rel_path = img_list[idx]
+
+    # --- 图片显示 (Form外) ---
+    try:
+        full_image_url = CLOUD_BASE_URL + current_img_rel_path
+        col1, col2, col3 = st.columns([1, 10, 1])
+        with col2:
+            st.image(full_image_url, width="stretch")
+    except Exception as e:
+        st.error(f"Error loading image: {e}")
+
+    # 评当前图时让浏览器先下载后面几张，点"下一张"直接命中缓存
+    render_prefetch(img_list, idx, CLOUD_BASE_URL, PREFETCH_DEPTH)
+
+    st.markdown("---")
+
+    # --- 评分表单 ---
+    # 使用 Form 解决卡顿问题
+    with st.form(key=f"rating_form_{idx}"):  # Form key 也可以动态，确保完全隔离
+
+        c1, spacer1, c2, spacer2, c3 = st.columns([10, 1, 10, 1, 10])
+
+        # 关键修改：Key 绑定了当前的 idx
+        # 当 idx 改变时，Key 改变，Streamlit 自动创建新滑块（默认值50），无需手动重置！
+        # 从而避免了 StreamlitAPIException
+        k_content = f"s_content_{idx}"
+        k_aesthetic = f"s_aesthetic_{idx}"
+        k_quality = f"s_quality_{idx}"
+
+        with c1:
+            render_blind_slider("1. 内容 (Content)", k_content, rs.scores[0])
+        with spacer1:
+            st.empty()
+        with c2:
+            render_blind_slider("2. 美学 (Aesthetics)", k_aesthetic, rs.scores[1])
+        with spacer2:
+            st.empty()
+        with c3:
+            render_blind_slider("3. 质量 (Quality)", k_quality, rs.scores[2])
+
+        st.write("")
+
+        b1, b2, b3 = st.columns([1, 2, 1])
+        with b1:
+            if idx > 0:
+                prev_clicked = st.form_submit_button("⬅️ 上一张", width="stretch")
+            else:
+                prev_clicked = False
+                st.empty()
+        with b3:
+            next_clicked = st.form_submit_button("下一张 ➡️", type="primary", width="stretch")
+
+    # --- 逻辑处理 ---
+
+    if next_clicked:
+        # 获取当前动态 Key 的值
+        val_content = st.session_state.get(k_content, 50)
+        val_aesthetic = st.session_state.get(k_aesthetic, 50)
+        val_quality = st.session_state.get(k_quality, 50)
+
+        if save_to_db(user_id, group_id_ui, current_img_rel_path,
+                      val_content, val_aesthetic, val_quality, rs.request_id, dwell.dwell_ms(idx)):
+            rs.record(idx, (val_content, val_aesthetic, val_quality))
+
+            if idx < len(img_list) - 1:
+                rs.move_to(idx + 1)
+                get_progress_store().set(user_id, group_id_ui, rs.index)
+                # 注意：这里不需要手动重置 session_state 了！
+                # 因为下一张图的 Key 是 s_content_{idx+1}，是全新的，自动就是 50。
+                st.rerun()
+            else:
+                # 停在最后一张：改分后再提交是新的请求，不能被当成重复丢弃
+                rs.request_id = new_request_id()
+                st.balloons()
+
+    if prev_clicked:
+        if idx > 0:
+            rs.move_to(idx - 1)
+            get_progress_store().set(user_id, group_id_ui, rs.index)
+            st.rerun()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,232 @@
+import heapq
+import itertools
+import os
+import threading
+import time
+from collections import OrderedDict
+
+import streamlit as st
+
+from storage import get_storage, secrets_section
+
+
+# ================= 自适应分配 =================
+# 不再给每个评分员整组 600 张，而是每次从本组里挑"评分人数最少、且该评分员没评过"的一张。
+# 每组一个最小堆 (评分人数, 序号, 图片)，计数变化时压入新条目、旧条目按计数校验后跳过
+# （惰性删除）；分配时按堆序遍历、不弹出该评分员评过的条目，代价 O(k log k)，k 为跳过的条数。
+# 发出去的图片先占一个名额（预约），并发的评分员会拿到不同的图；保存后转为正式计数，超时未评则退回。
+# 计数启动时从 annotations 读入，之后经 Storage 的提交监听随本进程的每次保存更新；
+# 监听只在创建了引擎的进程里生效：app2 / app3 等单独运行的脚本、其他副本的保存，
+# 要等 refresh_interval 到期重读时才计入（这段时间里这些图可能被多分几次）。
+
+
+class _GroupQueue:
+    """单个分组的状态；所有字段只在 lock 内访问"""
+
+    def __init__(self, counts, images):
+        self.lock = threading.Lock()
+        self.counts = {image: counts.get(image, 0) for image in images}
+        self.heap = []
+        self.reservations = {}  # user_id -> (图片, 过期时间)
+        self.seeded_at = time.monotonic()
+        self.rebuild()
+
+    def rebuild(self):
+        self.heap = [(count, i, image) for i, (image, count) in enumerate(sorted(self.counts.items()))]
+        heapq.heapify(self.heap)
+
+    def push(self, image, seq):
+        heapq.heappush(self.heap, (self.counts[image], seq, image))
+        # 过期条目太多时整体重建，堆大小保持在图片数的常数倍
+        if len(self.heap) > 4 * len(self.counts) + 64:
+            self.rebuild()
+
+    def first_unrated(self, rated):
+        """
+        按堆序遍历（除堆顶的过期条目外不修改堆），返回第一个计数有效且不在 rated 里的条目。
+        用一个小堆按序展开子节点，代价 O(k log k)，k 为返回前跳过的条目数（该评分员评过的和过期的），
+        最坏 k 接近堆大小；评分员评过的图多时每次分配都要重新跳过它们。
+        """
+        heap = self.heap
+        # 堆顶的过期条目直接丢弃
+        while heap and self.counts.get(heap[0][2]) != heap[0][0]:
+            heapq.heappop(heap)
+        frontier = [(heap[0], 0)] if heap else []
+        while frontier:
+            entry, i = heapq.heappop(frontier)
+            count, _, image = entry
+            if self.counts.get(image) == count and image not in rated:
+                return entry
+            for child in (2 * i + 1, 2 * i + 2):
+                if child < len(heap):
+                    heapq.heappush(frontier, (heap[child], child))
+        return None
+
+
+class AssignmentEngine:
+    """
+    target: 每张图的目标评分人数；评分员没评过的图都已达到 target 时不再分配。None 表示不设上限。
+    reservation_ttl: 发出去的图片多少秒没有保存就退回名额。
+    refresh_interval: 多少秒从 annotations 重读一次计数；其他进程（别的脚本、其他副本）的保存要等重读才计入。
+    max_rated: 缓存"已评图片"集合的 (评分员, 分组) 数，按 LRU 淘汰，淘汰后下次用到时从库里重读。
+    """
+
+    def __init__(self, storage, target=None, reservation_ttl=600, refresh_interval=60, max_rated=5000):
+        self.storage = storage
+        self.target = target
+        self.reservation_ttl = reservation_ttl
+        self.refresh_interval = refresh_interval
+        self.max_rated = max_rated
+        self._groups = {}
+        self._rated = OrderedDict()  # (user_id, group_id) -> set(已评图片)
+        self._lock = threading.Lock()
+        self._seq = itertools.count()
+        self._stats = {"assigned": 0, "recorded": 0, "expired": 0, "exhausted": 0, "refreshes": 0}
+        storage.add_submit_listener(self.observe)
+
+    def _group(self, group_id, images):
+        with self._lock:
+            queue = self._groups.get(group_id)
+        if queue is not None and time.monotonic() - queue.seeded_at < self.refresh_interval:
+            return queue
+
+        counts = self.storage.image_rating_counts(group_id)
+        with self._lock:
+            if queue is None:
+                queue = self._groups.setdefault(group_id, _GroupQueue(counts, images))
+                return queue
+            self._stats["refreshes"] += 1
+        with queue.lock:
+            # 重读后仍要保留本进程尚未保存的预约
+            queue.counts = {image: counts.get(image, 0) for image in images}
+            for image, _ in queue.reservations.values():
+                if image in queue.counts:
+                    queue.counts[image] += 1
+            queue.seeded_at = time.monotonic()
+            queue.rebuild()
+        return queue
+
+    def _rated_set(self, user_id, group_id, exclude=()):
+        """exclude: 刚入队、还没计入计数的图片，虽然已在写入队列里也不算已评"""
+        key = (user_id, group_id)
+        with self._lock:
+            rated = self._rated.get(key)
+            if rated is not None:
+                self._rated.move_to_end(key)
+                return rated
+        done = self.storage.completed_images(user_id, group_id)
+        if self.storage.compactor is not None:
+            done |= self.storage.uncompacted_images(user_id, group_id)
+        done |= self.storage.pending_images(user_id) - set(exclude)
+        with self._lock:
+            rated = self._rated.setdefault(key, done)
+            self._rated.move_to_end(key)
+            while len(self._rated) > self.max_rated:
+                self._rated.popitem(last=False)
+        return rated
+
+    def _release(self, queue, image):
+        if image in queue.counts and queue.counts[image] > 0:
+            queue.counts[image] -= 1
+            queue.push(image, next(self._seq))
+
+    def _expire(self, queue, now):
+        for user_id, (image, expires) in list(queue.reservations.items()):
+            if expires <= now:
+                del queue.reservations[user_id]
+                self._release(queue, image)
+                self._stats["expired"] += 1
+
+    def next_image(self, user_id, group_id, images):
+        """
+        给评分员分配下一张图并预约名额；images 为本组全部图片 (tuple)。
+        没有可分配的图（都评过了或都已达到 target）时返回 None。
+        """
+        queue = self._group(group_id, images)
+        rated = self._rated_set(user_id, group_id)
+        now = time.monotonic()
+        with queue.lock:
+            self._expire(queue, now)
+            previous = queue.reservations.pop(user_id, None)
+            if previous is not None:
+                # 上一张没保存就要下一张（如刷新页面），先退回名额
+                self._release(queue, previous[0])
+
+            choice = queue.first_unrated(rated)
+            if choice is None or (self.target is not None and choice[0] >= self.target):
+                with self._lock:
+                    self._stats["exhausted"] += 1
+                return None
+
+            image = choice[2]
+            queue.counts[image] += 1
+            queue.push(image, next(self._seq))
+            queue.reservations[user_id] = (image, now + self.reservation_ttl)
+        with self._lock:
+            self._stats["assigned"] += 1
+        return image
+
+    def record(self, user_id, group_id, images):
+        """评分入队后调用：预约转为正式计数；没有预约的首次评分计数加一，重评不变"""
+        with self._lock:
+            queue = self._groups.get(group_id)
+            self._stats["recorded"] += len(images)
+        if queue is None:
+            # 本进程还没分配过这个分组：之后加载计数时会从库里（含写入队列）读到这几条
+            return
+        rated = self._rated_set(user_id, group_id, exclude=images)
+        with queue.lock:
+            for image_name in images:
+                reserved = queue.reservations.get(user_id)
+                if reserved is not None and reserved[0] == image_name:
+                    del queue.reservations[user_id]
+                elif image_name not in rated and image_name in queue.counts:
+                    queue.counts[image_name] += 1
+                    queue.push(image_name, next(self._seq))
+                rated.add(image_name)
+
+    def observe(self, records):
+        """Storage 的提交监听：本进程内（单张 / 批量）保存的评分都计入覆盖计数"""
+        by_key = {}
+        for user_id, group_id, image_name, *_ in records:
+            by_key.setdefault((user_id, group_id), []).append(image_name)
+        for (user_id, group_id), images in by_key.items():
+            self.record(user_id, group_id, images)
+
+    def metrics(self):
+        with self._lock:
+            data = dict(self._stats)
+            groups = dict(self._groups)
+            data["rated_cached"] = len(self._rated)
+        data["target"] = self.target
+        data["groups"] = {}
+        for group_id, queue in sorted(groups.items()):
+            with queue.lock:
+                counts = list(queue.counts.values())
+                data["groups"][group_id] = {
+                    "images": len(counts),
+                    "min": min(counts, default=0),
+                    "max": max(counts, default=0),
+                    "below_target": sum(1 for c in counts if self.target is None or c < self.target),
+                    "reserved": len(queue.reservations),
+                }
+        return data
+
+
+@st.cache_resource
+def get_assignment_engine():
+    """
+    未开启时返回 None。配置：环境变量 SCORE_ASSIGNMENT=1 或 secrets 的 [assignment] enabled，
+    以及 target / reservation_ttl / refresh_interval。
+    """
+    config = secrets_section("assignment")
+    if not (os.environ.get("SCORE_ASSIGNMENT") == "1" or config.get("enabled", False)):
+        return None
+    target = config.get("target")
+    return AssignmentEngine(
+        get_storage(),
+        target=int(target) if target is not None else None,
+        reservation_ttl=float(config.get("reservation_ttl", 600)),
+        refresh_interval=float(config.get("refresh_interval", 60)),
+        max_rated=int(config.get("max_rated", 5000)),
+    )
@@ -0,0 +1,36 @@
+import os
+
+import streamlit as st
+import streamlit.components.v1 as components
+
+# ================= 盲测滑块组件 =================
+# 三个滑块的数值和"是否拖动过"都保存在浏览器里，拖动不触发 rerun；
+# 点提交时组件只发回一次 {scores, touched, nonce}，一次评分只 rerun 一次。
+# 前端是 components/blind_slider/index.html（纯静态文件，无需构建）。
+
+_COMPONENT_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "components", "blind_slider")
+_blind_slider = components.declare_component("blind_slider", path=_COMPONENT_DIR)
+
+WARNING_TEXT = ("为了保证实验数据的有效性，所有三个维度都必须经过您的确认。"
+                "即使您认为 50 分是合适的，也请轻微拖动一下滑块（例如拖到 51 再拖回 50）。")
+
+
+def blind_rating(labels, key, submit_label="下一张 ➡️", initial=50):
+    """
+    渲染组件。key 必须随图片变化（如 rating_{idx}），换图时浏览器端状态自然重置。
+    返回值见 take_submission；一般在渲染前先调用 take_submission 处理上一次提交。
+    """
+    return _blind_slider(labels=list(labels), state_key=key, initial=initial, submit_label=submit_label,
+                         warning=WARNING_TEXT, key=key, default=None)
+
+
+def take_submission(key):
+    """
+    取出组件 key 上尚未处理的提交，没有时返回 None。
+    组件值在之后的 rerun 中会一直保留，用 nonce 保证每次提交只处理一次。
+    """
+    value = st.session_state.get(key)
+    if not value or value.get("nonce") == st.session_state.get('rating_nonce'):
+        return None
+    st.session_state['rating_nonce'] = value["nonce"]
+    return value
@@ -0,0 +1,159 @@
+import queue
+import threading
+import time
+from contextlib import contextmanager
+
+import mysql.connector
+import streamlit as st
+
+from statements import PreparedStatements
+
+
+# ================= MySQL/TiDB 连接池 =================
+# 进程内共享一组长连接，避免每次读写都重新做 TCP+TLS 握手。
+
+class ConnectionPool:
+    """
+    简单的阻塞式连接池。
+    size: 最大连接数；连接用完时借出方会排队等待 checkout_timeout 秒。
+    ping_interval: 连接空闲超过该秒数后，借出前先 ping 一次做健康检查。
+    idle_timeout: 连接空闲超过该秒数后直接重连（服务端多半已经断开）。
+    prepared_statements / statement_cache_size: 每个连接复用预编译语句，见 statements.py。
+    """
+
+    def __init__(self, connect_kwargs, size=5, checkout_timeout=10, ping_interval=30, idle_timeout=300,
+                 prepared_statements=True, statement_cache_size=64):
+        self._connect_kwargs = dict(connect_kwargs)
+        self.size = size
+        self.checkout_timeout = checkout_timeout
+        self.ping_interval = ping_interval
+        self.idle_timeout = idle_timeout
+        self.statements = PreparedStatements(prepared_statements, statement_cache_size)
+
+        # LIFO：优先复用最近用过的连接，冷连接自然沉底
+        self._idle = queue.LifoQueue(maxsize=size)
+        self._lock = threading.Lock()
+        self._created = 0
+        self._in_use = 0
+        self._stats = {"checkouts": 0, "waits": 0, "reconnects": 0, "created": 0, "errors": 0}
+
+    def _new_connection(self):
+        conn = mysql.connector.connect(autocommit=True, **self._connect_kwargs)
+        with self._lock:
+            self._stats["created"] += 1
+        return conn
+
+    def _reconnect(self, conn):
+        # 新会话里没有旧的预编译语句
+        self.statements.forget(conn)
+        conn.reconnect(attempts=3, delay=0.2)
+        with self._lock:
+            self._stats["reconnects"] += 1
+
+    def _health_check(self, conn, last_used):
+        idle_for = time.monotonic() - last_used
+        if idle_for >= self.idle_timeout:
+            self._reconnect(conn)
+        elif idle_for >= self.ping_interval:
+            try:
+                conn.ping(reconnect=False)
+            except mysql.connector.Error:
+                self._reconnect(conn)
+
+    def _acquire(self):
+        try:
+            return self._idle.get_nowait()
+        except queue.Empty:
+            pass
+
+        with self._lock:
+            can_create = self._created < self.size
+            if can_create:
+                self._created += 1
+        if can_create:
+            try:
+                return self._new_connection(), time.monotonic()
+            except Exception:
+                with self._lock:
+                    self._created -= 1
+                raise
+
+        with self._lock:
+            self._stats["waits"] += 1
+        try:
+            return self._idle.get(timeout=self.checkout_timeout)
+        except queue.Empty:
+            raise TimeoutError(f"等待数据库连接超时 ({self.checkout_timeout}s)")
+
+    def _discard(self, conn):
+        self.statements.forget(conn)
+        try:
+            conn.close()
+        except Exception:
+            pass
+        with self._lock:
+            self._created -= 1
+
+    @contextmanager
+    def connection(self):
+        """借出一个健康的连接，用完自动归还。"""
+        conn, last_used = self._acquire()
+        try:
+            self._health_check(conn, last_used)
+        except Exception:
+            self._discard(conn)
+            raise
+
+        with self._lock:
+            self._stats["checkouts"] += 1
+            self._in_use += 1
+
+        failed = False
+        try:
+            yield conn
+        except Exception:
+            failed = True
+            with self._lock:
+                self._stats["errors"] += 1
+            raise
+        finally:
+            with self._lock:
+                self._in_use -= 1
+            # 出错的连接下次借出时强制 ping 一次
+            self._idle.put((conn, 0.0 if failed else time.monotonic()))
+
+    def metrics(self):
+        with self._lock:
+            data = dict(self._stats)
+            data.update(size=self.size, open=self._created, in_use=self._in_use, idle=self._idle.qsize())
+        data["statements"] = self.statements.metrics()
+        return data
+
+    def close(self):
+        while True:
+            try:
+                conn, _ = self._idle.get_nowait()
+            except queue.Empty:
+                break
+            self._discard(conn)
+
+
+@st.cache_resource
+def get_db_pool():
+    """从 Streamlit Secrets 读取配置，每个进程只建一个池。"""
+    db_config = st.secrets["connections"]["tidb"]
+    return ConnectionPool(
+        {
+            "host": db_config["host"],
+            "user": db_config["user"],
+            "password": db_config["password"],
+            "port": db_config["port"],
+            "database": db_config["database"],
+        },
+        size=int(db_config.get("pool_size", 5)),
+        checkout_timeout=float(db_config.get("pool_timeout", 10)),
+        ping_interval=float(db_config.get("pool_ping_interval", 30)),
+        idle_timeout=float(db_config.get("pool_idle_timeout", 300)),
+        prepared_statements=bool(db_config.get("prepared_statements", True)),
+        statement_cache_size=int(db_config.get("statement_cache_size", 64)),
+    )
@@ -0,0 +1,57 @@
+import threading
+import uuid
+from collections import OrderedDict
+
+
+# ================= 提交去重 =================
+# 每次提交带一个请求 ID（app.py 用评分组件的 nonce，其余脚本在显示某张图时生成）。
+# 双击"下一张"、rerun 被打断后重放等会带着同一个 ID 再提交一次：
+# 本进程内由有界 LRU 在入队前拦下；跨进程或重启后的重复由 annotations.request_id
+# 唯一键在写事务里拦下，不会再 REPLACE 一遍、也不会改写 timestamp。
+
+def new_request_id():
+    return uuid.uuid4().hex
+
+
+class RequestDeduper:
+    """capacity: 记住的最近请求 ID 数，超出后淘汰最久未见的"""
+
+    def __init__(self, capacity=10000):
+        self.capacity = capacity
+        self._seen = OrderedDict()
+        self._lock = threading.Lock()
+        self._stats = {"accepted": 0, "suppressed": 0, "suppressed_in_db": 0}
+
+    def claim(self, request_id):
+        """首次出现返回 True；最近已见过的返回 False。没有请求 ID 的提交一律放行"""
+        if request_id is None:
+            return True
+        with self._lock:
+            if request_id in self._seen:
+                self._seen.move_to_end(request_id)
+                self._stats["suppressed"] += 1
+                return False
+            self._seen[request_id] = None
+            while len(self._seen) > self.capacity:
+                self._seen.popitem(last=False)
+            self._stats["accepted"] += 1
+            return True
+
+    def release(self, request_id):
+        """入队失败时撤销 claim，允许同一请求重试"""
+        if request_id is None:
+            return
+        with self._lock:
+            if self._seen.pop(request_id, 0) is None:
+                self._stats["accepted"] -= 1
+
+    def record_db_duplicates(self, count):
+        if count:
+            with self._lock:
+                self._stats["suppressed_in_db"] += count
+
+    def metrics(self):
+        with self._lock:
+            data = dict(self._stats)
+            data.update(capacity=self.capacity, cached=len(self._seen))
+        return data
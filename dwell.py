@@ -0,0 +1,104 @@
+import time
+from datetime import datetime
+
+import streamlit as st
+
+
+# ================= 评分时长 =================
+# 每条评分同一行里多存三列，不额外往返：
+#   dwell_ms        —— 这张（批量模式为这一页）从显示到提交的毫秒数，服务端单调时钟
+#   submitted_us    —— 提交时刻，Unix 微秒时间戳（原 timestamp 列只到秒，保留不变）
+#   queue_latency_ms —— 从提交到写线程开始写这一批（重试时为最终成功的那次）的毫秒数，即排队攒批的时间，
+#                       不含 INSERT / COMMIT 本身；含提交耗时的保存延迟在事务之后才知道，不回写到行里，
+#                       由写线程统计在 writer 指标里 (save_latency_*_ms)
+# 显示时刻记在 session_state['shown_at'] = (下标, time.monotonic())，换图后重新计时；
+# 刷新页面后首次提交没有显示时刻，dwell_ms 为空。
+
+TIMING_COLUMNS = ("dwell_ms", "submitted_us", "queue_latency_ms")
+
+# 报告里 dwell_ms 低于此值的算"过快"
+FAST_DWELL_MS = 1000
+
+
+def mark_shown(index):
+    """渲染第 index 张（页）时调用；同一张 rerun 多次不重新计时"""
+    shown = st.session_state.get("shown_at")
+    if shown is None or shown[0] != index:
+        st.session_state["shown_at"] = (index, time.monotonic())
+
+
+def dwell_ms(index):
+    """第 index 张从显示到现在的毫秒数；没有记录时返回 None"""
+    shown = st.session_state.get("shown_at")
+    if shown is None or shown[0] != index:
+        return None
+    return round((time.monotonic() - shown[1]) * 1000)
+
+
+def submission_time():
+    """返回 (秒级 timestamp 字符串, 微秒时间戳)，两者取自同一次读时钟"""
+    submitted_us = time.time_ns() // 1000
+    return datetime.fromtimestamp(submitted_us // 1_000_000).strftime("%Y-%m-%d %H:%M:%S"), submitted_us
+
+
+def with_queue_latency(rows):
+    """写线程每次尝试写入前调用：record 为 (..., request_id, dwell_ms, submitted_us)，末尾补上 queue_latency_ms"""
+    now_us = time.time_ns() // 1000
+    return [tuple(row) + ((now_us - row[9]) / 1000 if row[9] is not None else None,) for row in rows]
+
+
+# ================= 汇总报告 =================
+
+def report_sql(by):
+    """按 group_id 或 user_id 汇总；只读 annotations 一次（GROUP BY）"""
+    if by not in ("group_id", "user_id"):
+        raise ValueError(by)
+    return (f"SELECT {by}, COUNT(*), COUNT(dwell_ms), AVG(dwell_ms), MIN(dwell_ms), MAX(dwell_ms), "
+            f"SUM(CASE WHEN dwell_ms < {FAST_DWELL_MS} THEN 1 ELSE 0 END), "
+            f"AVG(queue_latency_ms), MAX(queue_latency_ms), MIN(submitted_us), MAX(submitted_us) "
+            f"FROM annotations GROUP BY {by} ORDER BY {by}")
+
+
+def _format_us(us):
+    return datetime.fromtimestamp(int(us) / 1_000_000).strftime("%Y-%m-%d %H:%M:%S.%f") if us else None
+
+
+def _round(value, digits=1):
+    return round(float(value), digits) if value is not None else None
+
+
+def report_rows(rows, by):
+    """report_sql 的结果转成管理员页面的表格行"""
+    return [{
+        by: key,
+        "ratings": int(total),
+        "timed": int(timed),
+        "dwell_avg_ms": _round(avg),
+        "dwell_min_ms": min_ms,
+        "dwell_max_ms": max_ms,
+        f"dwell_<{FAST_DWELL_MS}ms": int(fast or 0),
+        "queue_latency_avg_ms": _round(latency_avg, 2),
+        "queue_latency_max_ms": _round(latency_max, 2),
+        "first": _format_us(first),
+        "last": _format_us(last),
+    } for key, total, timed, avg, min_ms, max_ms, fast, latency_avg, latency_max, first, last in rows]
+
+
+def summarize(records, by):
+    """内存后端：对 record 元组做与 report_sql 相同的汇总"""
+    column = 0 if by == "user_id" else 1
+    groups = {}
+    for record in records:
+        groups.setdefault(record[column], []).append(record)
+    rows = []
+    for key in sorted(groups):
+        items = groups[key]
+        dwell = [r[8] for r in items if r[8] is not None]
+        latency = [r[10] for r in items if r[10] is not None]
+        stamps = [r[9] for r in items if r[9] is not None]
+        rows.append((key, len(items), len(dwell), sum(dwell) / len(dwell) if dwell else None,
+                     min(dwell, default=None), max(dwell, default=None),
+                     sum(1 for d in dwell if d < FAST_DWELL_MS),
+                     sum(latency) / len(latency) if latency else None, max(latency, default=None),
+                     min(stamps, default=None), max(stamps, default=None)))
+    return rows
@@ -0,0 +1,94 @@
+import threading
+
+
+# ================= 评分事件日志 =================
+# 开启后（[storage] event_log = true）写线程不再 REPLACE annotations，而是把每次提交
+# 顺序追加到 rating_events（只插入、不更新），"⬅️ 上一张" 之后的修改也都保留下来。
+# 后台压缩线程按 id 顺序读取水位线之后的事件，每个 (user_id, image_name) 只取最新一条，
+# 经与直接写入相同的路径（含去重和增量统计）写进 annotations，并在同一事务里推进水位线。
+# 水位线保存在 schema_meta 表 (name = EVENT_WATERMARK_KEY)。
+
+EVENT_WATERMARK_KEY = "events_watermark"
+
+EVENT_COLUMNS = ("user_id, group_id, image_name, score_content, score_aesthetic, score_quality, "
+                 "timestamp, request_id, dwell_ms, submitted_us, queue_latency_ms")
+
+
+def latest_per_key(events):
+    """events 为按 id 升序的 (id, 记录...)；返回每个 (user_id, image_name) 最新的记录"""
+    latest = {}
+    for event in events:
+        record = tuple(event[1:])
+        latest[(record[0], record[2])] = record
+    return list(latest.values())
+
+
+def read_watermark(c, placeholder, for_update=False):
+    c.execute(f"SELECT value FROM schema_meta WHERE name = {placeholder}" + (" FOR UPDATE" if for_update else ""),
+              (EVENT_WATERMARK_KEY,))
+    row = c.fetchone()
+    return int(row[0]) if row else 0
+
+
+def init_watermark(c, placeholder):
+    """迁移：建表时写入水位线 0，之后只 UPDATE（压缩时可以 FOR UPDATE 锁住这一行）"""
+    p = placeholder
+    c.execute(f"DELETE FROM schema_meta WHERE name = {p}", (EVENT_WATERMARK_KEY,))
+    c.execute(f"INSERT INTO schema_meta (name, value) VALUES ({p}, {p})", (EVENT_WATERMARK_KEY, "0"))
+
+
+def write_watermark(c, placeholder, event_id):
+    p = placeholder
+    c.execute(f"UPDATE schema_meta SET value = {p} WHERE name = {p}", (str(event_id), EVENT_WATERMARK_KEY))
+
+
+class EventCompactor:
+    """
+    compact: 后端的压缩函数 compact(limit)，在一个事务里处理最多 limit 条事件，返回处理的条数。
+    interval: 没有积压时两次压缩之间的秒数；有积压时连续压缩直到追上。
+    """
+
+    def __init__(self, compact, interval=5.0, batch_size=5000):
+        self._compact = compact
+        self.interval = interval
+        self.batch_size = batch_size
+        self._lock = threading.Lock()
+        self._stop = threading.Event()
+        self._stats = {"passes": 0, "events": 0, "errors": 0, "last_error": None}
+        self._thread = threading.Thread(target=self._run, name="event-compactor", daemon=True)
+        self._thread.start()
+
+    def run_once(self):
+        """压缩到没有积压为止，返回本次处理的事件数"""
+        total = 0
+        while True:
+            count = self._compact(self.batch_size)
+            total += count
+            with self._lock:
+                self._stats["passes"] += 1
+                self._stats["events"] += count
+            if count < self.batch_size:
+                return total
+
+    def _run(self):
+        while not self._stop.wait(self.interval):
+            try:
+                self.run_once()
+            except Exception as e:
+                print(f"Event Compaction Error: {e}")
+                with self._lock:
+                    self._stats["errors"] += 1
+                    self._stats["last_error"] = str(e)
+
+    def metrics(self):
+        with self._lock:
+            return dict(self._stats)
+
+    def close(self, timeout=30):
+        """停止后台线程，并把已写入的事件最后压缩一次"""
+        self._stop.set()
+        self._thread.join(timeout)
+        try:
+            self.run_once()
+        except Exception as e:
+            print(f"Event Compaction Error: {e}")
@@ -0,0 +1,264 @@
+import argparse
+import csv
+import json
+import os
+import sqlite3
+import tomllib
+
+import numpy as np
+
+# ================= 标注数据导出与统计 =================
+# 按 (user_id, image_name) 主键做 keyset 分页流式读取 annotations，
+# 内存只与单页大小有关；同时用 NumPy 按页累加每张图 / 每个用户的统计量。
+# 同时支持 TiDB/MySQL (app.py 等) 与 SQLite (app1_1.py) 的表结构。
+
+COLUMNS = ("user_id", "group_id", "image_name", "score_content", "score_aesthetic", "score_quality", "timestamp")
+# 后来迁移加的列；还没跑过对应迁移的旧库没有这些列，导出为空
+OPTIONAL_COLUMNS = ("request_id", "dwell_ms", "submitted_us", "queue_latency_ms")
+EXPORT_COLUMNS = COLUMNS + OPTIONAL_COLUMNS
+SCORE_COLUMNS = ("score_content", "score_aesthetic", "score_quality")
+
+
+# ================= 1. 数据库连接 =================
+
+def load_tidb_config(secrets_path=".streamlit/secrets.toml"):
+    """命令行工具不经过 Streamlit，直接读 secrets.toml 里的 [connections.tidb]"""
+    with open(secrets_path, "rb") as f:
+        return tomllib.load(f)["connections"]["tidb"]
+
+
+def connect_mysql(db_config):
+    import mysql.connector
+    return mysql.connector.connect(
+        host=db_config["host"],
+        user=db_config["user"],
+        password=db_config["password"],
+        port=db_config["port"],
+        database=db_config["database"],
+    )
+
+
+def connect_sqlite(path):
+    return sqlite3.connect(path)
+
+
+# ================= 2. keyset 分页读取 =================
+
+def select_columns(conn):
+    """按表里实际有的列拼 SELECT 列表，缺的可选列用 NULL 补齐，两种后端输出的列一致"""
+    c = conn.cursor()
+    c.execute("SELECT * FROM annotations LIMIT 0")
+    present = {d[0] for d in c.description}
+    c.fetchall()
+    c.close()
+    return list(COLUMNS) + [col if col in present else f"NULL AS {col}" for col in OPTIONAL_COLUMNS]
+
+
+def iter_chunks(conn, placeholder="%s", chunk_size=5000):
+    """
+    逐页返回 list[tuple]，列为 EXPORT_COLUMNS，顺序为 (user_id, image_name)。
+    用 "上一页最后一个主键之后" 作为游标，不用 OFFSET，越往后翻也不会越慢。
+    """
+    select = f"SELECT {', '.join(select_columns(conn))} FROM annotations"
+    order = f" ORDER BY user_id, image_name LIMIT {int(chunk_size)}"
+    after = f" WHERE user_id > {placeholder} OR (user_id = {placeholder} AND image_name > {placeholder})"
+
+    last = None
+    while True:
+        c = conn.cursor()
+        if last is None:
+            c.execute(select + order)
+        else:
+            c.execute(select + after + order, (last[0], last[0], last[1]))
+        rows = c.fetchall()
+        c.close()
+        if not rows:
+            return
+        yield rows
+        if len(rows) < chunk_size:
+            return
+        last = (rows[-1][0], rows[-1][2])
+
+
+def _normalize(row):
+    # MySQL 返回 datetime，SQLite 返回字符串；统一成字符串输出
+    row = list(row)
+    if row[6] is not None and not isinstance(row[6], str):
+        row[6] = row[6].strftime("%Y-%m-%d %H:%M:%S")
+    return row
+
+
+# ================= 3. 输出格式 =================
+
+class CsvSink:
+    def __init__(self, path):
+        self._f = open(path, "w", encoding="utf-8-sig", newline="")
+        self._writer = csv.writer(self._f)
+        self._writer.writerow(EXPORT_COLUMNS)
+
+    def write(self, rows):
+        self._writer.writerows(_normalize(r) for r in rows)
+
+    def close(self):
+        self._f.close()
+
+
+class NdjsonSink:
+    def __init__(self, path):
+        self._f = open(path, "w", encoding="utf-8")
+
+    def write(self, rows):
+        for r in rows:
+            self._f.write(json.dumps(dict(zip(EXPORT_COLUMNS, _normalize(r))), ensure_ascii=False))
+            self._f.write("\n")
+
+    def close(self):
+        self._f.close()
+
+
+class ParquetSink:
+    """每一页写成一个 row group，需要安装 pyarrow"""
+
+    def __init__(self, path):
+        try:
+            import pyarrow as pa
+            import pyarrow.parquet as pq
+        except ImportError:
+            raise SystemExit("导出 Parquet 需要先安装 pyarrow: pip install pyarrow")
+        self._pa = pa
+        self._schema = pa.schema([
+            ("user_id", pa.string()), ("group_id", pa.string()), ("image_name", pa.string()),
+            ("score_content", pa.int32()), ("score_aesthetic", pa.int32()), ("score_quality", pa.int32()),
+            ("timestamp", pa.string()), ("request_id", pa.string()), ("dwell_ms", pa.int32()),
+            ("submitted_us", pa.int64()), ("queue_latency_ms", pa.float64()),
+        ])
+        self._writer = pq.ParquetWriter(path, self._schema)
+
+    def write(self, rows):
+        columns = list(zip(*(_normalize(r) for r in rows)))
+        table = self._pa.Table.from_arrays(
+            [self._pa.array(col, type=field.type) for col, field in zip(columns, self._schema)],
+            schema=self._schema,
+        )
+        self._writer.write_table(table)
+
+    def close(self):
+        self._writer.close()
+
+
+SINKS = {"csv": CsvSink, "ndjson": NdjsonSink, "parquet": ParquetSink}
+
+
+# ================= 4. 向量化统计 =================
+
+class ScoreAggregator:
+    """
+    按 key (图片或用户) 累加 n、三项分数的和与平方和，最后一次性算均值和标准差。
+    每页只在 "本页出现的不同 key" 上做一次字典查找，逐行的计算全部交给 NumPy。
+    """
+
+    def __init__(self):
+        self._index = {}
+        self._keys = []
+        self._acc = np.zeros((0, 7))  # n, sum*3, sumsq*3
+
+    def _rows_for(self, keys):
+        rows = np.empty(len(keys), dtype=np.int64)
+        for i, key in enumerate(keys):
+            row = self._index.get(key)
+            if row is None:
+                row = self._index[key] = len(self._keys)
+                self._keys.append(key)
+            rows[i] = row
+        if len(self._keys) > len(self._acc):
+            grown = np.zeros((max(len(self._keys), 2 * len(self._acc)), 7))
+            grown[:len(self._acc)] = self._acc
+            self._acc = grown
+        return rows
+
+    def add(self, keys, scores):
+        """keys: 一维 array；scores: (n, 3) 的分数矩阵"""
+        uniq, inverse = np.unique(keys, return_inverse=True)
+        part = np.empty((len(uniq), 7))
+        part[:, 0] = np.bincount(inverse, minlength=len(uniq))
+        for j in range(3):
+            part[:, 1 + j] = np.bincount(inverse, weights=scores[:, j], minlength=len(uniq))
+            part[:, 4 + j] = np.bincount(inverse, weights=scores[:, j] ** 2, minlength=len(uniq))
+        rows = self._rows_for(uniq.tolist())
+        np.add.at(self._acc, rows, part)
+
+    def result(self):
+        """返回 (keys, n, mean(n,3), std(n,3))，std 为总体标准差"""
+        acc = self._acc[:len(self._keys)]
+        n = acc[:, 0]
+        safe_n = np.where(n > 0, n, 1)
+        mean = acc[:, 1:4] / safe_n[:, None]
+        var = np.maximum(acc[:, 4:7] / safe_n[:, None] - mean ** 2, 0.0)
+        return self._keys, n.astype(np.int64), mean, np.sqrt(var)
+
+    def write_csv(self, path, key_name):
+        keys, n, mean, std = self.result()
+        with open(path, "w", encoding="utf-8-sig", newline="") as f:
+            writer = csv.writer(f)
+            header = [key_name, "n"]
+            for col in SCORE_COLUMNS:
+                header += [f"{col}_mean", f"{col}_std"]
+            writer.writerow(header)
+            for i, key in enumerate(keys):
+                line = [key, int(n[i])]
+                for j in range(3):
+                    line += [round(float(mean[i, j]), 4), round(float(std[i, j]), 4)]
+                writer.writerow(line)
+
+
+def export(conn, placeholder, out_path=None, fmt="csv", stats_dir=None, chunk_size=5000):
+    """流式导出并计算统计量，返回导出的行数"""
+    sink = SINKS[fmt](out_path) if out_path else None
+    per_image = ScoreAggregator()
+    per_user = ScoreAggregator()
+    total = 0
+    try:
+        for rows in iter_chunks(conn, placeholder, chunk_size):
+            if sink:
+                sink.write(rows)
+            if stats_dir:
+                users = np.array([r[0] for r in rows], dtype=object)
+                images = np.array([r[2] for r in rows], dtype=object)
+                scores = np.array([r[3:6] for r in rows], dtype=np.float64)
+                per_image.add(images, scores)
+                per_user.add(users, scores)
+            total += len(rows)
+    finally:
+        if sink:
+            sink.close()
+
+    if stats_dir:
+        os.makedirs(stats_dir, exist_ok=True)
+        per_image.write_csv(os.path.join(stats_dir, "per_image.csv"), "image_name")
+        per_user.write_csv(os.path.join(stats_dir, "per_user.csv"), "user_id")
+    return total
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="导出 annotations 表并计算每张图 / 每个用户的分数统计")
+    parser.add_argument("--backend", choices=["mysql", "sqlite"], default="mysql")
+    parser.add_argument("--secrets", default=".streamlit/secrets.toml", help="MySQL/TiDB 连接配置")
+    parser.add_argument("--sqlite-path", default="underwater_aesthetics.db")
+    parser.add_argument("--format", choices=sorted(SINKS), default="csv")
+    parser.add_argument("--out", help="导出文件路径，不填则只算统计")
+    parser.add_argument("--stats-dir", help="统计结果目录 (per_image.csv / per_user.csv)")
+    parser.add_argument("--chunk-size", type=int, default=5000)
+    args = parser.parse_args()
+
+    if not args.out and not args.stats_dir:
+        parser.error("--out 和 --stats-dir 至少指定一个")
+
+    if args.backend == "mysql":
+        db_conn, mark = connect_mysql(load_tidb_config(args.secrets)), "%s"
+    else:
+        db_conn, mark = connect_sqlite(args.sqlite_path), "?"
+    try:
+        count = export(db_conn, mark, args.out, args.format, args.stats_dir, args.chunk_size)
+    finally:
+        db_conn.close()
+    print(f"共导出 {count} 条标注")
@@ -0,0 +1,188 @@
+import argparse
+import hashlib
+import io
+import os
+import threading
+from concurrent.futures import ProcessPoolExecutor
+from pathlib import Path
+
+from PIL import Image, ImageOps, features
+
+# ================= 派生图片缓存 (本地版 app1_1.py) =================
+# 原图动辄几 MB，每次 rerun 都经 PIL 原尺寸重新编码。
+# 这里把原图缩放到显示宽度、按固定质量压缩后存到磁盘，之后直接读字节。
+
+IMAGE_SUFFIXES = ('.jpg', '.jpeg', '.png', '.bmp')
+
+
+def pick_format(fmt):
+    """Pillow 没编译 WebP 支持时退回 JPEG"""
+    fmt = fmt.upper()
+    if fmt == "WEBP" and not features.check("webp"):
+        return "JPEG"
+    return fmt
+
+
+def render_derived(src_path, width, quality, fmt):
+    """缩放（只缩小不放大）并重新编码，返回图片字节"""
+    with Image.open(src_path) as img:
+        img = ImageOps.exif_transpose(img)
+        if img.mode not in ("RGB", "L"):
+            img = img.convert("RGB")
+        if img.width > width:
+            height = round(img.height * width / img.width)
+            img = img.resize((width, height), Image.LANCZOS)
+        buf = io.BytesIO()
+        if fmt == "JPEG":
+            img.save(buf, "JPEG", quality=quality, optimize=True, progressive=True)
+        else:
+            img.save(buf, fmt, quality=quality, method=4)
+    return buf.getvalue()
+
+
+def derived_path(cache_dir, src_path, width, quality, fmt):
+    st_info = os.stat(src_path)
+    raw = f"{os.path.abspath(src_path)}|{st_info.st_mtime_ns}|{st_info.st_size}|{width}|{quality}|{fmt}"
+    key = hashlib.sha1(raw.encode("utf-8")).hexdigest()
+    return Path(cache_dir) / key[:2] / f"{key}.{fmt.lower()}"
+
+
+def write_atomic(target, data):
+    # 先写临时文件再原子替换，并发读到的永远是完整文件
+    target.parent.mkdir(exist_ok=True)
+    tmp = target.with_name(f"{target.name}.{os.getpid()}.{threading.get_ident()}.tmp")
+    tmp.write_bytes(data)
+    os.replace(tmp, target)
+
+
+class DerivedImageCache:
+    """
+    磁盘缓存，key = (原图路径, mtime, 文件大小, 显示宽度, 质量, 格式)。
+    原图被替换后 mtime/size 变化，自然生成新 key；旧文件由 LRU 淘汰。
+    LRU 以缓存文件的 mtime 作为最近访问时间，命中时 touch 一下。
+    """
+
+    def __init__(self, cache_dir=".image_cache", max_bytes=2 * 1024 ** 3, width=1600, quality=82, fmt="WEBP"):
+        self.cache_dir = Path(cache_dir)
+        self.max_bytes = max_bytes
+        self.width = width
+        self.quality = quality
+        self.fmt = pick_format(fmt)
+        self.cache_dir.mkdir(parents=True, exist_ok=True)
+
+        self._lock = threading.Lock()
+        self._stats = {"hits": 0, "misses": 0, "evictions": 0}
+        self._total_bytes = sum(size for _, size, _ in self._scan())
+
+    def _scan(self):
+        entries = []
+        for sub in self.cache_dir.iterdir():
+            if not sub.is_dir():
+                continue
+            for f in sub.iterdir():
+                try:
+                    st_info = f.stat()
+                except FileNotFoundError:
+                    continue
+                entries.append((f, st_info.st_size, st_info.st_mtime))
+        return entries
+
+    def cache_path(self, src_path):
+        return derived_path(self.cache_dir, src_path, self.width, self.quality, self.fmt)
+
+    def get(self, src_path):
+        """返回缩放后的图片字节；未命中时现场生成并写入缓存。"""
+        target = self.cache_path(src_path)
+        try:
+            data = target.read_bytes()
+            os.utime(target)
+            with self._lock:
+                self._stats["hits"] += 1
+            return data
+        except FileNotFoundError:
+            pass
+
+        data = render_derived(src_path, self.width, self.quality, self.fmt)
+        self._store(target, data)
+        with self._lock:
+            self._stats["misses"] += 1
+        return data
+
+    def _store(self, target, data):
+        write_atomic(target, data)
+        with self._lock:
+            self._total_bytes += len(data)
+            over = self._total_bytes > self.max_bytes
+        if over:
+            self.evict()
+
+    def evict(self):
+        """按最近访问时间从旧到新删除，直到回落到预算的 90%。"""
+        with self._lock:
+            entries = sorted(self._scan(), key=lambda e: e[2])
+            total = sum(size for _, size, _ in entries)
+            limit = self.max_bytes * 0.9
+            for f, size, _ in entries:
+                if total <= limit:
+                    break
+                try:
+                    f.unlink()
+                except FileNotFoundError:
+                    continue
+                total -= size
+                self._stats["evictions"] += 1
+            self._total_bytes = total
+
+    def metrics(self):
+        with self._lock:
+            data = dict(self._stats)
+            data["bytes"] = self._total_bytes
+        return data
+
+
+# ================= 批量预生成 =================
+
+def iter_source_images(root):
+    for dirpath, _, filenames in os.walk(root):
+        for name in sorted(filenames):
+            if name.lower().endswith(IMAGE_SUFFIXES):
+                yield os.path.join(dirpath, name)
+
+
+def _pregenerate_one(args):
+    src_path, cache_dir, width, quality, fmt = args
+    target = derived_path(cache_dir, src_path, width, quality, fmt)
+    if target.exists():
+        return 0
+    data = render_derived(src_path, width, quality, fmt)
+    write_atomic(target, data)
+    return len(data)
+
+
+def pregenerate(root, cache, workers=None):
+    """用进程池把 root 下所有原图预先生成到缓存，返回 (新生成张数, 新增字节数)。"""
+    jobs = [(src, str(cache.cache_dir), cache.width, cache.quality, cache.fmt) for src in iter_source_images(root)]
+    created, written = 0, 0
+    with ProcessPoolExecutor(max_workers=workers) as pool:
+        for size in pool.map(_pregenerate_one, jobs, chunksize=16):
+            if size:
+                created += 1
+                written += size
+    cache.evict()
+    return created, written
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="批量预生成缩放后的评分图片")
+    parser.add_argument("root", help="原图根目录，例如 Image_3600")
+    parser.add_argument("--cache-dir", default=".image_cache")
+    parser.add_argument("--width", type=int, default=1600)
+    parser.add_argument("--quality", type=int, default=82)
+    parser.add_argument("--format", default="WEBP", choices=["WEBP", "JPEG"])
+    parser.add_argument("--max-mb", type=int, default=2048)
+    parser.add_argument("--workers", type=int, default=None)
+    args = parser.parse_args()
+
+    image_cache = DerivedImageCache(args.cache_dir, args.max_mb * 1024 ** 2, args.width, args.quality, args.format)
+    n, nbytes = pregenerate(args.root, image_cache, args.workers)
+    print(f"新生成 {n} 张，共 {nbytes / 1024 ** 2:.1f} MB；缓存总计 {image_cache.metrics()['bytes'] / 1024 ** 2:.1f} MB")
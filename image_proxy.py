@@ -0,0 +1,513 @@
+import argparse
+import email.utils
+import hashlib
+import io
+import json
+import os
+import threading
+import time
+import urllib.error
+import urllib.request
+import weakref
+from concurrent.futures import ThreadPoolExecutor
+from http.server import SimpleHTTPRequestHandler, BaseHTTPRequestHandler, ThreadingHTTPServer
+from pathlib import Path
+
+# ================= 图片缓存代理 (边缘节点 / 离线实验室) =================
+# 浏览器不再直连 OSS：把 CLOUD_BASE_URL（环境变量 SCORE_IMAGE_BASE_URL）指向本代理，
+# 首次请求从源站取回并落盘，之后直接从本地磁盘返回。
+#   - 磁盘 LRU：以文件 mtime 作为最近访问时间，超出预算后淘汰到 90%
+#   - 过期 (max_age) 后带 If-None-Match / If-Modified-Since 回源校验，304 只刷新时间
+#   - 源站不可达时继续返回旧副本（离线可用）
+#   - 支持浏览器的 Range 与条件请求 (ETag / Last-Modified)
+#
+#   python image_proxy.py serve --origin https://score-1.oss-cn-beijing.aliyuncs.com/Image_3600/ --port 8600
+#   python image_proxy.py prewarm --proxy http://127.0.0.1:8600/ --manifest image_names.txt
+#   python image_proxy.py stub-origin --root ./oss_stub --generate   # 本地模拟 OSS，测试用
+
+CHUNK = 256 * 1024
+
+
+def _write_atomic(target, data):
+    target.parent.mkdir(exist_ok=True)
+    tmp = target.with_name(f"{target.name}.{os.getpid()}.{threading.get_ident()}.tmp")
+    tmp.write_bytes(data)
+    os.replace(tmp, target)
+
+
+def _open_entry(entry_path):
+    """
+    打开缓存文件并读出头部，返回 (meta, 已定位到内容开头的文件)。
+    先打开再读：之后即使被淘汰或被新版本替换，已打开的文件仍是完整的旧版本。
+    文件不存在（已淘汰 / 还没写）或格式不对（旧版本的缓存）时返回 (None, None)，按未命中处理。
+    """
+    try:
+        f = open(entry_path, "rb")
+    except FileNotFoundError:
+        return None, None
+    try:
+        return json.loads(f.readline()), f
+    except ValueError:
+        f.close()
+        return None, None
+
+
+def parse_range(header, size):
+    """
+    只支持单个区间 bytes=a-b / a- / -n，返回 (start, end) 闭区间。
+    无法满足返回 "unsatisfiable"；格式不支持（多区间等）返回 None，按整个文件返回。
+    """
+    if not header or not header.startswith("bytes=") or "," in header:
+        return None
+    start_s, _, end_s = header[6:].strip().partition("-")
+    try:
+        if start_s == "":
+            length = int(end_s)
+            if length <= 0:
+                return "unsatisfiable"
+            return max(0, size - length), size - 1
+        start = int(start_s)
+        end = int(end_s) if end_s else size - 1
+    except ValueError:
+        return None
+    if start >= size or end < start:
+        return "unsatisfiable"
+    return start, min(end, size - 1)
+
+
+# ================= 1. 源站 =================
+
+class Origin:
+    def __init__(self, base_url, timeout=10):
+        self.base_url = base_url if base_url.endswith("/") else base_url + "/"
+        self.timeout = timeout
+
+    def fetch(self, path, etag=None, last_modified=None):
+        """返回 (状态码, 响应头, 内容)；304 / 4xx 不抛异常，网络错误抛出"""
+        headers = {}
+        if etag:
+            headers["If-None-Match"] = etag
+        if last_modified:
+            headers["If-Modified-Since"] = last_modified
+        request = urllib.request.Request(self.base_url + path, headers=headers)
+        try:
+            with urllib.request.urlopen(request, timeout=self.timeout) as resp:
+                return resp.status, resp.headers, resp.read()
+        except urllib.error.HTTPError as e:
+            if e.code >= 500:
+                raise
+            return e.code, e.headers, b""
+
+
+# ================= 2. 磁盘缓存 =================
+
+class ProxyCache:
+    """
+    每个对象一个文件 <sha1>.bin：第一行是 JSON 头（ETag / Last-Modified / 类型 / 大小 / 上次校验时间），
+    之后是内容。头和内容一起写进临时文件再 os.replace，读到的两者总是同一个版本。
+    max_age: 距上次校验超过该秒数后回源校验。
+    """
+
+    def __init__(self, origin, cache_dir=".proxy_cache", max_bytes=4 * 1024 ** 3, max_age=86400):
+        self.origin = origin
+        self.cache_dir = Path(cache_dir)
+        self.max_bytes = max_bytes
+        self.max_age = max_age
+        self.cache_dir.mkdir(parents=True, exist_ok=True)
+
+        self._lock = threading.Lock()
+        self._key_locks = weakref.WeakValueDictionary()  # 没有线程持有时自动清掉
+        self._stats = {"hits": 0, "misses": 0, "revalidated": 0, "refreshed": 0, "stale": 0,
+                       "not_found": 0, "origin_errors": 0, "store_errors": 0, "evictions": 0,
+                       "bytes_from_origin": 0}
+        self._total_bytes = sum(size for _, size, _ in self._scan())
+
+    def _entry_path(self, path):
+        key = hashlib.sha1(path.encode("utf-8")).hexdigest()
+        return self.cache_dir / key[:2] / f"{key}.bin"
+
+    def _scan(self):
+        entries = []
+        for sub in self.cache_dir.iterdir():
+            if not sub.is_dir():
+                continue
+            for f in sub.glob("*.bin"):
+                try:
+                    st_info = f.stat()
+                except FileNotFoundError:
+                    continue
+                entries.append((f, st_info.st_size, st_info.st_mtime))
+        return entries
+
+    def _key_lock(self, path):
+        # 同一张图的并发未命中只回源一次；锁只在取回期间被引用，用完即回收，字典不会随图片数增长
+        with self._lock:
+            lock = self._key_locks.get(path)
+            if lock is None:
+                lock = self._key_locks[path] = threading.Lock()
+            return lock
+
+    def _count(self, name, n=1):
+        with self._lock:
+            self._stats[name] += n
+
+    def _touch(self, entry_path):
+        # mtime 即最近访问时间；文件可能刚被淘汰
+        try:
+            os.utime(entry_path)
+        except OSError:
+            pass
+
+    def _write_entry(self, entry_path, meta, body):
+        """头和内容一次原子替换；写失败（磁盘满、Windows 上文件正被读取等）时本次仍从内存返回"""
+        try:
+            old_size = entry_path.stat().st_size
+        except FileNotFoundError:
+            old_size = 0
+        data = json.dumps(meta).encode("utf-8") + b"\n" + body
+        try:
+            _write_atomic(entry_path, data)
+        except OSError as e:
+            print(f"Proxy Cache Write Error: {e}")
+            self._count("store_errors")
+            return
+        with self._lock:
+            self._total_bytes += len(data) - old_size
+            over = self._total_bytes > self.max_bytes
+        if over:
+            self.evict()
+
+    def _store(self, entry_path, headers, body):
+        meta = {
+            "etag": headers.get("ETag"),
+            "last_modified": headers.get("Last-Modified"),
+            "content_type": headers.get("Content-Type", "application/octet-stream"),
+            "size": len(body),
+            "checked": time.time(),
+        }
+        self._count("bytes_from_origin", len(body))
+        self._write_entry(entry_path, meta, body)
+        return meta
+
+    def get(self, path):
+        """
+        返回 (meta, 已定位到内容开头的文件对象, 缓存状态)，文件由调用方关闭；
+        源站 404 时返回 (None, None, "NOT_FOUND")。
+        """
+        entry_path = self._entry_path(path)
+        meta, f = _open_entry(entry_path)
+        if meta is not None and time.time() - meta["checked"] < self.max_age:
+            self._touch(entry_path)
+            self._count("hits")
+            return meta, f, "HIT"
+        if f is not None:
+            f.close()
+
+        with self._key_lock(path):
+            # 拿到锁后再看一次，别的线程可能刚取回
+            meta, f = _open_entry(entry_path)
+            cached = meta is not None
+            if cached and time.time() - meta["checked"] < self.max_age:
+                self._touch(entry_path)
+                self._count("hits")
+                return meta, f, "HIT"
+
+            try:
+                if cached:
+                    status, headers, body = self.origin.fetch(path, meta.get("etag"), meta.get("last_modified"))
+                else:
+                    status, headers, body = self.origin.fetch(path)
+            except Exception as e:
+                self._count("origin_errors")
+                if cached:
+                    # 源站不可达时用旧副本，离线实验照常进行
+                    self._count("stale")
+                    return meta, f, "STALE"
+                raise ConnectionError(f"源站不可达: {e}")
+
+            if status == 304 and cached:
+                # 校验时间和内容在同一个文件里，重写整个文件（每个对象每 max_age 才一次）
+                body = f.read()
+                f.close()
+                meta["checked"] = time.time()
+                self._write_entry(entry_path, meta, body)
+                self._count("revalidated")
+                return meta, io.BytesIO(body), "REVALIDATED"
+            if cached:
+                f.close()
+            if status == 200:
+                meta = self._store(entry_path, headers, body)
+                self._count("refreshed" if cached else "misses")
+                return meta, io.BytesIO(body), "REFRESHED" if cached else "MISS"
+            self._count("not_found")
+            return None, None, "NOT_FOUND"
+
+    def evict(self):
+        """按最近访问时间从旧到新删除，直到回落到预算的 90%。"""
+        with self._lock:
+            entries = sorted(self._scan(), key=lambda e: e[2])
+            total = sum(size for _, size, _ in entries)
+            limit = self.max_bytes * 0.9
+            for f, size, _ in entries:
+                if total <= limit:
+                    break
+                try:
+                    f.unlink()
+                    # 旧版本缓存的元数据文件
+                    f.with_suffix(".json").unlink(missing_ok=True)
+                except OSError:
+                    # 已被删除，或（Windows 上）正在被读取，下次再淘汰
+                    continue
+                total -= size
+                self._stats["evictions"] += 1
+            self._total_bytes = total
+
+    def metrics(self):
+        with self._lock:
+            data = dict(self._stats)
+            data["bytes"] = self._total_bytes
+        served = data["hits"] + data["misses"] + data["revalidated"] + data["refreshed"] + data["stale"]
+        data["hit_rate"] = (data["hits"] + data["revalidated"] + data["stale"]) / served if served else 0.0
+        return data
+
+
+# ================= 3. HTTP 服务 =================
+
+class ProxyHandler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+    cache = None  # 由 serve() 设置
+    browser_max_age = 86400
+
+    def log_message(self, fmt, *args):
+        pass
+
+    def do_HEAD(self):
+        self._serve(send_body=False)
+
+    def do_GET(self):
+        if self.path == "/_proxy/metrics":
+            body = json.dumps(self.cache.metrics()).encode("utf-8")
+            self.send_response(200)
+            self.send_header("Content-Type", "application/json")
+            self.send_header("Content-Length", str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+            return
+        self._serve(send_body=True)
+
+    def _not_modified(self, meta):
+        etag = meta.get("etag")
+        if_none_match = self.headers.get("If-None-Match")
+        if if_none_match is not None:
+            return etag is not None and (if_none_match.strip() == "*" or
+                                         etag in [t.strip() for t in if_none_match.split(",")])
+        if_modified_since = self.headers.get("If-Modified-Since")
+        if if_modified_since and meta.get("last_modified"):
+            try:
+                return (email.utils.parsedate_to_datetime(meta["last_modified"])
+                        <= email.utils.parsedate_to_datetime(if_modified_since))
+            except (TypeError, ValueError):
+                return False
+        return False
+
+    def _send_simple(self, code, message=b""):
+        self.send_response(code)
+        self.send_header("Content-Length", str(len(message)))
+        self.end_headers()
+        if message and self.command != "HEAD":
+            self.wfile.write(message)
+
+    def _serve(self, send_body):
+        # 查询串不参与缓存键：?v=1、?v=2 不会各占一份缓存和一把锁
+        path = self.path.split("?", 1)[0].lstrip("/")
+        if not path or ".." in path.split("/"):
+            self._send_simple(400)
+            return
+        try:
+            meta, body, status = self.cache.get(path)
+        except ConnectionError:
+            self._send_simple(502, b"origin unavailable")
+            return
+        if meta is None:
+            self._send_simple(404)
+            return
+        try:
+            self._respond(meta, body, status, send_body)
+        finally:
+            body.close()
+
+    def _respond(self, meta, body, status, send_body):
+        """body 为 cache.get 打开的文件（已定位到内容开头），这里只读不关"""
+        common = [("Cache-Control", f"public, max-age={self.browser_max_age}"), ("Accept-Ranges", "bytes"),
+                  ("X-Cache", status)]
+        if meta.get("etag"):
+            common.append(("ETag", meta["etag"]))
+        if meta.get("last_modified"):
+            common.append(("Last-Modified", meta["last_modified"]))
+
+        if self._not_modified(meta):
+            self.send_response(304)
+            for name, value in common:
+                self.send_header(name, value)
+            self.end_headers()
+            return
+
+        size = meta["size"]
+        byte_range = parse_range(self.headers.get("Range"), size)
+        if byte_range == "unsatisfiable":
+            self.send_response(416)
+            self.send_header("Content-Range", f"bytes */{size}")
+            self.send_header("Content-Length", "0")
+            self.end_headers()
+            return
+        start, end = byte_range if byte_range else (0, size - 1)
+        length = end - start + 1 if size else 0
+
+        self.send_response(206 if byte_range else 200)
+        for name, value in common:
+            self.send_header(name, value)
+        self.send_header("Content-Type", meta["content_type"])
+        self.send_header("Content-Length", str(length))
+        if byte_range:
+            self.send_header("Content-Range", f"bytes {start}-{end}/{size}")
+        self.end_headers()
+        if not send_body or not length:
+            return
+        body.seek(start, io.SEEK_CUR)
+        remaining = length
+        while remaining > 0:
+            chunk = body.read(min(CHUNK, remaining))
+            if not chunk:
+                break
+            self.wfile.write(chunk)
+            remaining -= len(chunk)
+
+
+def serve(cache, host="0.0.0.0", port=8600, browser_max_age=86400):
+    handler = type("BoundProxyHandler", (ProxyHandler,), {"cache": cache, "browser_max_age": browser_max_age})
+    server = ThreadingHTTPServer((host, port), handler)
+    server.daemon_threads = True
+    return server
+
+
+# ================= 4. 预热 =================
+
+def prewarm(proxy_url, manifest_path="image_names.txt", workers=16, timeout=30):
+    """按 image_names.txt 逐张请求一次代理，返回 {X-Cache 状态: 张数}"""
+    proxy_url = proxy_url if proxy_url.endswith("/") else proxy_url + "/"
+    with open(manifest_path, "r", encoding="utf-8") as f:
+        paths = [line.strip() for line in f if line.strip()]
+
+    def warm(path):
+        request = urllib.request.Request(proxy_url + urllib.request.quote(path), method="HEAD")
+        try:
+            with urllib.request.urlopen(request, timeout=timeout) as resp:
+                return resp.headers.get("X-Cache", "OK")
+        except urllib.error.HTTPError as e:
+            return f"HTTP {e.code}"
+        except Exception:
+            return "ERROR"
+
+    counts = {}
+    with ThreadPoolExecutor(max_workers=workers) as pool:
+        for status in pool.map(warm, paths):
+            counts[status] = counts.get(status, 0) + 1
+    return counts
+
+
+# ================= 5. 本地 OSS 替身（测试用） =================
+
+class StubOriginHandler(SimpleHTTPRequestHandler):
+    """静态文件服务，补上 OSS 会返回的 ETag 和 If-None-Match 支持"""
+
+    def log_message(self, fmt, *args):
+        pass
+
+    def send_head(self):
+        path = self.translate_path(self.path)
+        if os.path.isfile(path):
+            st_info = os.stat(path)
+            etag = f'"{st_info.st_mtime_ns:x}-{st_info.st_size:x}"'
+            if self.headers.get("If-None-Match") == etag:
+                self.send_response(304)
+                self.send_header("ETag", etag)
+                self.end_headers()
+                return None
+            self._etag = etag
+        return super().send_head()
+
+    def end_headers(self):
+        etag = getattr(self, "_etag", None)
+        if etag:
+            self.send_header("ETag", etag)
+            self._etag = None
+        super().end_headers()
+
+
+def generate_stub_images(root, manifest_path="image_names.txt"):
+    """按 image_names.txt 生成占位 JPEG（需要 Pillow），已存在的跳过"""
+    from PIL import Image
+
+    created = 0
+    with open(manifest_path, "r", encoding="utf-8") as f:
+        for i, line in enumerate(f):
+            rel_path = line.strip()
+            if not rel_path:
+                continue
+            target = Path(root) / rel_path
+            if target.exists():
+                continue
+            target.parent.mkdir(parents=True, exist_ok=True)
+            Image.new("RGB", (320, 240), (i % 256, 90, 160)).save(target, "JPEG")
+            created += 1
+    return created
+
+
+def serve_stub_origin(root, host="127.0.0.1", port=9600):
+    handler = type("BoundStubOriginHandler", (StubOriginHandler,),
+                   {"__init__": lambda self, *a, **kw: StubOriginHandler.__init__(self, *a, directory=root, **kw)})
+    server = ThreadingHTTPServer((host, port), handler)
+    server.daemon_threads = True
+    return server
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="评分图片缓存代理")
+    sub = parser.add_subparsers(dest="command", required=True)
+
+    p = sub.add_parser("serve", help="启动缓存代理")
+    p.add_argument("--origin", required=True, help="源站前缀，例如 OSS 的 Image_3600/ 地址")
+    p.add_argument("--host", default="0.0.0.0")
+    p.add_argument("--port", type=int, default=8600)
+    p.add_argument("--cache-dir", default=".proxy_cache")
+    p.add_argument("--max-mb", type=int, default=4096)
+    p.add_argument("--max-age", type=int, default=86400, help="超过该秒数后回源校验 ETag")
+    p.add_argument("--timeout", type=float, default=10, help="回源超时秒数")
+
+    p = sub.add_parser("prewarm", help="按清单预热代理缓存")
+    p.add_argument("--proxy", required=True, help="代理地址，例如 http://127.0.0.1:8600/")
+    p.add_argument("--manifest", default="image_names.txt")
+    p.add_argument("--workers", type=int, default=16)
+
+    p = sub.add_parser("stub-origin", help="本地静态服务，模拟 OSS 源站")
+    p.add_argument("--root", required=True)
+    p.add_argument("--host", default="127.0.0.1")
+    p.add_argument("--port", type=int, default=9600)
+    p.add_argument("--generate", action="store_true", help="按 --manifest 生成占位图片")
+    p.add_argument("--manifest", default="image_names.txt")
+
+    args = parser.parse_args()
+    if args.command == "serve":
+        proxy_cache = ProxyCache(Origin(args.origin, args.timeout), args.cache_dir,
+                                 args.max_mb * 1024 ** 2, args.max_age)
+        httpd = serve(proxy_cache, args.host, args.port)
+        print(f"图片代理: http://{args.host}:{args.port}/ -> {args.origin}（指标见 /_proxy/metrics）")
+        httpd.serve_forever()
+    elif args.command == "prewarm":
+        print(prewarm(args.proxy, args.manifest, args.workers))
+    else:
+        if args.generate:
+            print(f"生成占位图片 {generate_stub_images(args.root, args.manifest)} 张")
+        httpd = serve_stub_origin(args.root, args.host, args.port)
+        print(f"模拟源站: http://{args.host}:{args.port}/  (目录 {args.root})")
+        httpd.serve_forever()
@@ -0,0 +1,315 @@
+import argparse
+import multiprocessing
+import os
+import pickle
+import random
+import sqlite3
+import statistics
+import sys
+import tempfile
+import threading
+import time
+import tomllib
+import tracemalloc
+
+from streamlit.testing.v1 import AppTest
+
+# ================= 并发评分压测 =================
+# 用 Streamlit AppTest 无界面地驱动 main()，每个虚拟评分员一个 AppTest 会话：
+#   登录 -> 断点续评 (Storage.resume_state) -> 反复提交 save_to_db
+# 目标库可以是本地 MySQL（跑 app.py / app3.py）、SQLite（跑 app1_1.py），
+# 也可以是内存后端（SCORE_STORAGE=memory，跑 app.py），只测页面本身的开销。
+#
+#   python load_test.py --target sqlite --users 50 --submits 20
+#   python load_test.py --target memory --users 200
+#   python load_test.py --target mysql --secrets .streamlit/secrets.toml --users 200 --app app3.py
+
+REPO_DIR = os.path.dirname(os.path.abspath(__file__))
+
+
+# ================= 1. 数据库语句计数 =================
+
+class SqliteStatementCounter:
+    """包装 sqlite3.connect，给被测脚本打开的每个连接挂上 trace 回调，统计执行的语句数"""
+
+    def __init__(self):
+        self.count = 0
+        self._lock = threading.Lock()
+        self._connect = sqlite3.connect
+
+    def _trace(self, _sql):
+        with self._lock:
+            self.count += 1
+
+    def install(self):
+        def connect(*args, **kwargs):
+            conn = self._connect(*args, **kwargs)
+            conn.set_trace_callback(self._trace)
+            return conn
+        sqlite3.connect = connect
+
+    def read(self):
+        with self._lock:
+            return self.count
+
+
+class MysqlStatementCounter:
+    """读服务端的 Questions 计数器，包含所有客户端发出的语句"""
+
+    def __init__(self, db_config):
+        import mysql.connector
+        self._conn = mysql.connector.connect(
+            host=db_config["host"], user=db_config["user"], password=db_config["password"],
+            port=db_config["port"], database=db_config["database"], autocommit=True,
+        )
+
+    def read(self):
+        c = self._conn.cursor()
+        c.execute("SHOW GLOBAL STATUS LIKE 'Questions'")
+        value = int(c.fetchone()[1])
+        c.close()
+        return value - 1  # 不算这条 SHOW 自己
+
+
+def wait_until_quiet(counter, quiet_seconds=1.0, timeout=30):
+    """后台写线程是异步的：等语句计数停止增长，再统计写入阶段的往返数"""
+    deadline = time.monotonic() + timeout
+    last = counter.read()
+    while time.monotonic() < deadline:
+        time.sleep(quiet_seconds)
+        now = counter.read()
+        if now == last:
+            return now
+        last = now
+    return last
+
+
+# ================= 2. 测试数据 =================
+
+def make_sqlite_stand_in(workdir, groups):
+    """为 app1_1.py 生成小尺寸的占位图片，文件名沿用 image_names.txt"""
+    from PIL import Image
+    from manifest import get_group_images
+
+    root = os.path.join(workdir, "images")
+    for g in groups:
+        folder = f"Group_{g}"
+        os.makedirs(os.path.join(root, folder), exist_ok=True)
+        for i, rel_path in enumerate(get_group_images(folder, os.path.join(REPO_DIR, "image_names.txt"))):
+            Image.new("RGB", (64, 48), (i % 256, 80, 160)).save(os.path.join(root, rel_path), "JPEG")
+    return root
+
+
+# ================= 3. 虚拟评分员 =================
+# AppTest 会替换全局的 Runtime 和 st.secrets，同一进程内不能并发 run()；
+# 因此并发度由 worker 进程数决定，每个进程内的评分员轮流提交（模拟多副本部署）。
+
+def percentile(values, p):
+    if not values:
+        return 0.0
+    ordered = sorted(values)
+    k = min(len(ordered) - 1, max(0, round(p / 100 * (len(ordered) - 1))))
+    return ordered[k]
+
+
+def find_button(at, prefix):
+    for b in at.button:
+        if b.label.startswith(prefix):
+            return b
+    return None
+
+
+def login(script, secrets, user_id, group):
+    at = AppTest.from_file(script, default_timeout=120)
+    at.secrets.update(secrets)
+    at.run()
+    at.sidebar.text_input[0].input(user_id)
+    at.sidebar.selectbox[0].select(f"Group {group}")
+    at.run()
+    return at
+
+
+def submit_blind_rating(at):
+    """app.py 的评分在浏览器组件里完成，AppTest 无法操作 iframe，直接写入组件提交的值"""
+    if not any(getattr(e, "type", "") == "component_instance" for e in at.main):
+        return False
+    at.session_state[f"rating_{at.session_state['current_index']}"] = {
+        "scores": [random.randint(0, 100) for _ in range(3)],
+        "touched": [True, True, True],
+        "nonce": f"{time.perf_counter_ns()}-{random.random()}",
+    }
+    return True
+
+
+def submit_once(at):
+    """拖动三个滑块并点"下一张"（或提交评分组件），返回这次 rerun 的耗时；无法提交时返回 None"""
+    if at.exception:
+        return None
+    if len(at.slider) >= 3:
+        for slider in at.slider[:3]:
+            slider.set_value(random.choice([v for v in range(101) if v != slider.value]))
+        button = find_button(at, "下一张")
+        if button is None:
+            return None
+        button.click()
+    elif not submit_blind_rating(at):
+        return None
+    t0 = time.perf_counter()
+    at.run()
+    return time.perf_counter() - t0
+
+
+def worker_main(script, secrets, users, submits, barriers, results, count_sqlite, trace_memory, seed):
+    random.seed(seed)
+    sys.path.insert(0, REPO_DIR)
+    counter = SqliteStatementCounter() if count_sqlite else None
+    if counter:
+        counter.install()
+    if trace_memory:
+        tracemalloc.start()
+    mem_before = tracemalloc.get_traced_memory()[0] if trace_memory else 0
+
+    out = {"login": [], "submit": [], "errors": [], "state_bytes": [], "statements": 0, "mem_bytes": 0}
+    sessions = []
+    for user_id, group in users:
+        t0 = time.perf_counter()
+        sessions.append((user_id, login(script, secrets, user_id, group)))
+        out["login"].append(time.perf_counter() - t0)
+
+    login_done, start, done = barriers
+    login_done.wait()
+    start.wait()
+    stmt_before = counter.read() if counter else 0
+    active = list(sessions)
+    for _ in range(submits):
+        still_active = []
+        for user_id, at in active:
+            latency = submit_once(at)
+            if latency is not None:
+                out["submit"].append(latency)
+                still_active.append((user_id, at))
+        active = still_active
+    out["statements"] = (counter.read() if counter else 0) - stmt_before
+    done.wait()
+
+    for user_id, at in sessions:
+        if at.exception:
+            out["errors"].append(f"{user_id}: {at.exception[0].message}")
+        out["state_bytes"].append(len(pickle.dumps(at._session_state.filtered_state)))
+    if trace_memory:
+        out["mem_bytes"] = tracemalloc.get_traced_memory()[0] - mem_before
+        tracemalloc.stop()
+    results.put(out)
+
+
+def run_load_test(script, secrets, users, submits, workers, seed, trace_memory, mysql_counter=None):
+    ctx = multiprocessing.get_context("spawn")
+    workers = max(1, min(workers, users))
+    barriers = tuple(ctx.Barrier(workers + 1) for _ in range(3))
+    results = ctx.Queue()
+    run_tag = f"bench{int(time.time())}"
+    all_users = [(f"{run_tag}_{i:04d}", i % 6 + 1) for i in range(users)]
+
+    procs = [
+        ctx.Process(target=worker_main, daemon=True,
+                    args=(script, secrets, all_users[w::workers], submits, barriers, results,
+                          mysql_counter is None, trace_memory, seed + w))
+        for w in range(workers)
+    ]
+    t_start = time.perf_counter()
+    for p in procs:
+        p.start()
+
+    login_done, start, done = barriers
+    login_done.wait()
+    login_wall = time.perf_counter() - t_start
+    db_before = wait_until_quiet(mysql_counter) if mysql_counter else 0
+    start.wait()
+    t_submit = time.perf_counter()
+    done.wait()
+    submit_wall = time.perf_counter() - t_submit
+    # 后台写线程异步落库，等它写完再读服务端计数
+    db_after = wait_until_quiet(mysql_counter) if mysql_counter else 0
+
+    merged = {"login": [], "submit": [], "errors": [], "state_bytes": [], "statements": 0, "mem_bytes": 0}
+    for _ in procs:
+        out = results.get()
+        for key in ("login", "submit", "errors", "state_bytes"):
+            merged[key] += out[key]
+        merged["statements"] += out["statements"]
+        merged["mem_bytes"] += out["mem_bytes"]
+    for p in procs:
+        p.join()
+
+    statements = (db_after - db_before) if mysql_counter else merged["statements"]
+    n_submits = len(merged["submit"])
+    return {
+        "users": users,
+        "workers": workers,
+        "login_wall_s": login_wall,
+        "login_p50_ms": percentile(merged["login"], 50) * 1000,
+        "login_p95_ms": percentile(merged["login"], 95) * 1000,
+        "submits": n_submits,
+        "submit_p50_ms": percentile(merged["submit"], 50) * 1000,
+        "submit_p95_ms": percentile(merged["submit"], 95) * 1000,
+        "submit_p99_ms": percentile(merged["submit"], 99) * 1000,
+        "throughput_per_s": n_submits / submit_wall if submit_wall > 0 else 0.0,
+        "db_statements_per_submit": statements / n_submits if n_submits else 0.0,
+        "session_state_bytes_avg": statistics.mean(merged["state_bytes"]) if merged["state_bytes"] else 0,
+        "traced_mem_per_session_kb": merged["mem_bytes"] / users / 1024 if trace_memory else None,
+        "errors": merged["errors"],
+    }
+
+
+def print_report(report):
+    print(f"虚拟评分员: {report['users']}（{report['workers']} 个并发进程），成功提交: {report['submits']}")
+    print(f"登录+续评: 总耗时 {report['login_wall_s']:.2f}s  p50 {report['login_p50_ms']:.1f}ms  "
+          f"p95 {report['login_p95_ms']:.1f}ms")
+    print(f"提交延迟: p50 {report['submit_p50_ms']:.1f}ms  p95 {report['submit_p95_ms']:.1f}ms  "
+          f"p99 {report['submit_p99_ms']:.1f}ms")
+    print(f"吞吐: {report['throughput_per_s']:.1f} 次提交/秒")
+    print(f"每次提交的数据库语句数: {report['db_statements_per_submit']:.2f}")
+    print(f"每会话 session_state: {report['session_state_bytes_avg'] / 1024:.1f} KB (pickle)")
+    if report["traced_mem_per_session_kb"] is not None:
+        print(f"每会话 Python 内存增量: {report['traced_mem_per_session_kb']:.1f} KB (tracemalloc)")
+    for err in report["errors"][:10]:
+        print(f"  错误 {err}")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="用 AppTest 模拟并发评分员压测")
+    parser.add_argument("--target", choices=["sqlite", "mysql", "memory"], default="sqlite")
+    parser.add_argument("--app", help="被测脚本；默认 mysql / memory 用 app.py，sqlite 用 app1_1.py")
+    parser.add_argument("--secrets", default=".streamlit/secrets.toml", help="mysql 目标的连接配置")
+    parser.add_argument("--users", type=int, default=20)
+    parser.add_argument("--submits", type=int, default=10, help="每个评分员的提交次数")
+    parser.add_argument("--workers", type=int, default=os.cpu_count() or 4, help="并发 worker 进程数")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--tracemalloc", action="store_true", help="统计每会话的 Python 内存增量（会变慢）")
+    args = parser.parse_args()
+
+    sys.path.insert(0, REPO_DIR)
+    if args.target == "mysql":
+        with open(args.secrets, "rb") as f:
+            app_secrets = tomllib.load(f)
+        app_script = os.path.abspath(args.app or os.path.join(REPO_DIR, "app.py"))
+        os.chdir(os.path.dirname(app_script))  # 脚本按相对路径读 image_names.txt
+        stmt_counter = MysqlStatementCounter(app_secrets["connections"]["tidb"])
+    elif args.target == "memory":
+        # worker 进程继承环境变量，各自使用进程内的内存后端
+        os.environ["SCORE_STORAGE"] = "memory"
+        app_secrets = {}
+        app_script = os.path.abspath(args.app or os.path.join(REPO_DIR, "app.py"))
+        os.chdir(os.path.dirname(app_script))
+        stmt_counter = None
+    else:
+        app_secrets = {}
+        app_script = os.path.abspath(args.app or os.path.join(REPO_DIR, "app1_1.py"))
+        workdir = tempfile.mkdtemp(prefix="score_bench_")
+        os.environ["SCORE_IMAGE_ROOT"] = make_sqlite_stand_in(workdir, sorted({i % 6 + 1 for i in range(args.users)}))
+        os.environ["SCORE_DB_NAME"] = os.path.join(workdir, "bench.db")
+        os.chdir(workdir)
+        stmt_counter = None  # SQLite 在各 worker 进程内用 trace 回调计数
+
+    print_report(run_load_test(app_script, app_secrets, args.users, args.submits, args.workers, args.seed,
+                               args.tracemalloc, stmt_counter))
@@ -0,0 +1,53 @@
+import os
+import threading
+
+
+# ================= 图片清单索引 (image_names.txt) =================
+# 每个进程只解析一次清单，按分组建成 {group: tuple(图片路径)}；
+# 文件的 mtime/size 变化时自动重新解析。
+
+_lock = threading.Lock()
+_cache = {}  # path -> (mtime_ns, size, index)
+
+
+def parse_manifest(path):
+    """
+    逐行流式解析清单，内存只保存结果索引，不会先 readlines() 整个文件。
+    每行形如 "Group_1/1.jpg"，第一个 "/" 之前的部分即分组名。
+    """
+    groups = {}
+    with open(path, "r", encoding="utf-8") as f:
+        for line in f:
+            name = line.strip()
+            if not name:
+                continue
+            group, sep, _ = name.partition("/")
+            if not sep:
+                continue
+            bucket = groups.get(group)
+            if bucket is None:
+                bucket = groups[group] = []
+            bucket.append(name)
+    return {group: tuple(names) for group, names in groups.items()}
+
+
+def get_manifest(path="image_names.txt"):
+    """返回 {group: tuple}，缓存跨会话共享；清单文件被修改后下次调用会重新加载。"""
+    st_info = os.stat(path)
+    key = (st_info.st_mtime_ns, st_info.st_size)
+    cached = _cache.get(path)
+    if cached is not None and cached[:2] == key:
+        return cached[2]
+
+    with _lock:
+        cached = _cache.get(path)
+        if cached is not None and cached[:2] == key:
+            return cached[2]
+        index = parse_manifest(path)
+        _cache[path] = (key[0], key[1], index)
+        return index
+
+
+def get_group_images(group_folder, path="image_names.txt"):
+    """O(1) 取某个分组的图片（不可变 tuple，调用方需要打乱时请自行 list() 复制）。"""
+    return get_manifest(path).get(group_folder, ())
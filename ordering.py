@@ -0,0 +1,163 @@
+import hashlib
+import os
+import random
+import threading
+from collections import OrderedDict
+
+import streamlit as st
+
+from storage import secrets_section
+
+
+# ================= 图片顺序 =================
+# 每个 (user_id, 分组) 的图片顺序只计算一次，进程内按 LRU 缓存；
+# 可选写入 image_orders 表，换进程 / 重启后顺序不变。
+#
+# 模式：
+#   legacy  —— 旧算法 sum(ord(c))（默认）。已保存的进度（rater_progress、续评下标）都是按这个顺序的下标，
+#              进行中的实验换模式会让下标指向别的图片
+#   shuffle —— 以 sha256(user_id, 分组) 为种子打乱
+#   latin   —— Williams 平衡拉丁方：每张图在各位置出现的次数相同，且每对相邻图
+#              的前后顺序也各出现一次，位置效应在评分员之间相互抵消
+# shuffle / latin 只在新实验（或清空进度后）开启。
+
+ORDER_MODES = ("legacy", "shuffle", "latin")
+
+
+def ordering_seed(user_id, group_id):
+    """稳定的 64 位种子；与 Python 的 hash() 不同，跨进程、跨版本不变"""
+    digest = hashlib.sha256(f"{user_id}\x1f{group_id}".encode("utf-8")).digest()
+    return int.from_bytes(digest[:8], "big")
+
+
+def legacy_order(images, user_id):
+    rng = random.Random(sum(ord(c) for c in user_id))
+    order = list(images)
+    rng.shuffle(order)
+    return order
+
+
+def shuffled_order(images, user_id, group_id):
+    order = sorted(images)
+    random.Random(ordering_seed(user_id, group_id)).shuffle(order)
+    return order
+
+
+def latin_rows(n):
+    """Williams 设计的行数：n 为偶数时 n 行即平衡，奇数时需要再加 n 行逆序"""
+    return n if n % 2 == 0 else 2 * n
+
+
+def williams_row(n, row):
+    """第 row 行：首行为 0, 1, n-1, 2, n-2, ...，其余各行整体加 row (mod n)"""
+    first = [0]
+    lo, hi = 1, n - 1
+    while len(first) < n:
+        first.append(lo)
+        lo += 1
+        if len(first) < n:
+            first.append(hi)
+            hi -= 1
+    shifted = [(x + row) % n for x in first]
+    return shifted[::-1] if row >= n else shifted
+
+
+def latin_order(images, row):
+    base = sorted(images)
+    if not base:
+        return base
+    return [base[i] for i in williams_row(len(base), row % latin_rows(len(base)))]
+
+
+class OrderingService:
+    """
+    mode: ORDER_MODES 之一。
+    cache_size: LRU 缓存的 (user_id, 分组) 数。
+    persist: 为 True 时读写存储后端的 image_orders 表；
+             latin 模式下按评分员进入分组的先后轮流分配拉丁方的行（由存储后端原子领取行号，
+             多个副本同时进入的评分员也拿到不同的行），否则按种子取行。
+    """
+
+    def __init__(self, mode="legacy", cache_size=512, persist=False):
+        if mode not in ORDER_MODES:
+            raise ValueError(f"未知的排序模式: {mode}（可选 {', '.join(ORDER_MODES)}）")
+        self.mode = mode
+        self.cache_size = cache_size
+        self.persist = persist
+        self._cache = OrderedDict()  # (user_id, group_id) -> (图片集合指纹, 顺序)
+        self._lock = threading.Lock()
+        self._stats = {"hits": 0, "misses": 0, "loaded": 0, "computed": 0}
+
+    def _compute(self, user_id, group_id, images, store):
+        if self.mode == "legacy":
+            return legacy_order(images, user_id)
+        if self.mode == "latin":
+            row = store.next_ordering_row(group_id) if store is not None else None
+            if row is None:
+                row = ordering_seed(user_id, group_id)
+            return latin_order(images, row)
+        return shuffled_order(images, user_id, group_id)
+
+    def order(self, user_id, group_id, images, store=None):
+        """images 为本组图片 (tuple)，返回该评分员的顺序 (tuple)"""
+        key = (user_id, group_id)
+        fingerprint = (len(images), hash(images))
+        with self._lock:
+            cached = self._cache.get(key)
+            if cached is not None and cached[0] == fingerprint:
+                self._cache.move_to_end(key)
+                self._stats["hits"] += 1
+                return cached[1]
+            self._stats["misses"] += 1
+
+        store = store if self.persist else None
+        order = None
+        if store is not None:
+            try:
+                stored = store.load_ordering(user_id, group_id)
+                # 清单变了（增删图片）就重新生成
+                if stored is not None and len(stored) == len(images) and set(stored) == set(images):
+                    order = tuple(stored)
+            except Exception as e:
+                print(f"Ordering Load Error: {e}")
+                store = None
+        loaded = order is not None
+
+        if not loaded:
+            try:
+                order = tuple(self._compute(user_id, group_id, images, store))
+            except Exception as e:
+                # 存储不可用时退回按种子计算，不影响评分
+                print(f"Ordering Error: {e}")
+                order = tuple(self._compute(user_id, group_id, images, None))
+                store = None
+            if store is not None:
+                try:
+                    store.save_ordering(user_id, group_id, order)
+                except Exception as e:
+                    print(f"Ordering Save Error: {e}")
+
+        with self._lock:
+            self._stats["loaded" if loaded else "computed"] += 1
+            self._cache[key] = (fingerprint, order)
+            self._cache.move_to_end(key)
+            while len(self._cache) > self.cache_size:
+                self._cache.popitem(last=False)
+        return order
+
+    def metrics(self):
+        with self._lock:
+            data = dict(self._stats)
+            data.update(mode=self.mode, persist=self.persist, cached=len(self._cache))
+        return data
+
+
+@st.cache_resource
+def get_ordering_service():
+    """配置：环境变量 SCORE_ORDER_MODE 或 secrets 的 [ordering] mode / persist / cache_size"""
+    config = secrets_section("ordering")
+    return OrderingService(
+        mode=os.environ.get("SCORE_ORDER_MODE") or config.get("mode", "legacy"),
+        cache_size=int(config.get("cache_size", 512)),
+        persist=bool(config.get("persist", False)),
+    )
@@ -0,0 +1,66 @@
+import threading
+from html import escape
+
+import streamlit as st
+
+
+# ================= 图片预加载 =================
+# 每个用户的打乱顺序在进入分组时就已确定，因此可以在评当前图时
+# 让浏览器提前下载后面 N 张，点"下一张"时直接命中浏览器缓存。
+
+class ImagePrefetcher:
+    """生成隐藏的预加载标签，并统计展示时是否已提前预热 (hit/miss)。"""
+
+    def __init__(self, depth=3):
+        self.depth = depth
+        self._lock = threading.Lock()
+        self._stats = {"hints": 0, "hits": 0, "misses": 0}
+
+    def upcoming(self, image_list, idx):
+        return image_list[idx + 1:idx + 1 + self.depth]
+
+    def hints_html(self, urls):
+        # display:none 的 <img> 浏览器仍会下载，并且不会影响页面布局
+        tags = "".join(f"<img src='{escape(url, quote=True)}' loading='eager' alt=''>" for url in urls)
+        return f"<div style='display: none;' aria-hidden='true'>{tags}</div>"
+
+    def record(self, hit, hints):
+        with self._lock:
+            self._stats["hits" if hit else "misses"] += 1
+            self._stats["hints"] += hints
+
+    def metrics(self):
+        with self._lock:
+            data = dict(self._stats)
+        shown = data["hits"] + data["misses"]
+        data["hit_rate"] = data["hits"] / shown if shown else 0.0
+        return data
+
+
+@st.cache_resource
+def get_prefetcher(depth=3):
+    return ImagePrefetcher(depth)
+
+
+def render_prefetch(image_list, idx, base_url, depth=3):
+    """
+    在页面中输出后面 depth 张图片的预加载提示。
+    同一张图因为滑块拖动而多次 rerun 时只统计一次命中。
+    """
+    if depth <= 0:
+        return
+    prefetcher = get_prefetcher(depth)
+    current_url = base_url + image_list[idx]
+
+    if st.session_state.get('prefetch_shown') != current_url:
+        hinted = st.session_state.get('prefetch_hinted', ())
+        upcoming = [base_url + name for name in prefetcher.upcoming(image_list, idx)]
+        prefetcher.record(current_url in hinted, len([u for u in upcoming if u not in hinted]))
+        st.session_state['prefetch_shown'] = current_url
+        # 只保留当前这一批提示，session_state 不会随进度增长
+        st.session_state['prefetch_hinted'] = tuple(upcoming)
+
+    upcoming = st.session_state['prefetch_hinted']
+    if upcoming:
+        # 放在侧边栏末尾，隐藏元素不会挤占主区域的布局间距
+        st.sidebar.markdown(prefetcher.hints_html(upcoming), unsafe_allow_html=True)
@@ -0,0 +1,113 @@
+import json
+import os
+import threading
+import time
+from collections import deque
+from functools import wraps
+
+# ================= 热路径计时 =================
+# 环境变量 SCORE_PROFILE=1 时生效，把每次调用的耗时写进进程级环形缓冲区；
+# SCORE_PROFILE_DUMP=<路径> 时同时追加写一行 JSON。
+# 未开启时 timed() 直接返回原函数，profile_block 只多一次布尔判断。
+
+ENABLED = os.environ.get("SCORE_PROFILE", "") not in ("", "0")
+DUMP_PATH = os.environ.get("SCORE_PROFILE_DUMP") or None
+BUFFER_SIZE = int(os.environ.get("SCORE_PROFILE_BUFFER", "20000"))
+
+# 直方图分桶上界（毫秒）
+BUCKETS_MS = (1, 2, 5, 10, 20, 50, 100, 200, 500, 1000, 2000, 5000, float("inf"))
+
+
+def _percentile(ordered, p):
+    k = min(len(ordered) - 1, max(0, round(p / 100 * (len(ordered) - 1))))
+    return ordered[k]
+
+
+class TimingRecorder:
+    """环形缓冲区：只保留最近 BUFFER_SIZE 条 (结束时间, 名称, 毫秒)"""
+
+    def __init__(self, size=BUFFER_SIZE, dump_path=None):
+        self._buf = deque(maxlen=size)
+        self._lock = threading.Lock()
+        self._dump = open(dump_path, "a", encoding="utf-8", buffering=1) if dump_path else None
+
+    def record(self, name, ms):
+        now = time.time()
+        with self._lock:
+            self._buf.append((now, name, ms))
+            if self._dump:
+                self._dump.write(json.dumps({"ts": round(now, 3), "name": name, "ms": round(ms, 3)}) + "\n")
+
+    def summary(self, window_s=300):
+        """最近 window_s 秒内，每个名称的次数、均值、分位数和分桶直方图"""
+        since = time.time() - window_s
+        with self._lock:
+            samples = [(name, ms) for ts, name, ms in self._buf if ts >= since]
+
+        by_name = {}
+        for name, ms in samples:
+            by_name.setdefault(name, []).append(ms)
+
+        result = {}
+        for name, values in sorted(by_name.items()):
+            values.sort()
+            counts = [0] * len(BUCKETS_MS)
+            b = 0
+            for v in values:
+                while v > BUCKETS_MS[b]:
+                    b += 1
+                counts[b] += 1
+            result[name] = {
+                "count": len(values),
+                "mean_ms": sum(values) / len(values),
+                "p50_ms": _percentile(values, 50),
+                "p95_ms": _percentile(values, 95),
+                "p99_ms": _percentile(values, 99),
+                "max_ms": values[-1],
+                "histogram": dict(zip(BUCKETS_MS, counts)),
+            }
+        return result
+
+
+recorder = TimingRecorder(dump_path=DUMP_PATH) if ENABLED else None
+
+
+class profile_block:
+    """with profile_block("image"): ...  —— 给一段代码计时"""
+
+    __slots__ = ("name", "_t0")
+
+    def __init__(self, name):
+        self.name = name
+        self._t0 = 0.0
+
+    def __enter__(self):
+        if ENABLED:
+            self._t0 = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc):
+        if ENABLED:
+            recorder.record(self.name, (time.perf_counter() - self._t0) * 1000)
+        return False
+
+
+def timed(name=None):
+    """装饰器：@timed("save_to_db")；未开启时原样返回函数，没有任何额外开销"""
+
+    def decorator(fn):
+        if not ENABLED:
+            return fn
+        label = name or fn.__name__
+
+        @wraps(fn)
+        def wrapper(*args, **kwargs):
+            t0 = time.perf_counter()
+            try:
+                return fn(*args, **kwargs)
+            finally:
+                recorder.record(label, (time.perf_counter() - t0) * 1000)
+
+        return wrapper
+
+    return decorator
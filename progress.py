@@ -0,0 +1,25 @@
+# ================= 分组进度 / 断点续评 =================
+# 进入分组时只查本组已完成的图片（走 (user_id, group_id, image_name) 覆盖索引），
+# 不再把该用户所有分组的评分都拉回来，续评开销不随总评分数增长。
+# 查询本身由各存储后端实现，见 storage.Storage.resume_state。
+
+PROGRESS_INDEX = "idx_user_group_image"
+
+
+def ensure_progress_index(c):
+    """迁移：为 annotations 补建覆盖索引（MySQL 不支持 CREATE INDEX IF NOT EXISTS，先查元数据）"""
+    c.execute(
+        "SELECT COUNT(*) FROM information_schema.statistics "
+        "WHERE table_schema = DATABASE() AND table_name = 'annotations' AND index_name = %s",
+        (PROGRESS_INDEX,),
+    )
+    if c.fetchone()[0] == 0:
+        c.execute(f"CREATE INDEX {PROGRESS_INDEX} ON annotations (user_id, group_id, image_name)")
+
+
+def find_resume_index(img_list, done):
+    """第一张未评的位置；全部评完时停在最后一张（与原逻辑一致）"""
+    for idx, name in enumerate(img_list):
+        if name not in done:
+            return idx
+    return max(len(img_list) - 1, 0)
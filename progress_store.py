@@ -0,0 +1,125 @@
+import atexit
+import threading
+import time
+from collections import OrderedDict
+
+import streamlit as st
+
+from storage import get_storage, secrets_section
+
+
+# ================= 共享评分进度 =================
+# 评分员在各分组里的位置存在存储后端的 rater_progress 表（每个 (user_id, 分组) 一行），
+# 不再只存在某个进程的 st.session_state 里：多个副本放在负载均衡后面不需要粘性会话，
+# 副本重启后评分员也能回到原来的位置。图片顺序本身由 ordering 按种子确定，各副本一致。
+#
+# 读：进程内读穿缓存，ttl 秒内直接命中；只有会话开始时才读，平时不产生查询。
+# 写：先更新缓存，由后台线程每 flush_interval 秒把变化过的位置合并成一条语句写入，
+#     同一评分员多次翻页只写最后的位置。
+
+class ProgressStore:
+    """
+    storage: storage.Storage，实现 load_progress / save_progress_many。
+    ttl: 缓存的位置多少秒后需要重新读表（其他副本可能已经更新）。
+    flush_interval: 后台合并写入的间隔秒数。
+    max_entries: 缓存条数上限，按 LRU 淘汰（未写入的位置不会丢）。
+    """
+
+    def __init__(self, storage, ttl=30, flush_interval=1.0, max_entries=10000):
+        self.storage = storage
+        self.ttl = ttl
+        self.flush_interval = flush_interval
+        self.max_entries = max_entries
+        self._cache = OrderedDict()  # (user_id, group_id) -> (position, 读入时间)
+        self._dirty = {}  # (user_id, group_id) -> position，等待写入
+        self._lock = threading.Lock()
+        self._stats = {"hits": 0, "misses": 0, "writes": 0, "flushes": 0, "errors": 0}
+        self._stop = threading.Event()
+        self._thread = threading.Thread(target=self._run, name="progress-writer", daemon=True)
+        self._thread.start()
+        atexit.register(self.close)
+
+    def _remember(self, key, position):
+        self._cache[key] = (position, time.monotonic())
+        self._cache.move_to_end(key)
+        while len(self._cache) > self.max_entries:
+            self._cache.popitem(last=False)
+
+    def get(self, user_id, group_id):
+        """当前位置；表里也没有记录时返回 None"""
+        key = (user_id, group_id)
+        with self._lock:
+            if key in self._dirty:
+                self._stats["hits"] += 1
+                return self._dirty[key]
+            cached = self._cache.get(key)
+            if cached is not None and time.monotonic() - cached[1] < self.ttl:
+                self._cache.move_to_end(key)
+                self._stats["hits"] += 1
+                return cached[0]
+            self._stats["misses"] += 1
+
+        try:
+            position = self.storage.load_progress(user_id, group_id)
+        except Exception as e:
+            print(f"Progress Load Error: {e}")
+            with self._lock:
+                self._stats["errors"] += 1
+            return None
+        with self._lock:
+            self._remember(key, position)
+        return position
+
+    def set(self, user_id, group_id, position):
+        key = (user_id, group_id)
+        with self._lock:
+            self._dirty[key] = position
+            self._remember(key, position)
+            self._stats["writes"] += 1
+
+    def flush(self):
+        with self._lock:
+            dirty, self._dirty = self._dirty, {}
+        if not dirty:
+            return
+        try:
+            self.storage.save_progress_many([(user_id, group_id, position)
+                                             for (user_id, group_id), position in dirty.items()])
+            with self._lock:
+                self._stats["flushes"] += 1
+        except Exception as e:
+            print(f"Progress Save Error: {e}")
+            with self._lock:
+                self._stats["errors"] += 1
+                # 放回去下次再写；期间又有新位置的以新的为准
+                for key, position in dirty.items():
+                    self._dirty.setdefault(key, position)
+
+    def _run(self):
+        while not self._stop.wait(self.flush_interval):
+            self.flush()
+
+    def metrics(self):
+        with self._lock:
+            data = dict(self._stats)
+            data.update(cached=len(self._cache), dirty=len(self._dirty), ttl=self.ttl)
+        return data
+
+    def close(self, timeout=10):
+        if self._stop.is_set():
+            return
+        self._stop.set()
+        self._thread.join(timeout)
+        self.flush()
+
+
+@st.cache_resource
+def get_progress_store():
+    """配置：secrets 的 [progress] ttl / flush_interval / cache_size"""
+    config = secrets_section("progress")
+    return ProgressStore(
+        get_storage(),
+        ttl=float(config.get("ttl", 30)),
+        flush_interval=float(config.get("flush_interval", 1.0)),
+        max_entries=int(config.get("cache_size", 10000)),
+    )
@@ -0,0 +1,181 @@
+import threading
+import time
+from collections import OrderedDict
+
+from score_stats import RunningStats
+
+
+# ================= 评分质量监控 =================
+# 随提交流式计算每个评分员的质量指标，不再事后手工查 annotations：
+#   一致性   —— 三项评分与该图其他评分员当前均值的平均绝对偏差
+#   方差     —— 各项评分在不同图片间的方差（Welford，score_stats.RunningStats）
+#   直线作答 —— 三项相同 / 未动滑块 (50, 50, 50) 的比例、与上一张完全相同的最长连续次数
+#   间隔分布 —— 相邻两次提交的间隔直方图（批量模式一页算一次提交）
+# Storage.submit_many 在去重后把新提交交给 observe，每条 O(1)，不读数据库。
+# 统计只含本进程见过的提交（与 ScoreAggregates 相同），重启后从零开始；
+# 返回上一张后的重评按新的一次提交计入。
+
+GAP_BUCKETS_S = (1, 2, 5, 10, 30, 60, float("inf"))
+DEFAULT_TRIPLE = (50, 50, 50)
+
+
+def _gap_label(i):
+    upper = GAP_BUCKETS_S[i]
+    return f"gap_≥{GAP_BUCKETS_S[i - 1]}s" if upper == float("inf") else f"gap_<{upper}s"
+
+
+class _Welford:
+    """单变量的 (n, mean, M2)"""
+
+    __slots__ = ("n", "mean", "m2")
+
+    def __init__(self):
+        self.n, self.mean, self.m2 = 0, 0.0, 0.0
+
+    def add(self, x):
+        self.n += 1
+        delta = x - self.mean
+        self.mean += delta / self.n
+        self.m2 += delta * (x - self.mean)
+
+    def std(self):
+        return (self.m2 / self.n) ** 0.5 if self.n >= 2 else 0.0
+
+
+class RaterQuality:
+    __slots__ = ("scores", "deviation", "gaps", "gap_hist", "fast", "constant", "default", "run", "max_run",
+                 "last_scores", "last_at")
+
+    def __init__(self):
+        self.scores = RunningStats()
+        self.deviation = _Welford()
+        self.gaps = _Welford()
+        self.gap_hist = [0] * len(GAP_BUCKETS_S)
+        self.fast = 0
+        self.constant = 0
+        self.default = 0
+        self.run = 0
+        self.max_run = 0
+        self.last_scores = None
+        self.last_at = None
+
+    def add_gap(self, seconds, fast_gap):
+        self.gaps.add(seconds)
+        if seconds < fast_gap:
+            self.fast += 1
+        for i, upper in enumerate(GAP_BUCKETS_S):
+            if seconds < upper:
+                self.gap_hist[i] += 1
+                break
+
+    def add_scores(self, scores, image_mean):
+        self.scores.add(scores)
+        if image_mean is not None:
+            self.deviation.add(sum(abs(x - m) for x, m in zip(scores, image_mean)) / 3)
+        if len(set(scores)) == 1:
+            self.constant += 1
+        if scores == DEFAULT_TRIPLE:
+            self.default += 1
+        self.run = self.run + 1 if scores == self.last_scores else 0
+        self.max_run = max(self.max_run, self.run)
+        self.last_scores = scores
+
+
+class QualityMonitor:
+    """
+    min_ratings: 评分数达到这么多才判断是否异常。
+    min_raters: 图片已有这么多其他评分员时才计入一致性。
+    fast_gap / fast_ratio: 间隔短于 fast_gap 秒的提交占比超过 fast_ratio 记为 "fast"。
+    straight_run / constant_ratio: 连续相同次数或三项相同比例超过阈值记为 "straight_lining"。
+    low_variance: 三项方差的均值低于此值记为 "low_variance"。
+    disagreement: 平均绝对偏差高于此值记为 "disagreement"。
+    max_users: 记住的评分员数上限，按 LRU 淘汰。
+    """
+
+    def __init__(self, min_ratings=20, min_raters=2, fast_gap=1.0, fast_ratio=0.3, straight_run=10,
+                 constant_ratio=0.5, low_variance=25.0, disagreement=30.0, max_users=5000):
+        self.min_ratings = min_ratings
+        self.min_raters = min_raters
+        self.fast_gap = fast_gap
+        self.fast_ratio = fast_ratio
+        self.straight_run = straight_run
+        self.constant_ratio = constant_ratio
+        self.low_variance = low_variance
+        self.disagreement = disagreement
+        self.max_users = max_users
+        self._raters = OrderedDict()  # user_id -> RaterQuality
+        self._images = {}  # image_name -> RunningStats
+        self._lock = threading.Lock()
+
+    def observe(self, records, now=None):
+        """records 为同一次提交（单张或一页）的记录 (user_id, group_id, image_name, s1, s2, s3, ...)"""
+        now = time.monotonic() if now is None else now
+        with self._lock:
+            seen = set()
+            for user_id, _, image_name, s1, s2, s3, *_ in records:
+                rater = self._raters.get(user_id)
+                if rater is None:
+                    rater = self._raters[user_id] = RaterQuality()
+                    while len(self._raters) > self.max_users:
+                        self._raters.popitem(last=False)
+                self._raters.move_to_end(user_id)
+                if user_id not in seen:
+                    seen.add(user_id)
+                    if rater.last_at is not None:
+                        rater.add_gap(now - rater.last_at, self.fast_gap)
+                    rater.last_at = now
+
+                scores = (s1, s2, s3)
+                per_image = self._images.setdefault(image_name, RunningStats())
+                rater.add_scores(scores, per_image.mean if per_image.n >= self.min_raters else None)
+                per_image.add(scores)
+
+    def _flags(self, rater):
+        n = rater.scores.n
+        if n < self.min_ratings:
+            return []
+        flags = []
+        if rater.max_run >= self.straight_run or rater.constant / n >= self.constant_ratio:
+            flags.append("straight_lining")
+        if sum(rater.scores.variance()) / 3 < self.low_variance:
+            flags.append("low_variance")
+        if rater.gaps.n and rater.fast / rater.gaps.n >= self.fast_ratio:
+            flags.append("fast")
+        if rater.deviation.n >= self.min_ratings and rater.deviation.mean >= self.disagreement:
+            flags.append("disagreement")
+        return flags
+
+    def report(self):
+        """每个评分员一行，有异常标记的排在前面"""
+        with self._lock:
+            rows = []
+            for user_id, rater in self._raters.items():
+                n = rater.scores.n
+                variance = rater.scores.variance()
+                row = {
+                    "user_id": user_id,
+                    "flags": ", ".join(self._flags(rater)),
+                    "ratings": n,
+                    "agreement_mad": round(rater.deviation.mean, 2) if rater.deviation.n else None,
+                    "var_content": round(variance[0], 1),
+                    "var_aesthetic": round(variance[1], 1),
+                    "var_quality": round(variance[2], 1),
+                    "constant_ratio": round(rater.constant / n, 3) if n else 0,
+                    "default_ratio": round(rater.default / n, 3) if n else 0,
+                    "max_identical_run": rater.max_run,
+                    "gap_mean_s": round(rater.gaps.mean, 2),
+                    "gap_std_s": round(rater.gaps.std(), 2),
+                }
+                for i, count in enumerate(rater.gap_hist):
+                    row[_gap_label(i)] = count
+                rows.append(row)
+        rows.sort(key=lambda r: (not r["flags"], -r["ratings"]))
+        return rows
+
+    def metrics(self):
+        with self._lock:
+            return {
+                "raters": len(self._raters),
+                "images": len(self._images),
+                "flagged": sum(1 for rater in self._raters.values() if self._flags(rater)),
+            }
@@ -0,0 +1,300 @@
+from dwell import TIMING_COLUMNS
+from event_log import init_watermark
+from progress import PROGRESS_INDEX, ensure_progress_index
+from score_stats import init_stats_tables
+
+
+# ================= 表结构迁移 =================
+# 每个迁移有一个递增的版本号；已执行到的版本记在 schema_meta 表里。
+# 各脚本用 st.cache_resource 包一层，每个进程只检查一次；
+# 版本已是最新时只有一次 SELECT，不再执行任何 DDL。
+
+SCHEMA_VERSION_KEY = "schema_version"
+REQUEST_ID_INDEX = "uniq_annotations_request_id"
+
+
+def _mysql_create_annotations(c):
+    c.execute("""
+        CREATE TABLE IF NOT EXISTS annotations
+        (
+            user_id         VARCHAR(50),
+            group_id        VARCHAR(50),
+            image_name      VARCHAR(255),
+            score_content   INT,
+            score_aesthetic INT,
+            score_quality   INT,
+            timestamp       DATETIME,
+            PRIMARY KEY (user_id, image_name)
+        )
+    """)
+
+
+def _sqlite_create_annotations(c):
+    c.execute("""
+        CREATE TABLE IF NOT EXISTS annotations
+        (
+            user_id         TEXT,
+            group_id        TEXT,
+            image_name      TEXT,
+            score_content   INTEGER,
+            score_aesthetic INTEGER,
+            score_quality   INTEGER,
+            timestamp       DATETIME,
+            PRIMARY KEY (user_id, image_name)
+        )
+    """)
+
+
+def _mysql_create_image_orders(c):
+    c.execute("""
+        CREATE TABLE IF NOT EXISTS image_orders
+        (
+            user_id     VARCHAR(50),
+            group_id    VARCHAR(50),
+            image_order MEDIUMTEXT,
+            created     DATETIME,
+            PRIMARY KEY (user_id, group_id),
+            KEY idx_image_orders_group (group_id)
+        )
+    """)
+
+
+def _sqlite_create_image_orders(c):
+    c.execute("""
+        CREATE TABLE IF NOT EXISTS image_orders
+        (
+            user_id     TEXT,
+            group_id    TEXT,
+            image_order TEXT,
+            created     DATETIME,
+            PRIMARY KEY (user_id, group_id)
+        )
+    """)
+    c.execute("CREATE INDEX IF NOT EXISTS idx_image_orders_group ON image_orders (group_id)")
+
+
+def _sqlite_progress_index(c):
+    c.execute(f"CREATE INDEX IF NOT EXISTS {PROGRESS_INDEX} ON annotations (user_id, group_id, image_name)")
+
+
+def _mysql_add_request_id(c):
+    """提交去重（见 dedup.py）：请求 ID 列 + 唯一键；MySQL 不支持 IF NOT EXISTS，先查元数据"""
+    c.execute("SELECT COUNT(*) FROM information_schema.columns "
+              "WHERE table_schema = DATABASE() AND table_name = 'annotations' AND column_name = 'request_id'")
+    if c.fetchone()[0] == 0:
+        c.execute("ALTER TABLE annotations ADD COLUMN request_id VARCHAR(64) NULL")
+    c.execute("SELECT COUNT(*) FROM information_schema.statistics "
+              "WHERE table_schema = DATABASE() AND table_name = 'annotations' AND index_name = %s",
+              (REQUEST_ID_INDEX,))
+    if c.fetchone()[0] == 0:
+        c.execute(f"CREATE UNIQUE INDEX {REQUEST_ID_INDEX} ON annotations (request_id)")
+
+
+def _sqlite_add_request_id(c):
+    c.execute("PRAGMA table_info(annotations)")
+    if "request_id" not in {row[1] for row in c.fetchall()}:
+        c.execute("ALTER TABLE annotations ADD COLUMN request_id TEXT")
+    c.execute(f"CREATE UNIQUE INDEX IF NOT EXISTS {REQUEST_ID_INDEX} ON annotations (request_id)")
+
+
+def _mysql_create_rating_events(c):
+    """评分事件日志（见 event_log.py），只追加；按 (user_id, image_name) 查修改历史"""
+    # TiDB 默认按节点分段缓存自增 id，不保证全局递增；AUTO_ID_CACHE = 1 让水位线可用
+    c.execute("""
+        CREATE TABLE IF NOT EXISTS rating_events
+        (
+            id              BIGINT AUTO_INCREMENT PRIMARY KEY,
+            user_id         VARCHAR(50),
+            group_id        VARCHAR(50),
+            image_name      VARCHAR(255),
+            score_content   INT,
+            score_aesthetic INT,
+            score_quality   INT,
+            timestamp       DATETIME,
+            request_id      VARCHAR(64),
+            logged_at       TIMESTAMP(6) NOT NULL DEFAULT CURRENT_TIMESTAMP(6),
+            UNIQUE KEY uniq_rating_events_request_id (request_id),
+            KEY idx_rating_events_user_image (user_id, image_name)
+        ) /*T![auto_id_cache] AUTO_ID_CACHE = 1 */
+    """)
+    init_watermark(c, "%s")
+
+
+def _sqlite_create_rating_events(c):
+    c.execute("""
+        CREATE TABLE IF NOT EXISTS rating_events
+        (
+            id              INTEGER PRIMARY KEY AUTOINCREMENT,
+            user_id         TEXT,
+            group_id        TEXT,
+            image_name      TEXT,
+            score_content   INTEGER,
+            score_aesthetic INTEGER,
+            score_quality   INTEGER,
+            timestamp       DATETIME,
+            request_id      TEXT UNIQUE,
+            logged_at       TEXT DEFAULT (strftime('%Y-%m-%d %H:%M:%f', 'now'))
+        )
+    """)
+    c.execute("CREATE INDEX IF NOT EXISTS idx_rating_events_user_image ON rating_events (user_id, image_name)")
+    init_watermark(c, "?")
+
+
+def _mysql_create_rater_progress(c):
+    """每个 (评分员, 分组) 一行：当前位置，供多副本共享（见 progress_store.py）"""
+    c.execute("""
+        CREATE TABLE IF NOT EXISTS rater_progress
+        (
+            user_id  VARCHAR(50),
+            group_id VARCHAR(50),
+            position INT NOT NULL,
+            updated  DATETIME,
+            PRIMARY KEY (user_id, group_id)
+        )
+    """)
+
+
+def _sqlite_create_rater_progress(c):
+    c.execute("""
+        CREATE TABLE IF NOT EXISTS rater_progress
+        (
+            user_id  TEXT,
+            group_id TEXT,
+            position INTEGER NOT NULL,
+            updated  DATETIME,
+            PRIMARY KEY (user_id, group_id)
+        )
+    """)
+
+
+_MYSQL_TIMING_TYPES = {"dwell_ms": "INT", "submitted_us": "BIGINT", "queue_latency_ms": "DOUBLE"}
+_SQLITE_TIMING_TYPES = {"dwell_ms": "INTEGER", "submitted_us": "INTEGER", "queue_latency_ms": "REAL"}
+
+
+def _mysql_add_timing_columns(c):
+    """评分时长三列（见 dwell.py），annotations 与 rating_events 都加"""
+    for table in ("annotations", "rating_events"):
+        c.execute("SELECT column_name FROM information_schema.columns "
+                  "WHERE table_schema = DATABASE() AND table_name = %s", (table,))
+        existing = {row[0].lower() for row in c.fetchall()}
+        missing = [f"ADD COLUMN {name} {_MYSQL_TIMING_TYPES[name]} NULL"
+                   for name in TIMING_COLUMNS if name not in existing]
+        if missing:
+            c.execute(f"ALTER TABLE {table} " + ", ".join(missing))
+
+
+def _sqlite_add_timing_columns(c):
+    for table in ("annotations", "rating_events"):
+        c.execute(f"PRAGMA table_info({table})")
+        existing = {row[1] for row in c.fetchall()}
+        for name in TIMING_COLUMNS:
+            if name not in existing:
+                c.execute(f"ALTER TABLE {table} ADD COLUMN {name} {_SQLITE_TIMING_TYPES[name]}")
+
+
+# (版本号, 说明, 执行函数)；只能在末尾追加，不要修改已发布的迁移
+MYSQL_MIGRATIONS = [
+    (1, "annotations 表", _mysql_create_annotations),
+    (2, "增量统计表 image_stats / group_stats", init_stats_tables),
+    (3, "续评覆盖索引", ensure_progress_index),
+    (4, "图片顺序表 image_orders", _mysql_create_image_orders),
+    (5, "提交去重 request_id 唯一键", _mysql_add_request_id),
+    (6, "评分事件日志 rating_events", _mysql_create_rating_events),
+    (7, "评分进度表 rater_progress", _mysql_create_rater_progress),
+    (8, "评分时长 dwell_ms / submitted_us / queue_latency_ms", _mysql_add_timing_columns),
+]
+
+SQLITE_MIGRATIONS = [
+    (1, "annotations 表", _sqlite_create_annotations),
+    (2, "续评覆盖索引", _sqlite_progress_index),
+    (3, "图片顺序表 image_orders", _sqlite_create_image_orders),
+    (4, "提交去重 request_id 唯一键", _sqlite_add_request_id),
+    (5, "评分事件日志 rating_events", _sqlite_create_rating_events),
+    (6, "评分进度表 rater_progress", _sqlite_create_rater_progress),
+    (7, "评分时长 dwell_ms / submitted_us / queue_latency_ms", _sqlite_add_timing_columns),
+]
+
+
+class SchemaManager:
+    """
+    placeholder: 参数占位符，MySQL 为 %s，SQLite 为 ?
+    lock_sql / unlock_sql: 可选的跨进程互斥（MySQL 用 GET_LOCK），避免多个副本同时迁移；
+        没拿到锁时重读版本，别的进程已迁移完就直接返回，否则抛 TimeoutError，不会无锁迁移。
+    single_transaction: 所有迁移在同一个事务里执行、最后提交一次。SQLite 的 DDL 可以回滚，
+        lock_sql 用 BEGIN IMMEDIATE 拿写锁，同一文件上的多个进程依次迁移，不会重复执行 ALTER。
+    """
+
+    def __init__(self, migrations, placeholder="%s", lock_sql=None, unlock_sql=None, single_transaction=False):
+        self.migrations = migrations
+        self.placeholder = placeholder
+        self.lock_sql = lock_sql
+        self.unlock_sql = unlock_sql
+        self.single_transaction = single_transaction
+
+    @property
+    def latest_version(self):
+        return self.migrations[-1][0] if self.migrations else 0
+
+    def current_version(self, c):
+        c.execute(f"SELECT value FROM schema_meta WHERE name = {self.placeholder}", (SCHEMA_VERSION_KEY,))
+        row = c.fetchone()
+        return int(row[0]) if row else 0
+
+    def _set_version(self, c, version):
+        p = self.placeholder
+        c.execute(f"DELETE FROM schema_meta WHERE name = {p}", (SCHEMA_VERSION_KEY,))
+        c.execute(f"INSERT INTO schema_meta (name, value) VALUES ({p}, {p})", (SCHEMA_VERSION_KEY, str(version)))
+
+    def migrate(self, conn):
+        """补跑缺失的迁移，返回最终版本号"""
+        c = conn.cursor()
+        try:
+            c.execute("CREATE TABLE IF NOT EXISTS schema_meta (name VARCHAR(64) PRIMARY KEY, value VARCHAR(255))")
+            version = self.current_version(c)
+            if version >= self.latest_version:
+                return version
+
+            if self.lock_sql:
+                c.execute(self.lock_sql)
+                rows = c.fetchall()
+                # GET_LOCK 超时返回 0、出错返回 NULL；BEGIN IMMEDIATE 没有结果行，拿不到锁时直接抛异常
+                if rows and rows[0][0] != 1:
+                    version = self.current_version(c)
+                    if version >= self.latest_version:
+                        return version
+                    raise TimeoutError(f"等待迁移锁超时，schema 仍为版本 {version}（另一个进程可能还在迁移）")
+            try:
+                # 拿到锁后再读一次，别的进程可能已经迁移完了
+                version = self.current_version(c)
+                for target, description, apply in self.migrations:
+                    if target <= version:
+                        continue
+                    print(f"Schema Migration {target}: {description}")
+                    apply(c)
+                    self._set_version(c, target)
+                    if not self.single_transaction:
+                        conn.commit()
+                    version = target
+                if self.single_transaction:
+                    conn.commit()
+            except Exception:
+                if self.single_transaction:
+                    conn.rollback()
+                raise
+            finally:
+                if self.unlock_sql:
+                    c.execute(self.unlock_sql)
+                    c.fetchall()
+            return version
+        finally:
+            c.close()
+
+
+mysql_schema = SchemaManager(
+    MYSQL_MIGRATIONS,
+    placeholder="%s",
+    lock_sql="SELECT GET_LOCK('score_schema_migration', 60)",
+    unlock_sql="SELECT RELEASE_LOCK('score_schema_migration')",
+)
+
+sqlite_schema = SchemaManager(SQLITE_MIGRATIONS, placeholder="?", lock_sql="BEGIN IMMEDIATE", single_transaction=True)
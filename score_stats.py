@@ -0,0 +1,215 @@
+import threading
+
+
+# ================= 增量评分统计 =================
+# 每张图 / 每个分组的评分人数、均值、方差，随写入增量维护，
+# 看板查询只需读 group_stats (O(分组数))，不再扫描 annotations。
+# 用 Welford 算法累计 (n, mean, M2)；重复评分 (REPLACE) 时先减去旧分再加上新分。
+
+DIMENSIONS = ("content", "aesthetic", "quality")
+
+STATS_COLUMNS = ", ".join(f"mean_{d} DOUBLE NOT NULL DEFAULT 0, m2_{d} DOUBLE NOT NULL DEFAULT 0" for d in DIMENSIONS)
+
+STATS_DDL = [
+    f"CREATE TABLE IF NOT EXISTS image_stats (image_name VARCHAR(255) PRIMARY KEY, group_id VARCHAR(50), "
+    f"n INT NOT NULL DEFAULT 0, {STATS_COLUMNS})",
+    f"CREATE TABLE IF NOT EXISTS group_stats (group_id VARCHAR(50) PRIMARY KEY, "
+    f"n INT NOT NULL DEFAULT 0, {STATS_COLUMNS})",
+]
+
+_VALUE_COLUMNS = "n, " + ", ".join(f"mean_{d}, m2_{d}" for d in DIMENSIONS)
+
+
+class RunningStats:
+    """三个维度共用一个 n 的 Welford 累加器，支持撤销 (remove)。"""
+
+    __slots__ = ("n", "mean", "m2")
+
+    def __init__(self, n=0, mean=None, m2=None):
+        self.n = n
+        self.mean = list(mean) if mean else [0.0, 0.0, 0.0]
+        self.m2 = list(m2) if m2 else [0.0, 0.0, 0.0]
+
+    def add(self, scores):
+        self.n += 1
+        for i, x in enumerate(scores):
+            delta = x - self.mean[i]
+            self.mean[i] += delta / self.n
+            self.m2[i] += delta * (x - self.mean[i])
+
+    def remove(self, scores):
+        """add 的逆运算：mean_old = (n*mean - x)/(n-1)，M2_old = M2 - (x - mean_old)(x - mean)"""
+        if self.n <= 1:
+            self.n, self.mean, self.m2 = 0, [0.0, 0.0, 0.0], [0.0, 0.0, 0.0]
+            return
+        for i, x in enumerate(scores):
+            mean_old = (self.n * self.mean[i] - x) / (self.n - 1)
+            self.m2[i] = max(self.m2[i] - (x - mean_old) * (x - self.mean[i]), 0.0)
+            self.mean[i] = mean_old
+        self.n -= 1
+
+    def variance(self):
+        """总体方差；n < 2 时为 0"""
+        if self.n < 2:
+            return [0.0, 0.0, 0.0]
+        return [m / self.n for m in self.m2]
+
+    def copy(self):
+        return RunningStats(self.n, self.mean, self.m2)
+
+    def to_values(self):
+        values = [self.n]
+        for i in range(3):
+            values += [self.mean[i], self.m2[i]]
+        return values
+
+    @classmethod
+    def from_values(cls, values):
+        n = values[0]
+        return cls(int(n), [float(values[1 + 2 * i]) for i in range(3)], [float(values[2 + 2 * i]) for i in range(3)])
+
+    def summary(self):
+        var = self.variance()
+        data = {"n": self.n}
+        for i, d in enumerate(DIMENSIONS):
+            data[f"mean_{d}"] = round(self.mean[i], 3)
+            data[f"var_{d}"] = round(var[i], 3)
+        return data
+
+
+# ================= 写入路径（在写线程的事务内调用） =================
+
+def fetch_previous_ratings(c, rows):
+    """
+    锁住并读出本批 (user_id, image_name) 之前的评分，
+    返回 {(user, image): (group, s1, s2, s3, request_id)}。
+    rows 为写入 annotations 的行 (user_id, group_id, image_name, s1, s2, s3, timestamp, request_id,
+    dwell_ms, submitted_us, queue_latency_ms)，同一批内每个 (user_id, image_name) 只出现一次
+    （直接写入时写线程已合并，事件日志由 latest_per_key 合并）。
+    """
+    keys = sorted({(r[0], r[2]) for r in rows})
+    placeholders = ", ".join(["(%s, %s)"] * len(keys))
+    c.execute(
+        "SELECT user_id, image_name, group_id, score_content, score_aesthetic, score_quality, request_id "
+        f"FROM annotations WHERE (user_id, image_name) IN ({placeholders}) FOR UPDATE",
+        [v for key in keys for v in key],
+    )
+    return {(r[0], r[1]): (r[2], r[3], r[4], r[5], r[6]) for r in c.fetchall()}
+
+
+def _lock_stats(c, table, key_column, keys, group_of=None):
+    """
+    先为本批的每个 key 补一行全 0 的统计 (INSERT IGNORE)，再 FOR UPDATE 锁住读出。
+    FOR UPDATE 只锁已存在的行：不先补行的话，两个副本同时写同一张新图时都从空统计开始，后写的覆盖先写的。
+    group_of: image_stats 需要的 {image_name: group_id}。
+    """
+    keys = sorted(keys)
+    if group_of is not None:
+        c.execute(f"INSERT IGNORE INTO {table} ({key_column}, group_id) VALUES "
+                  + ", ".join(["(%s, %s)"] * len(keys)), [v for key in keys for v in (key, group_of[key])])
+    else:
+        c.execute(f"INSERT IGNORE INTO {table} ({key_column}) VALUES " + ", ".join(["(%s)"] * len(keys)), keys)
+    placeholders = ", ".join(["%s"] * len(keys))
+    c.execute(f"SELECT {key_column}, {_VALUE_COLUMNS} FROM {table} WHERE {key_column} IN ({placeholders}) FOR UPDATE",
+              keys)
+    return {r[0]: RunningStats.from_values(r[1:]) for r in c.fetchall()}
+
+
+def _upsert_stats(c, table, columns, rows):
+    """行都已由 _lock_stats 补齐并锁住；多行 INSERT ... ON DUPLICATE KEY UPDATE 一条语句写回"""
+    marks = "(" + ", ".join(["%s"] * len(columns)) + ")"
+    updates = ", ".join(f"{col} = VALUES({col})" for col in columns[1:])
+    c.execute(f"INSERT INTO {table} ({', '.join(columns)}) VALUES " + ", ".join([marks] * len(rows))
+              + f" ON DUPLICATE KEY UPDATE {updates}", [v for row in rows for v in row])
+
+
+def apply_ratings_to_stats(c, rows, previous):
+    """
+    在同一事务里更新 image_stats / group_stats，返回 (image_updates, group_updates)。
+    以表中的值为准（先补行再 FOR UPDATE 加锁），多进程并发写入时统计也不会互相覆盖。
+    """
+    image_group = {r[2]: r[1] for r in rows}
+    groups = {r[1] for r in rows} | {old[0] for old in previous.values()}
+    image_stats = _lock_stats(c, "image_stats", "image_name", image_group, group_of=image_group)
+    group_stats = _lock_stats(c, "group_stats", "group_id", groups)
+
+    for user_id, group_id, image_name, s1, s2, s3, *_ in rows:
+        new_scores = (s1, s2, s3)
+        old = previous.get((user_id, image_name))
+        per_image = image_stats[image_name]
+        if old is not None:
+            per_image.remove(old[1:4])
+            group_stats[old[0]].remove(old[1:4])
+        per_image.add(new_scores)
+        group_stats[group_id].add(new_scores)
+
+    value_columns = _VALUE_COLUMNS.split(", ")
+    _upsert_stats(c, "image_stats", ["image_name", "group_id"] + value_columns,
+                  [[name, image_group[name]] + image_stats[name].to_values() for name in sorted(image_stats)])
+    _upsert_stats(c, "group_stats", ["group_id"] + value_columns,
+                  [[group] + group_stats[group].to_values() for group in sorted(group_stats)])
+    return image_stats, group_stats
+
+
+def rebuild_stats(c):
+    """从 annotations 全量重算（建表后首次启用、或数据被手工修改后使用）"""
+    dims = ", ".join(f"AVG(score_{d}), VAR_POP(score_{d}) * COUNT(*)" for d in DIMENSIONS)
+    c.execute("DELETE FROM image_stats")
+    c.execute("DELETE FROM group_stats")
+    c.execute(f"INSERT INTO image_stats (image_name, group_id, {_VALUE_COLUMNS}) "
+              f"SELECT image_name, MAX(group_id), COUNT(*), {dims} FROM annotations GROUP BY image_name")
+    c.execute(f"INSERT INTO group_stats (group_id, {_VALUE_COLUMNS}) "
+              f"SELECT group_id, COUNT(*), {dims} FROM annotations GROUP BY group_id")
+
+
+def init_stats_tables(c):
+    """建表；统计表为空而 annotations 已有数据时，先用历史数据补齐一次"""
+    for ddl in STATS_DDL:
+        c.execute(ddl)
+    c.execute("SELECT COUNT(*) FROM group_stats")
+    if c.fetchone()[0] == 0:
+        c.execute("SELECT COUNT(*) FROM annotations")
+        if c.fetchone()[0] > 0:
+            rebuild_stats(c)
+
+
+def load_group_stats(c):
+    """看板查询：只读 group_stats，复杂度与分组数成正比"""
+    c.execute(f"SELECT group_id, {_VALUE_COLUMNS} FROM group_stats ORDER BY group_id")
+    return {r[0]: RunningStats.from_values(r[1:]) for r in c.fetchall()}
+
+
+# ================= 进程内缓存 =================
+
+class ScoreAggregates:
+    """
+    写线程每次提交后把最新的统计值合并进来，页面上可以零查询地读取。
+    启动时从统计表加载；其他进程写入的变化会在它们各自的缓存里，
+    需要跨进程精确值时请直接用 load_group_stats 查表。
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._images = {}
+        self._groups = {}
+
+    def load(self, c):
+        c.execute(f"SELECT image_name, {_VALUE_COLUMNS} FROM image_stats")
+        images = {r[0]: RunningStats.from_values(r[1:]) for r in c.fetchall()}
+        groups = load_group_stats(c)
+        with self._lock:
+            self._images, self._groups = images, groups
+
+    def merge(self, image_updates, group_updates):
+        with self._lock:
+            self._images.update((k, v.copy()) for k, v in image_updates.items())
+            self._groups.update((k, v.copy()) for k, v in group_updates.items())
+
+    def image(self, image_name):
+        with self._lock:
+            stats = self._images.get(image_name)
+            return stats.copy() if stats else None
+
+    def group_summary(self):
+        with self._lock:
+            return {group: stats.summary() for group, stats in sorted(self._groups.items())}
@@ -0,0 +1,93 @@
+import sys
+import threading
+import weakref
+from collections import deque
+
+import streamlit as st
+
+from dedup import new_request_id
+
+
+# ================= 会话状态 =================
+# 每个评分会话在 session_state 里只放一个 RatingSession（__slots__，没有 __dict__）：
+# 当前下标、当前三项评分和最近几张的评分窗口。图片列表直接引用 ordering 缓存里的 tuple，
+# 不按会话复制；按图片下标生成的控件 key（s_content_{i} 等）换图后即清理，
+# 会话状态的大小与已经评了多少张无关。
+
+HISTORY_SIZE = 8
+DEFAULT_SCORES = (50, 50, 50)
+
+# 本进程内存活的会话；会话断开、session_state 被回收后自动消失
+_registry = weakref.WeakSet()
+_registry_lock = threading.Lock()
+
+
+class RatingSession:
+    """
+    key: "user_id_分组"，换人或换组时整体重建。
+    images: 本组图片顺序 (tuple)，与其他会话共享同一个对象。
+    history: 最近 history_size 次提交的 (下标, 三项评分)，返回上一张时用来回填滑块；
+             批量评分一页记 K 条，history_size 至少要能放下两页。
+    request_id: 当前这张（页）的请求 ID，换图时重新生成，重复提交会被去重。
+    """
+
+    __slots__ = ("key", "images", "index", "scores", "history", "request_id", "__weakref__")
+
+    def __init__(self, key, images, index=0, history_size=HISTORY_SIZE):
+        self.key = key
+        self.images = images
+        self.index = index
+        self.scores = DEFAULT_SCORES
+        self.request_id = new_request_id()
+        self.history = deque(maxlen=history_size)
+        with _registry_lock:
+            _registry.add(self)
+
+    def recalled(self, index):
+        """该下标最近一次提交的评分，窗口外的返回默认值"""
+        for i, scores in reversed(self.history):
+            if i == index:
+                return scores
+        return DEFAULT_SCORES
+
+    def record(self, index, scores):
+        self.history.append((index, tuple(scores)))
+
+    def move_to(self, index):
+        self.index = max(0, index)
+        self.scores = self.recalled(self.index)
+        self.request_id = new_request_id()
+
+    def approx_bytes(self):
+        """本会话独占的内存（不含共享的图片列表）"""
+        size = (sys.getsizeof(self) + sys.getsizeof(self.scores) + sys.getsizeof(self.history)
+                + sys.getsizeof(self.request_id))
+        for entry in self.history:
+            size += sys.getsizeof(entry) + sys.getsizeof(entry[1])
+        return size
+
+
+def evict_widget_keys(prefixes, keep):
+    """删除 "{prefix}_{下标}" 形式、且下标不在 keep 里的 session_state 键"""
+    keep = set(keep)
+    for key in list(st.session_state.keys()):
+        prefix, _, suffix = str(key).rpartition("_")
+        if prefix in prefixes and suffix.isdigit() and int(suffix) not in keep:
+            del st.session_state[key]
+
+
+def session_metrics():
+    with _registry_lock:
+        sessions = list(_registry)
+    sizes = [s.approx_bytes() for s in sessions]
+    lists = {id(s.images): s.images for s in sessions}
+    return {
+        "sessions": len(sessions),
+        "history_size": max((s.history.maxlen for s in sessions), default=HISTORY_SIZE),
+        "avg_bytes": round(sum(sizes) / len(sizes)) if sizes else 0,
+        "max_bytes": max(sizes, default=0),
+        # 各会话共享的图片列表只算一次
+        "image_lists": len(lists),
+        "image_list_bytes": sum(sys.getsizeof(images) + sum(sys.getsizeof(name) for name in images)
+                                for images in lists.values()),
+    }
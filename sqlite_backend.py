@@ -0,0 +1,175 @@
+import sqlite3
+import threading
+
+from event_log import EVENT_COLUMNS, EVENT_WATERMARK_KEY, latest_per_key, read_watermark, write_watermark
+
+
+# ================= SQLite 连接（单机离线版） =================
+# WAL 模式下读写互不阻塞：唯一的写连接主要由后台写线程 (write_queue) 使用，
+# 偶发的小写入（如保存图片顺序）通过同一把锁串行进来；
+# 读取走每个线程自己的只读连接，不再出现 "database is locked" 重试。
+
+ROW_MARKS = ", ".join(["?"] * 11)
+UPSERT_SQL = ("INSERT OR REPLACE INTO annotations "
+              "(user_id, group_id, image_name, score_content, score_aesthetic, score_quality, timestamp, request_id, "
+              f"dwell_ms, submitted_us, queue_latency_ms) VALUES ({ROW_MARKS})")
+EVENT_INSERT_SQL = f"INSERT OR IGNORE INTO rating_events ({EVENT_COLUMNS}) VALUES ({ROW_MARKS})"
+
+
+class SqliteBackend:
+    """
+    path: 数据库文件。
+    cache_kb: 每个连接的页缓存大小 (PRAGMA cache_size)。
+    busy_timeout_ms: 检查点等极少数情况下等待文件锁的毫秒数。
+    """
+
+    def __init__(self, path, cache_kb=20000, busy_timeout_ms=5000):
+        self.path = path
+        self.cache_kb = cache_kb
+        self.busy_timeout_ms = busy_timeout_ms
+
+        self._writer = self._connect()
+        # WAL 写进数据库文件头，之后所有连接（包括只读连接）都按 WAL 打开；
+        # 已是 WAL 时不再切换：切换要独占锁，另一个进程正在迁移时会直接报 database is locked
+        if self._writer.execute("PRAGMA journal_mode").fetchone()[0].lower() != "wal":
+            self._writer.execute("PRAGMA journal_mode=WAL")
+
+        self._local = threading.local()
+        self._write_lock = threading.Lock()
+        self._lock = threading.Lock()
+        self._stats = {"readers": 0, "transactions": 0}
+
+    def _connect(self, read_only=False):
+        # 写连接在主线程建好后只交给写线程使用；读连接按线程各自创建
+        conn = sqlite3.connect(self.path, check_same_thread=False, timeout=self.busy_timeout_ms / 1000)
+        conn.execute(f"PRAGMA busy_timeout={self.busy_timeout_ms}")
+        # WAL 下 NORMAL 只在检查点时 fsync，掉电最多丢最后几个事务，不会损坏数据库
+        conn.execute("PRAGMA synchronous=NORMAL")
+        conn.execute(f"PRAGMA cache_size=-{self.cache_kb}")
+        conn.execute("PRAGMA temp_store=MEMORY")
+        if read_only:
+            conn.execute("PRAGMA query_only=ON")
+        return conn
+
+    def migrate(self, schema):
+        """在写连接上补跑迁移"""
+        with self._write_lock:
+            return schema.migrate(self._writer)
+
+    # ---------- 读 ----------
+
+    def _reader(self):
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            conn = self._local.conn = self._connect(read_only=True)
+            with self._lock:
+                self._stats["readers"] += 1
+        return conn
+
+    def query(self, sql, params=()):
+        """在当前线程的只读连接上执行查询，返回全部行"""
+        return self._reader().execute(sql, params).fetchall()
+
+    # ---------- 写（共用一个写连接） ----------
+
+    def _transaction(self, work):
+        """work(conn) 在一个写事务里执行，返回其结果"""
+        with self._write_lock:
+            try:
+                # BEGIN IMMEDIATE 直接拿写锁，整批只 fsync 一次
+                self._writer.execute("BEGIN IMMEDIATE")
+                result = work(self._writer)
+                self._writer.commit()
+            except Exception:
+                if self._writer.in_transaction:
+                    self._writer.rollback()
+                raise
+        with self._lock:
+            self._stats["transactions"] += 1
+        return result
+
+    @staticmethod
+    def _apply(conn, rows):
+        """写入 annotations，跳过请求 ID 已在表里的行，返回跳过的条数"""
+        ids = [row[7] for row in rows if row[7] is not None]
+        applied = set()
+        if ids:
+            marks = ", ".join(["?"] * len(ids))
+            applied = {r[0] for r in conn.execute(
+                f"SELECT request_id FROM annotations WHERE request_id IN ({marks})", ids)}
+        fresh = [row for row in rows if row[7] is None or row[7] not in applied]
+        if fresh:
+            conn.executemany(UPSERT_SQL, fresh)
+        return len(rows) - len(fresh)
+
+    def write_batch(self, rows):
+        """
+        写线程调用：一个事务写完一批评分，返回因请求 ID 已在表里而跳过的条数。
+        rows 为 (user_id, group_id, image_name, s1, s2, s3, timestamp, request_id, dwell_ms, submitted_us,
+        queue_latency_ms)，request_id 可为 None。
+        """
+        return self._transaction(lambda conn: self._apply(conn, rows))
+
+    # ---------- 事件日志（见 event_log.py） ----------
+
+    def append_events(self, rows):
+        """顺序追加一批事件，返回因请求 ID 重复而忽略的条数"""
+        def work(conn):
+            before = conn.total_changes
+            conn.executemany(EVENT_INSERT_SQL, rows)
+            return len(rows) - (conn.total_changes - before)
+
+        return self._transaction(work)
+
+    def compact_events(self, limit):
+        """把水位线之后最多 limit 条事件合并进 annotations，返回 (处理的事件数, 跳过的重复数)"""
+        def work(conn):
+            c = conn.cursor()
+            watermark = read_watermark(c, "?")
+            events = c.execute(f"SELECT id, {EVENT_COLUMNS} FROM rating_events WHERE id > ? ORDER BY id LIMIT ?",
+                               (watermark, limit)).fetchall()
+            if not events:
+                return 0, 0
+            skipped = self._apply(conn, latest_per_key(events))
+            write_watermark(c, "?", events[-1][0])
+            return len(events), skipped
+
+        return self._transaction(work)
+
+    def uncompacted_images(self, user_id, group_id):
+        """已追加到事件日志、但还没合并进 annotations 的图片"""
+        rows = self.query(
+            "SELECT image_name FROM rating_events WHERE user_id = ? AND group_id = ? AND id > "
+            "(SELECT COALESCE(MAX(CAST(value AS INTEGER)), 0) FROM schema_meta WHERE name = ?)",
+            (user_id, group_id, EVENT_WATERMARK_KEY))
+        return {row[0] for row in rows}
+
+    def next_counter(self, name, initial_sql, params=()):
+        """
+        schema_meta 里名为 name 的计数器：返回当前值并加一。第一次使用时初值由 initial_sql 查出。
+        BEGIN IMMEDIATE 已拿到写锁，多个进程的读改写依次进行，不会拿到同一个值。
+        """
+        def work(conn):
+            conn.execute(f"INSERT OR IGNORE INTO schema_meta (name, value) SELECT ?, ({initial_sql})",
+                         (name, *params))
+            value = int(conn.execute("SELECT value FROM schema_meta WHERE name = ?", (name,)).fetchone()[0])
+            conn.execute("UPDATE schema_meta SET value = ? WHERE name = ?", (str(value + 1), name))
+            return value
+
+        return self._transaction(work)
+
+    def execute(self, sql, params=()):
+        """单条写语句，自成一个事务"""
+        self._transaction(lambda conn: conn.execute(sql, params))
+
+    def execute_many(self, sql, rows):
+        """同一条语句执行多组参数，在一个事务里完成"""
+        self._transaction(lambda conn: conn.executemany(sql, rows))
+
+    def metrics(self):
+        with self._lock:
+            return dict(self._stats)
+
+    def close(self):
+        with self._write_lock:
+            self._writer.close()
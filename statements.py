@@ -0,0 +1,183 @@
+import re
+import threading
+import time
+import weakref
+from collections import OrderedDict
+from functools import lru_cache
+
+
+# ================= 预编译语句 =================
+# MysqlStorage 的语句都经由这里执行：每个池连接按 SQL 文本缓存一个预编译游标
+# (cursor(prepared=True))，同一条语句在该连接上只 PREPARE 一次，之后只发参数，
+# 服务端不必每次重新解析、生成计划（TiDB 可命中 prepared plan cache）。
+# 服务端的预编译语句随会话失效：连接池重连或丢弃连接时清掉该连接的缓存 (forget)。
+# 批量写入的行数不同 SQL 文本就不同，各自预编译；每个连接最多缓存 max_per_connection 条，LRU 淘汰。
+# 注意 mysql.connector 按对象身份 (is) 判断是否要重新 PREPARE，执行时必须传回缓存里的那个字符串。
+
+_ROW_OF_PLACEHOLDERS = re.compile(r"\(%s(?:, %s)*\)")
+_REPEATED_GROUP = re.compile(r"(\((?:[^()]|\(\))*\))(?:, \1)+")
+
+
+@lru_cache(maxsize=1024)
+def statement_key(sql):
+    """统计用的语句名：压缩空白，"(%s, %s, ...)" 与重复的多行 VALUES / IN 列表折叠成一份"""
+    sql = " ".join(sql.split())
+    sql = _ROW_OF_PLACEHOLDERS.sub("(%s, ...)", sql)
+    return _REPEATED_GROUP.sub(r"\1", sql)
+
+
+def _close_quietly(cursor):
+    try:
+        cursor.close()
+    except Exception:
+        pass
+
+
+class PreparedStatements:
+    """
+    enabled: False 时退回普通文本协议游标（每次执行后关闭），统计照常。
+    max_per_connection: 每个连接缓存的预编译语句数上限。
+    """
+
+    def __init__(self, enabled=True, max_per_connection=64):
+        self.enabled = enabled
+        self.max_per_connection = max_per_connection
+        self._cursors = weakref.WeakKeyDictionary()  # 连接 -> OrderedDict(sql -> (sql, 游标))
+        self._lock = threading.Lock()
+        self._stats = {}  # 语句名 -> [执行次数, PREPARE 次数, 失败次数, 总毫秒, 最大毫秒]
+
+    def cursor(self, conn):
+        return StatementCursor(self, conn)
+
+    def _prepared_cursor(self, conn, sql):
+        """返回 (缓存里的 SQL 对象, 游标, 是否新建)"""
+        with self._lock:
+            per_conn = self._cursors.get(conn)
+            if per_conn is None:
+                per_conn = self._cursors[conn] = OrderedDict()
+            entry = per_conn.get(sql)
+            if entry is not None:
+                per_conn.move_to_end(sql)
+                return entry[0], entry[1], False
+
+        cursor = conn.cursor(prepared=True)
+        evicted = []
+        with self._lock:
+            per_conn[sql] = (sql, cursor)
+            while len(per_conn) > self.max_per_connection:
+                evicted.append(per_conn.popitem(last=False)[1][1])
+        # 同一会话内淘汰的语句要在服务端释放 (COM_STMT_CLOSE)
+        for old in evicted:
+            _close_quietly(old)
+        return sql, cursor, True
+
+    def _drop(self, conn, sql):
+        with self._lock:
+            entry = self._cursors.get(conn, {}).pop(sql, None)
+        if entry is not None:
+            _close_quietly(entry[1])
+
+    def forget(self, conn):
+        """连接重连 / 丢弃前调用：服务端的预编译语句已随旧会话失效，只丢掉本地游标"""
+        with self._lock:
+            self._cursors.pop(conn, None)
+
+    def execute(self, conn, sql, params=None):
+        """执行一条语句并取回全部结果，返回 (rows 或 None, rowcount)"""
+        t0 = time.perf_counter()
+        if self.enabled:
+            sql, cursor, prepared = self._prepared_cursor(conn, sql)
+        else:
+            cursor, prepared = conn.cursor(), False
+        try:
+            cursor.execute(sql, params)
+            rows = cursor.fetchall() if cursor.description else None
+            rowcount = cursor.rowcount
+        except Exception:
+            if self.enabled:
+                # 出错后游标状态不确定，下次重新 PREPARE
+                self._drop(conn, sql)
+            self._record(sql, t0, prepared, failed=True)
+            raise
+        finally:
+            if not self.enabled:
+                _close_quietly(cursor)
+        self._record(sql, t0, prepared)
+        return rows, rowcount
+
+    def _record(self, sql, t0, prepared, failed=False):
+        ms = (time.perf_counter() - t0) * 1000
+        key = statement_key(sql)
+        with self._lock:
+            stats = self._stats.get(key)
+            if stats is None:
+                stats = self._stats[key] = [0, 0, 0, 0.0, 0.0]
+            stats[0] += 1
+            stats[1] += prepared
+            stats[2] += failed
+            stats[3] += ms
+            stats[4] = max(stats[4], ms)
+
+    def report(self):
+        """每条语句一行，按总耗时降序"""
+        with self._lock:
+            items = [(key, list(stats)) for key, stats in self._stats.items()]
+        items.sort(key=lambda item: -item[1][3])
+        return [{
+            "statement": key,
+            "executions": count,
+            "prepares": prepares,
+            "errors": errors,
+            "mean_ms": round(total / count, 3),
+            "max_ms": round(worst, 3),
+            "total_ms": round(total, 2),
+        } for key, (count, prepares, errors, total, worst) in items]
+
+    def metrics(self):
+        with self._lock:
+            executions = sum(stats[0] for stats in self._stats.values())
+            prepares = sum(stats[1] for stats in self._stats.values())
+            return {
+                "enabled": self.enabled,
+                "statements": len(self._stats),
+                "cached": sum(len(per_conn) for per_conn in self._cursors.values()),
+                "executions": executions,
+                "prepares": prepares,
+                "reuse_ratio": round(1 - prepares / executions, 4) if executions else None,
+            }
+
+
+class StatementCursor:
+    """
+    DB-API 游标的子集 (execute / fetchone / fetchall / rowcount / close)，
+    现有按 c.execute(...) 写的代码（score_stats、event_log 等）不用改写。
+    每次 execute 都把结果取完，连接上不会留下未读的结果集。
+    """
+
+    def __init__(self, statements, conn):
+        self._statements = statements
+        self._conn = conn
+        self._rows = []
+        self._pos = 0
+        self.rowcount = -1
+
+    def execute(self, sql, params=None):
+        rows, self.rowcount = self._statements.execute(self._conn, sql, params)
+        self._rows = rows or []
+        self._pos = 0
+
+    def fetchone(self):
+        if self._pos >= len(self._rows):
+            return None
+        row = self._rows[self._pos]
+        self._pos += 1
+        return row
+
+    def fetchall(self):
+        rows = self._rows[self._pos:]
+        self._pos = len(self._rows)
+        return rows
+
+    def close(self):
+        self._rows = []
+        self._pos = 0
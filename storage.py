@@ -0,0 +1,644 @@
+import os
+import threading
+from abc import ABC, abstractmethod
+
+import streamlit as st
+
+import dwell
+from dedup import RequestDeduper
+from event_log import EVENT_COLUMNS, EVENT_WATERMARK_KEY, EventCompactor, latest_per_key, read_watermark, \
+    write_watermark
+from profiling import timed
+from progress import find_resume_index
+from quality import QualityMonitor
+from schema import mysql_schema, sqlite_schema
+from score_stats import ScoreAggregates, apply_ratings_to_stats, fetch_previous_ratings
+from write_queue import WriteBehindQueue
+
+
+# ================= 存储后端 =================
+# 各脚本只通过 Storage 读写评分，后端由配置选择：
+#   mysql  —— MySQL/TiDB，连接池 + 事务内维护增量统计
+#   sqlite —— 本地文件，WAL + 每线程只读连接
+#   memory —— 进程内字典，压测时排除数据库开销
+# 三者共用 write_queue.WriteBehindQueue 的攒批、去重和重试策略，
+# 写线程是唯一调用 write_batch 的地方（SQLite 的单写连接也因此成立）。
+# 重复的请求 ID 在入队前由 dedup.RequestDeduper 拦下，见 dedup.py。
+# 开启事件日志时写线程只追加 rating_events，由后台压缩线程合并进 annotations，见 event_log.py。
+# 去重后的每次提交同时交给 quality.QualityMonitor，流式计算评分员质量指标。
+# MySQL 后端的语句经 statements.PreparedStatements 在每个池连接上预编译复用。
+#
+# 选择顺序：环境变量 SCORE_STORAGE > secrets 的 [storage] backend > 脚本默认值。
+
+BACKENDS = ("mysql", "sqlite", "memory")
+
+# 拉丁方行号计数器在 schema_meta 里的键名前缀，每组一行
+ORDERING_ROW_KEY = "latin_row:"
+
+
+class Storage(ABC):
+    """
+    各后端必须实现下面标了 abstractmethod 的方法，其余逻辑共用。
+    event_options: 为 None 时直接写 annotations；否则为 EventCompactor 的参数，开启事件日志。
+    quality_options: QualityMonitor 的阈值参数。
+    """
+
+    name = "base"
+
+    def __init__(self, writer_options=None, dedup_size=10000, event_options=None, quality_options=None):
+        self.dedup = RequestDeduper(dedup_size)
+        self.quality = QualityMonitor(**(quality_options or {}))
+        self._submit_listeners = []
+        self.compactor = None
+        if event_options is not None:
+            self.compactor = EventCompactor(self._compact_events, **event_options)
+        # 事件日志保留每次修改，由压缩 (latest_per_key) 再合并成最新评分
+        self.writer = WriteBehindQueue(self._write_batch, collapse=self.compactor is None, **(writer_options or {}))
+
+    # ---------- 后端实现 ----------
+
+    def migrate(self):
+        """建表 / 补跑迁移，返回 schema 版本"""
+        return 0
+
+    @abstractmethod
+    def completed_images(self, user_id, group_id):
+        """本组已落库的图片名集合"""
+        raise NotImplementedError
+
+    @abstractmethod
+    def image_rating_counts(self, group_id):
+        """本组每张图已有的评分人数 {image_name: n}，没有评分的图不出现；见 assignment.py"""
+        raise NotImplementedError
+
+    @abstractmethod
+    def write_batch(self, rows):
+        """
+        在一个事务里写入去重后的 rows；只由写线程调用，失败时抛异常。
+        表里已有相同 request_id 的行要跳过，返回跳过的条数。
+        """
+        raise NotImplementedError
+
+    @abstractmethod
+    def append_events(self, rows):
+        """事件日志模式：在一个事务里追加 rows，返回因请求 ID 重复而忽略的条数"""
+        raise NotImplementedError
+
+    @abstractmethod
+    def compact_events(self, limit):
+        """把水位线之后最多 limit 条事件合并进 annotations，返回 (处理的事件数, 跳过的重复数)"""
+        raise NotImplementedError
+
+    @abstractmethod
+    def uncompacted_images(self, user_id, group_id):
+        """本组已追加到事件日志、还没合并进 annotations 的图片名集合"""
+        raise NotImplementedError
+
+    def load_ordering(self, user_id, group_id):
+        """已保存的图片顺序 (list)，没有时返回 None；见 ordering.py"""
+        return None
+
+    def save_ordering(self, user_id, group_id, order):
+        pass
+
+    def next_ordering_row(self, group_id):
+        """
+        原子地领取本组下一个拉丁方行号（0, 1, 2, ...），并发进入的评分员拿到不同的行；
+        计数器第一次使用时从本组已保存的顺序数开始。不支持时返回 None，由 ordering.py 按种子取行。
+        """
+        return None
+
+    def load_progress(self, user_id, group_id):
+        """共享进度表里的当前位置，没有记录时返回 None；见 progress_store.py"""
+        return None
+
+    def save_progress_many(self, rows):
+        """rows: [(user_id, group_id, position), ...]，一次写入"""
+        pass
+
+    def timing_report(self, by):
+        """按 group_id 或 user_id 汇总评分时长，见 dwell.py"""
+        return []
+
+    def statement_report(self):
+        """各 SQL 语句的执行次数与耗时；只有 MySQL 后端统计"""
+        return []
+
+    def backend_metrics(self):
+        return {}
+
+    def group_summary(self):
+        """各分组的评分统计；不维护统计的后端返回空"""
+        return {}
+
+    # ---------- 共用逻辑 ----------
+
+    def _write_batch(self, rows):
+        rows = dwell.with_queue_latency(rows)
+        if self.compactor is not None:
+            self.dedup.record_db_duplicates(self.append_events(rows))
+        else:
+            self.dedup.record_db_duplicates(self.write_batch(rows))
+
+    def _compact_events(self, limit):
+        count, skipped = self.compact_events(limit)
+        self.dedup.record_db_duplicates(skipped)
+        return count
+
+    def submit(self, record):
+        """
+        record 为 (user_id, group_id, image_name, s1, s2, s3, timestamp, request_id, dwell_ms, submitted_us)，
+        入队后立即返回 True；
+        request_id 最近已提交过时直接丢弃，返回 False。
+        """
+        return self.submit_many([record]) == 1
+
+    def submit_many(self, records):
+        """批量评分模式：一页的评分一起入队，由写线程在同一个事务里写入；返回实际入队的条数"""
+        fresh = [record for record in records if self.dedup.claim(record[7])]
+        try:
+            self.writer.submit_many(fresh)
+        except Exception:
+            for record in fresh:
+                self.dedup.release(record[7])
+            raise
+        if fresh:
+            self.quality.observe(fresh)
+            for listener in self._submit_listeners:
+                try:
+                    listener(fresh)
+                except Exception as e:
+                    print(f"Submit Listener Error: {e}")
+        return len(fresh)
+
+    def add_submit_listener(self, listener):
+        """listener(records) 在每次提交去重、入队后调用（如 assignment.AssignmentEngine.observe）"""
+        self._submit_listeners.append(listener)
+
+    def pending_images(self, user_id):
+        return self.writer.pending_images(user_id)
+
+    def user_status(self, user_id):
+        return self.writer.user_status(user_id)
+
+    @timed("get_resume_state")
+    def resume_state(self, user_id, group_id, img_list):
+        """
+        返回 (本组已完成张数, 第一张未评的下标)。
+        已提交但还在写入队列里的图片同样视为已完成。
+        """
+        try:
+            done = self.completed_images(user_id, group_id)
+            if self.compactor is not None:
+                done |= self.uncompacted_images(user_id, group_id)
+        except Exception as e:
+            print(f"Resume Query Error: {e}")
+            done = set()
+        done |= self.pending_images(user_id)
+        completed_count = sum(1 for name in img_list if name in done)
+        return completed_count, find_resume_index(img_list, done)
+
+    def metrics(self):
+        data = {"backend": self.name, "writer": self.writer.metrics(), "dedup": self.dedup.metrics(),
+                "quality": self.quality.metrics()}
+        if self.compactor is not None:
+            data["events"] = self.compactor.metrics()
+        data.update(self.backend_metrics())
+        return data
+
+    def close(self):
+        self.writer.close()
+        if self.compactor is not None:
+            self.compactor.close()
+
+
+class MysqlStorage(Storage):
+    name = "mysql"
+
+    REPLACE_PREFIX = ("REPLACE INTO annotations "
+                      "(user_id, group_id, image_name, score_content, score_aesthetic, score_quality, timestamp, "
+                      "request_id, dwell_ms, submitted_us, queue_latency_ms) VALUES ")
+    ROW_PLACEHOLDER = "(" + ", ".join(["%s"] * 11) + ")"
+    EVENT_INSERT_PREFIX = f"INSERT IGNORE INTO rating_events ({EVENT_COLUMNS}) VALUES "
+    # 自增 id 按分配顺序而不是提交顺序可见：只压缩写入已超过这么多秒的事件，
+    # 不越过可能仍在提交中的小 id
+    EVENT_SETTLE_SECONDS = 2
+
+    def __init__(self, pool, writer_options=None, dedup_size=10000, event_options=None, quality_options=None):
+        self.pool = pool
+        self.aggregates = ScoreAggregates()
+        super().__init__(writer_options, dedup_size, event_options, quality_options)
+
+    def migrate(self):
+        with self.pool.connection() as conn:
+            version = mysql_schema.migrate(conn)
+            # 统计表就绪后加载进程内缓存，页面可零查询读取
+            c = conn.cursor()
+            try:
+                self.aggregates.load(c)
+            except Exception as e:
+                print(f"Stats Load Error: {e}")
+            finally:
+                c.close()
+        return version
+
+    def completed_images(self, user_id, group_id):
+        # 走 (user_id, group_id, image_name) 覆盖索引，一次往返
+        with self.pool.connection() as conn:
+            c = self.pool.statements.cursor(conn)
+            c.execute("SELECT image_name FROM annotations WHERE user_id = %s AND group_id = %s",
+                      (user_id, group_id))
+            done = {row[0] for row in c.fetchall()}
+            c.close()
+        return done
+
+    def image_rating_counts(self, group_id):
+        with self.pool.connection() as conn:
+            c = self.pool.statements.cursor(conn)
+            c.execute("SELECT image_name, COUNT(*) FROM annotations WHERE group_id = %s GROUP BY image_name",
+                      (group_id,))
+            counts = dict(c.fetchall())
+            c.close()
+        return counts
+
+    def _transaction(self, work):
+        """work(cursor) 在一个事务里执行，返回其结果"""
+        with self.pool.connection() as conn:
+            conn.start_transaction()
+            c = self.pool.statements.cursor(conn)
+            try:
+                result = work(c)
+                conn.commit()
+            except Exception:
+                conn.rollback()
+                raise
+            finally:
+                c.close()
+        return result
+
+    def _apply(self, c, rows):
+        """
+        写入 annotations 并更新统计表，返回 (跳过的条数, 图片统计, 分组统计)。
+        旧评分、REPLACE 与统计表更新在同一个事务里，重评时统计不会算重。
+        """
+        previous = fetch_previous_ratings(c, rows)
+        # 表里已经是同一个请求 ID：这次提交别的进程 / 重启前已经写过
+        fresh = [row for row in rows
+                 if row[7] is None or previous.get((row[0], row[2]), (None,) * 5)[4] != row[7]]
+        image_updates = group_updates = {}
+        if fresh:
+            c.execute(self.REPLACE_PREFIX + ", ".join([self.ROW_PLACEHOLDER] * len(fresh)),
+                      [value for row in fresh for value in row])
+            image_updates, group_updates = apply_ratings_to_stats(c, fresh, previous)
+        return len(rows) - len(fresh), image_updates, group_updates
+
+    def write_batch(self, rows):
+        skipped, image_updates, group_updates = self._transaction(lambda c: self._apply(c, rows))
+        self.aggregates.merge(image_updates, group_updates)
+        return skipped
+
+    def append_events(self, rows):
+        def work(c):
+            c.execute(self.EVENT_INSERT_PREFIX + ", ".join([self.ROW_PLACEHOLDER] * len(rows)),
+                      [value for row in rows for value in row])
+            return len(rows) - c.rowcount
+
+        return self._transaction(work)
+
+    def compact_events(self, limit):
+        def work(c):
+            # 锁住水位线行，多个副本同时压缩时串行执行
+            watermark = read_watermark(c, "%s", for_update=True)
+            c.execute(f"SELECT id, {EVENT_COLUMNS}, logged_at <= NOW(6) - INTERVAL %s SECOND "
+                      "FROM rating_events WHERE id > %s ORDER BY id LIMIT %s",
+                      (self.EVENT_SETTLE_SECONDS, watermark, limit))
+            events = []
+            for row in c.fetchall():
+                if not row[-1]:
+                    break
+                events.append(row[:-1])
+            if not events:
+                return 0, 0, {}, {}
+            skipped, image_updates, group_updates = self._apply(c, latest_per_key(events))
+            write_watermark(c, "%s", events[-1][0])
+            return len(events), skipped, image_updates, group_updates
+
+        count, skipped, image_updates, group_updates = self._transaction(work)
+        self.aggregates.merge(image_updates, group_updates)
+        return count, skipped
+
+    def uncompacted_images(self, user_id, group_id):
+        with self.pool.connection() as conn:
+            c = self.pool.statements.cursor(conn)
+            c.execute("SELECT image_name FROM rating_events WHERE user_id = %s AND group_id = %s AND id > "
+                      "(SELECT COALESCE(MAX(CAST(value AS UNSIGNED)), 0) FROM schema_meta WHERE name = %s)",
+                      (user_id, group_id, EVENT_WATERMARK_KEY))
+            done = {row[0] for row in c.fetchall()}
+            c.close()
+        return done
+
+    def load_ordering(self, user_id, group_id):
+        with self.pool.connection() as conn:
+            c = self.pool.statements.cursor(conn)
+            c.execute("SELECT image_order FROM image_orders WHERE user_id = %s AND group_id = %s",
+                      (user_id, group_id))
+            row = c.fetchone()
+            c.close()
+        return row[0].split("\n") if row else None
+
+    def save_ordering(self, user_id, group_id, order):
+        with self.pool.connection() as conn:
+            c = self.pool.statements.cursor(conn)
+            c.execute("REPLACE INTO image_orders (user_id, group_id, image_order, created) VALUES (%s, %s, %s, NOW())",
+                      (user_id, group_id, "\n".join(order)))
+            c.close()
+
+    def next_ordering_row(self, group_id):
+        key = ORDERING_ROW_KEY + group_id
+
+        def work(c):
+            # 先补行再 FOR UPDATE：并发的第一次领取也会在这一行上排队
+            c.execute("INSERT IGNORE INTO schema_meta (name, value) "
+                      "SELECT %s, COUNT(*) FROM image_orders WHERE group_id = %s", (key, group_id))
+            c.execute("SELECT value FROM schema_meta WHERE name = %s FOR UPDATE", (key,))
+            row = int(c.fetchone()[0])
+            c.execute("UPDATE schema_meta SET value = %s WHERE name = %s", (str(row + 1), key))
+            return row
+
+        return self._transaction(work)
+
+    def load_progress(self, user_id, group_id):
+        with self.pool.connection() as conn:
+            c = self.pool.statements.cursor(conn)
+            c.execute("SELECT position FROM rater_progress WHERE user_id = %s AND group_id = %s", (user_id, group_id))
+            row = c.fetchone()
+            c.close()
+        return row[0] if row else None
+
+    def save_progress_many(self, rows):
+        with self.pool.connection() as conn:
+            c = self.pool.statements.cursor(conn)
+            c.execute("REPLACE INTO rater_progress (user_id, group_id, position, updated) VALUES "
+                      + ", ".join(["(%s, %s, %s, NOW())"] * len(rows)),
+                      [value for row in rows for value in row])
+            c.close()
+
+    def timing_report(self, by):
+        with self.pool.connection() as conn:
+            c = self.pool.statements.cursor(conn)
+            c.execute(dwell.report_sql(by))
+            rows = c.fetchall()
+            c.close()
+        return dwell.report_rows(rows, by)
+
+    def statement_report(self):
+        return self.pool.statements.report()
+
+    def backend_metrics(self):
+        return {"pool": self.pool.metrics()}
+
+    def group_summary(self):
+        return self.aggregates.group_summary()
+
+
+class SqliteStorage(Storage):
+    name = "sqlite"
+
+    def __init__(self, backend, writer_options=None, dedup_size=10000, event_options=None, quality_options=None):
+        self.backend = backend
+        super().__init__(writer_options, dedup_size, event_options, quality_options)
+
+    def migrate(self):
+        return self.backend.migrate(sqlite_schema)
+
+    def completed_images(self, user_id, group_id):
+        rows = self.backend.query("SELECT image_name FROM annotations WHERE user_id = ? AND group_id = ?",
+                                  (user_id, group_id))
+        return {row[0] for row in rows}
+
+    def image_rating_counts(self, group_id):
+        return dict(self.backend.query(
+            "SELECT image_name, COUNT(*) FROM annotations WHERE group_id = ? GROUP BY image_name", (group_id,)))
+
+    def write_batch(self, rows):
+        return self.backend.write_batch(rows)
+
+    def append_events(self, rows):
+        return self.backend.append_events(rows)
+
+    def compact_events(self, limit):
+        return self.backend.compact_events(limit)
+
+    def uncompacted_images(self, user_id, group_id):
+        return self.backend.uncompacted_images(user_id, group_id)
+
+    def load_ordering(self, user_id, group_id):
+        rows = self.backend.query("SELECT image_order FROM image_orders WHERE user_id = ? AND group_id = ?",
+                                  (user_id, group_id))
+        return rows[0][0].split("\n") if rows else None
+
+    def save_ordering(self, user_id, group_id, order):
+        self.backend.execute("INSERT OR REPLACE INTO image_orders (user_id, group_id, image_order, created) "
+                             "VALUES (?, ?, ?, datetime('now', 'localtime'))",
+                             (user_id, group_id, "\n".join(order)))
+
+    def next_ordering_row(self, group_id):
+        return self.backend.next_counter(ORDERING_ROW_KEY + group_id,
+                                         "SELECT COUNT(*) FROM image_orders WHERE group_id = ?", (group_id,))
+
+    def load_progress(self, user_id, group_id):
+        rows = self.backend.query("SELECT position FROM rater_progress WHERE user_id = ? AND group_id = ?",
+                                  (user_id, group_id))
+        return rows[0][0] if rows else None
+
+    def save_progress_many(self, rows):
+        self.backend.execute_many("INSERT OR REPLACE INTO rater_progress (user_id, group_id, position, updated) "
+                                  "VALUES (?, ?, ?, datetime('now', 'localtime'))", rows)
+
+    def timing_report(self, by):
+        return dwell.report_rows(self.backend.query(dwell.report_sql(by)), by)
+
+    def backend_metrics(self):
+        return {"sqlite": self.backend.metrics()}
+
+    def close(self):
+        super().close()
+        self.backend.close()
+
+
+class MemoryStorage(Storage):
+    """只保存在本进程内，重启即丢失；用于压测和本地调试"""
+
+    name = "memory"
+
+    def __init__(self, writer_options=None, dedup_size=10000, event_options=None, quality_options=None):
+        self._lock = threading.Lock()
+        self._rows = {}  # user_id -> {image_name: record}
+        self._orders = {}  # (user_id, group_id) -> list
+        self._ordering_rows = {}  # group_id -> 下一个拉丁方行号
+        self._progress = {}  # (user_id, group_id) -> position
+        self._events = []  # [(id, *record)]，id 从 1 连续递增
+        self._event_ids = set()
+        self._watermark = 0
+        super().__init__(writer_options, dedup_size, event_options, quality_options)
+
+    def completed_images(self, user_id, group_id):
+        with self._lock:
+            return {image for image, record in self._rows.get(user_id, {}).items() if record[1] == group_id}
+
+    def image_rating_counts(self, group_id):
+        counts = {}
+        with self._lock:
+            for per_user in self._rows.values():
+                for image, record in per_user.items():
+                    if record[1] == group_id:
+                        counts[image] = counts.get(image, 0) + 1
+        return counts
+
+    def write_batch(self, rows):
+        skipped = 0
+        with self._lock:
+            for record in rows:
+                per_user = self._rows.setdefault(record[0], {})
+                old = per_user.get(record[2])
+                if record[7] is not None and old is not None and old[7] == record[7]:
+                    skipped += 1
+                    continue
+                per_user[record[2]] = record
+        return skipped
+
+    def append_events(self, rows):
+        skipped = 0
+        with self._lock:
+            for record in rows:
+                if record[7] is not None and record[7] in self._event_ids:
+                    skipped += 1
+                    continue
+                self._event_ids.add(record[7])
+                self._events.append((len(self._events) + 1,) + tuple(record))
+        return skipped
+
+    def compact_events(self, limit):
+        # 只有压缩线程推进水位线
+        with self._lock:
+            events = self._events[self._watermark:self._watermark + limit]
+        if not events:
+            return 0, 0
+        skipped = self.write_batch(latest_per_key(events))
+        with self._lock:
+            self._watermark = events[-1][0]
+        return len(events), skipped
+
+    def uncompacted_images(self, user_id, group_id):
+        with self._lock:
+            return {e[3] for e in self._events[self._watermark:] if e[1] == user_id and e[2] == group_id}
+
+    def load_ordering(self, user_id, group_id):
+        with self._lock:
+            order = self._orders.get((user_id, group_id))
+            return list(order) if order is not None else None
+
+    def save_ordering(self, user_id, group_id, order):
+        with self._lock:
+            self._orders[(user_id, group_id)] = list(order)
+
+    def next_ordering_row(self, group_id):
+        with self._lock:
+            row = self._ordering_rows.get(group_id)
+            if row is None:
+                row = sum(1 for _, g in self._orders if g == group_id)
+            self._ordering_rows[group_id] = row + 1
+            return row
+
+    def load_progress(self, user_id, group_id):
+        with self._lock:
+            return self._progress.get((user_id, group_id))
+
+    def save_progress_many(self, rows):
+        with self._lock:
+            for user_id, group_id, position in rows:
+                self._progress[(user_id, group_id)] = position
+
+    def timing_report(self, by):
+        with self._lock:
+            records = [record for per_user in self._rows.values() for record in per_user.values()]
+        return dwell.report_rows(dwell.summarize(records, by), by)
+
+    def backend_metrics(self):
+        with self._lock:
+            return {"users": len(self._rows), "rows": sum(len(v) for v in self._rows.values()),
+                    "event_rows": len(self._events)}
+
+
+# ================= 按配置创建 =================
+
+def secrets_section(*path):
+    """读取 secrets 的某一节；没有 secrets.toml 或没有该节时返回空 dict"""
+    try:
+        section = st.secrets
+        for key in path:
+            section = section[key]
+        return dict(section)
+    except Exception:
+        return {}
+
+
+def writer_options(config):
+    """写入队列参数，键名与 README 中的 write_* 配置一致"""
+    return {
+        "maxsize": int(config.get("write_queue_size", 1000)),
+        "batch_size": int(config.get("write_batch_size", 50)),
+        "flush_interval": float(config.get("write_flush_interval", 0.2)),
+        "max_retries": int(config.get("write_max_retries", 5)),
+    }
+
+
+def event_options(config):
+    """事件日志参数；未开启时返回 None"""
+    if not config.get("event_log", False):
+        return None
+    return {
+        "interval": float(config.get("event_compact_interval", 5.0)),
+        "batch_size": int(config.get("event_compact_batch", 5000)),
+    }
+
+
+def quality_options(config):
+    """评分质量阈值，键名与 QualityMonitor 的参数一致；未配置的取默认值"""
+    casts = {"min_ratings": int, "min_raters": int, "straight_run": int, "max_users": int}
+    return {key: casts.get(key, float)(value) for key, value in config.items()}
+
+
+def create_storage(backend, sqlite_path="underwater_aesthetics.db"):
+    config = secrets_section("storage")
+    dedup_size = int(config.get("dedup_cache_size", 10000))
+    events = event_options(config)
+    quality = quality_options(secrets_section("quality"))
+    if backend == "mysql":
+        from db_pool import get_db_pool
+
+        return MysqlStorage(get_db_pool(), writer_options(secrets_section("connections", "tidb")), dedup_size,
+                            events, quality)
+    if backend == "sqlite":
+        from sqlite_backend import SqliteBackend
+
+        path = config.get("sqlite_path", sqlite_path)
+        return SqliteStorage(SqliteBackend(path, cache_kb=int(config.get("sqlite_cache_kb", 20000))),
+                             writer_options(config), dedup_size, events, quality)
+    if backend == "memory":
+        return MemoryStorage(writer_options(config), dedup_size, events, quality)
+    raise ValueError(f"未知的存储后端: {backend}（可选 {', '.join(BACKENDS)}）")
+
+
+@st.cache_resource
+def get_storage(default_backend="mysql", sqlite_path="underwater_aesthetics.db"):
+    """每个进程一个存储后端；首次创建时完成迁移"""
+    backend = os.environ.get("SCORE_STORAGE") or secrets_section("storage").get("backend") or default_backend
+    storage = create_storage(backend, sqlite_path)
+    try:
+        storage.migrate()
+    except Exception:
+        # 不缓存失败的实例，下次 rerun 重新创建
+        storage.close()
+        raise
+    return storage
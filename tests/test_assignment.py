@@ -0,0 +1,82 @@
+import time
+
+import pytest
+
+from assignment import AssignmentEngine
+from dedup import new_request_id
+from storage import MemoryStorage
+
+GROUP = "Group 1"
+IMAGES = ("a.jpg", "b.jpg", "c.jpg")
+
+
+@pytest.fixture
+def storage():
+    s = MemoryStorage()
+    yield s
+    s.close()
+
+
+def _save(storage, user_id, image_name):
+    storage.submit((user_id, GROUP, image_name, 60, 60, 60, "2024-01-01 00:00:00", new_request_id(), 1000,
+                    time.time_ns() // 1000))
+
+
+def test_concurrent_raters_get_different_images(storage):
+    engine = AssignmentEngine(storage, target=1)
+    assigned = {engine.next_image(user, GROUP, IMAGES) for user in ("u1", "u2", "u3")}
+    assert assigned == set(IMAGES)
+    # 都已预约满 target，第四个人没有可分配的图
+    assert engine.next_image("u4", GROUP, IMAGES) is None
+    assert engine.metrics()["exhausted"] == 1
+
+
+def test_reservation_expires(storage):
+    engine = AssignmentEngine(storage, target=1, reservation_ttl=0.05)
+    first = [engine.next_image(user, GROUP, IMAGES) for user in ("u1", "u2", "u3")]
+    assert engine.next_image("u4", GROUP, IMAGES) is None
+    time.sleep(0.1)
+    # 三个预约都超时退回，u4 拿到计数最少的图之一
+    assert engine.next_image("u4", GROUP, IMAGES) in first
+    assert engine.metrics()["expired"] == 3
+
+
+def test_saved_reservation_is_kept(storage):
+    engine = AssignmentEngine(storage, target=1, reservation_ttl=0.05)
+    image = engine.next_image("u1", GROUP, IMAGES)
+    _save(storage, "u1", image)
+    time.sleep(0.1)
+    # 保存后预约转为正式计数，超时也不退回
+    others = {engine.next_image(user, GROUP, IMAGES) for user in ("u2", "u3")}
+    assert others == set(IMAGES) - {image}
+    assert engine.metrics()["expired"] == 0
+
+
+def test_rater_exhausts_group(storage):
+    engine = AssignmentEngine(storage)
+    seen = []
+    for _ in IMAGES:
+        image = engine.next_image("u1", GROUP, IMAGES)
+        assert image not in seen
+        seen.append(image)
+        _save(storage, "u1", image)
+    # 评分员评完整组后不再分配；别人仍可分到
+    assert engine.next_image("u1", GROUP, IMAGES) is None
+    assert engine.next_image("u2", GROUP, IMAGES) in IMAGES
+
+
+def test_target_reached(storage):
+    engine = AssignmentEngine(storage, target=2)
+    for user in ("u1", "u2"):
+        for _ in IMAGES:
+            _save(storage, user, engine.next_image(user, GROUP, IMAGES))
+    assert engine.metrics()["groups"][GROUP]["below_target"] == 0
+    assert engine.next_image("u3", GROUP, IMAGES) is None
+
+
+def test_counts_load_from_storage(storage):
+    """引擎创建前已落库的评分在第一次分配时读入"""
+    _save(storage, "u1", "a.jpg")
+    storage.writer.flush()
+    engine = AssignmentEngine(storage)
+    assert engine.next_image("u2", GROUP, IMAGES) in ("b.jpg", "c.jpg")
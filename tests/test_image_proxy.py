@@ -0,0 +1,121 @@
+import os
+import threading
+import urllib.error
+import urllib.request
+
+import pytest
+
+from image_proxy import Origin, ProxyCache, serve, serve_stub_origin
+
+BODY = bytes(range(256)) * 40
+
+
+def _start(server):
+    threading.Thread(target=server.serve_forever, args=(0.05,), daemon=True).start()
+    host, port = server.server_address
+    return f"http://{host}:{port}/"
+
+
+@pytest.fixture
+def origin_root(tmp_path):
+    root = tmp_path / "origin"
+    (root / "g1").mkdir(parents=True)
+    (root / "g1" / "a.jpg").write_bytes(BODY)
+    return root
+
+
+@pytest.fixture
+def proxy(tmp_path, origin_root):
+    """返回 (代理地址, ProxyCache)；每个用例一个源站、一个代理、一个缓存目录"""
+    origin_server = serve_stub_origin(str(origin_root), port=0)
+    cache = ProxyCache(Origin(_start(origin_server)), cache_dir=str(tmp_path / "cache"))
+    proxy_server = serve(cache, host="127.0.0.1", port=0)
+    yield _start(proxy_server), cache
+    proxy_server.shutdown()
+    origin_server.shutdown()
+
+
+def _get(url, headers=None):
+    request = urllib.request.Request(url, headers=headers or {})
+    try:
+        with urllib.request.urlopen(request, timeout=10) as resp:
+            return resp.status, resp.headers, resp.read()
+    except urllib.error.HTTPError as e:
+        return e.code, e.headers, e.read()
+
+
+def test_miss_then_hit(proxy):
+    url, cache = proxy
+    status, headers, body = _get(url + "g1/a.jpg")
+    assert (status, headers["X-Cache"], body) == (200, "MISS", BODY)
+    status, headers, body = _get(url + "g1/a.jpg")
+    assert (status, headers["X-Cache"], body) == (200, "HIT", BODY)
+    assert cache.metrics()["misses"] == 1
+
+
+def test_conditional_request_returns_304(proxy):
+    url, _ = proxy
+    _, headers, _ = _get(url + "g1/a.jpg")
+    etag, last_modified = headers["ETag"], headers["Last-Modified"]
+    assert etag
+    status, headers, body = _get(url + "g1/a.jpg", {"If-None-Match": etag})
+    assert (status, body) == (304, b"")
+    assert headers["ETag"] == etag
+    status, _, body = _get(url + "g1/a.jpg", {"If-None-Match": '"other"'})
+    assert (status, body) == (200, BODY)
+    if last_modified:
+        status, _, _ = _get(url + "g1/a.jpg", {"If-Modified-Since": last_modified})
+        assert status == 304
+
+
+@pytest.mark.parametrize("header, expected", [
+    ("bytes=10-19", (10, 19)),
+    ("bytes=10000-", (10000, len(BODY) - 1)),
+    ("bytes=-100", (len(BODY) - 100, len(BODY) - 1)),
+    ("bytes=100-999999", (100, len(BODY) - 1)),
+])
+def test_range(proxy, header, expected):
+    url, _ = proxy
+    # 第一次 (MISS) 和第二次 (HIT) 走的是不同的读取路径
+    for _ in range(2):
+        status, headers, body = _get(url + "g1/a.jpg", {"Range": header})
+        start, end = expected
+        assert status == 206
+        assert headers["Content-Range"] == f"bytes {start}-{end}/{len(BODY)}"
+        assert body == BODY[start:end + 1]
+
+
+def test_unsatisfiable_range(proxy):
+    url, _ = proxy
+    status, headers, body = _get(url + "g1/a.jpg", {"Range": f"bytes={len(BODY)}-"})
+    assert status == 416
+    assert headers["Content-Range"] == f"bytes */{len(BODY)}"
+
+
+def test_revalidate_and_refresh(proxy, origin_root):
+    url, cache = proxy
+    cache.max_age = 0
+    _get(url + "g1/a.jpg")
+    status, headers, body = _get(url + "g1/a.jpg")
+    assert (status, headers["X-Cache"], body) == (200, "REVALIDATED", BODY)
+
+    # 源站内容变了（ETag 随 mtime / 大小变化）
+    path = origin_root / "g1" / "a.jpg"
+    path.write_bytes(b"new content")
+    os.utime(path, ns=(0, 10 ** 9))
+    status, headers, body = _get(url + "g1/a.jpg")
+    assert (status, headers["X-Cache"], body) == (200, "REFRESHED", b"new content")
+
+
+def test_query_string_shares_cache_entry(proxy):
+    url, cache = proxy
+    _get(url + "g1/a.jpg?v=1")
+    status, headers, body = _get(url + "g1/a.jpg?v=2")
+    assert (status, headers["X-Cache"], body) == (200, "HIT", BODY)
+    assert len(cache._key_locks) == 0
+
+
+def test_not_found_and_bad_path(proxy):
+    url, _ = proxy
+    assert _get(url + "g1/missing.jpg")[0] == 404
+    assert _get(url + "g1/../a.jpg")[0] == 400
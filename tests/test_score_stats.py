@@ -0,0 +1,63 @@
+import random
+import statistics
+
+import pytest
+
+from score_stats import RunningStats
+
+
+def _check(stats, samples):
+    assert stats.n == len(samples)
+    for i in range(3):
+        column = [s[i] for s in samples]
+        assert stats.mean[i] == pytest.approx(statistics.fmean(column) if column else 0.0, abs=1e-9)
+        expected = statistics.pvariance(column) if len(column) >= 2 else 0.0
+        assert stats.variance()[i] == pytest.approx(expected, abs=1e-6)
+
+
+def test_add_matches_pvariance():
+    rng = random.Random(0)
+    samples = [tuple(rng.randint(0, 100) for _ in range(3)) for _ in range(200)]
+    stats = RunningStats()
+    for s in samples:
+        stats.add(s)
+    _check(stats, samples)
+
+
+def test_remove_undoes_add():
+    """重评：随机撤销旧分、加入新分，每一步都与重新计算的结果一致"""
+    rng = random.Random(1)
+    samples = [tuple(rng.randint(0, 100) for _ in range(3)) for _ in range(50)]
+    stats = RunningStats()
+    for s in samples:
+        stats.add(s)
+    for _ in range(300):
+        old = samples.pop(rng.randrange(len(samples)))
+        stats.remove(old)
+        _check(stats, samples)
+        new = tuple(rng.randint(0, 100) for _ in range(3))
+        samples.append(new)
+        stats.add(new)
+        _check(stats, samples)
+
+
+def test_remove_down_to_empty():
+    samples = [(10, 20, 30), (40, 50, 60), (70, 80, 90)]
+    stats = RunningStats()
+    for s in samples:
+        stats.add(s)
+    while samples:
+        stats.remove(samples.pop())
+        _check(stats, samples)
+    stats.add((5, 5, 5))
+    _check(stats, [(5, 5, 5)])
+
+
+def test_values_round_trip():
+    stats = RunningStats()
+    for s in [(1, 2, 3), (4, 5, 6), (7, 8, 10)]:
+        stats.add(s)
+    copy = RunningStats.from_values(stats.to_values())
+    assert copy.n == stats.n
+    assert copy.mean == stats.mean
+    assert copy.m2 == stats.m2
@@ -0,0 +1,103 @@
+import threading
+import time
+
+from write_queue import WriteBehindQueue
+
+
+def _record(user_id, image_name, score=60, request_id=None):
+    return (user_id, "Group 1", image_name, score, score, score, "2024-01-01 00:00:00", request_id, 1000,
+            time.time_ns() // 1000)
+
+
+class Recorder:
+    """write_batch 替身：记下每批写入的行，前 fail_times 次抛异常"""
+
+    def __init__(self, fail_times=0):
+        self.batches = []
+        self.fail_times = fail_times
+        self.calls = 0
+
+    def __call__(self, rows):
+        self.calls += 1
+        if self.calls <= self.fail_times:
+            raise ConnectionError("db down")
+        self.batches.append(list(rows))
+
+
+def test_collapse_keeps_last_rating_per_image():
+    writer = Recorder()
+    q = WriteBehindQueue(writer, backoff=0.01)
+    q.submit_many([_record("u1", "a.jpg", 10), _record("u1", "b.jpg", 20), _record("u1", "a.jpg", 30)])
+    q.flush()
+    q.close()
+    rows = [row for batch in writer.batches for row in batch]
+    assert sorted((row[2], row[3]) for row in rows) == [("a.jpg", 30), ("b.jpg", 20)]
+    # 状态按提交的条数计，合并掉的那条也算已保存
+    assert q.user_status("u1") == {"pending": 0, "committed": 3, "failed": 0}
+
+
+def test_no_collapse_keeps_every_revision():
+    writer = Recorder()
+    q = WriteBehindQueue(writer, collapse=False, backoff=0.01)
+    q.submit_many([_record("u1", "a.jpg", 10), _record("u1", "a.jpg", 30)])
+    q.flush()
+    q.close()
+    assert [row[3] for batch in writer.batches for row in batch] == [10, 30]
+
+
+def test_retry_then_commit():
+    writer = Recorder(fail_times=2)
+    q = WriteBehindQueue(writer, max_retries=3, backoff=0.01)
+    q.submit(_record("u1", "a.jpg"))
+    q.flush()
+    q.close()
+    assert len(writer.batches) == 1
+    metrics = q.metrics()
+    assert (metrics["retries"], metrics["committed"], metrics["failed"]) == (2, 1, 0)
+    assert metrics["save_latency_avg_ms"] is not None
+
+
+def test_give_up_marks_failed_until_saved_again():
+    writer = Recorder(fail_times=3)
+    q = WriteBehindQueue(writer, max_retries=2, backoff=0.01)
+    q.submit(_record("u1", "a.jpg"))
+    q.flush()
+    assert q.user_status("u1") == {"pending": 0, "committed": 0, "failed": 1}
+    assert q.pending_images("u1") == set()
+    # 重新评分保存成功后不再算失败
+    q.submit(_record("u1", "a.jpg"))
+    q.flush()
+    q.close()
+    assert q.user_status("u1") == {"pending": 0, "committed": 1, "failed": 0}
+
+
+def test_pending_until_written():
+    release = threading.Event()
+    q = WriteBehindQueue(lambda rows: release.wait(5), backoff=0.01)
+    q.submit(_record("u1", "a.jpg"))
+    assert q.pending_images("u1") == {"a.jpg"}
+    release.set()
+    q.flush()
+    q.close()
+    assert q.pending_images("u1") == set()
+
+
+def test_user_status_is_bounded():
+    q = WriteBehindQueue(Recorder(), max_users=3, backoff=0.01)
+    for i in range(10):
+        q.submit(_record(f"u{i}", "a.jpg"))
+    q.flush()
+    q.close()
+    assert len(q._users) == 3
+    assert q.user_status("u9")["committed"] == 1
+    assert q.user_status("u0")["committed"] == 0
+
+
+def test_close_times_out_on_stuck_writer():
+    stuck = threading.Event()
+    q = WriteBehindQueue(lambda rows: stuck.wait(10), backoff=0.01)
+    q.submit(_record("u1", "a.jpg"))
+    t0 = time.monotonic()
+    q.close(timeout=0.5)
+    assert time.monotonic() - t0 < 2
+    stuck.set()
@@ -0,0 +1,240 @@
+import atexit
+import queue
+import threading
+import time
+from collections import OrderedDict
+
+
+# ================= 后台批量写入 (Write-Behind) =================
+# 评分先进入内存队列立即返回，由后台线程攒批后交给存储后端一次性写入。
+# 攒批、去重和重试策略在这里统一实现，各后端 (storage.py) 只提供 write_batch。
+
+
+class WriteBehindQueue:
+    """
+    有界队列 + 单个后台写线程。
+    record 固定为 (user_id, group_id, image_name, s1, s2, s3, timestamp, request_id, dwell_ms, submitted_us)。
+    write_batch: 后端的批量写入函数，在一个事务里写完去重后的 rows，失败时抛异常。
+    batch_size: 一次 write_batch 最多写入的行数。
+    flush_interval: 攒批的最长等待秒数。
+    max_retries / backoff: 写入失败时的重试次数与初始退避秒数（指数增长）。
+    collapse: 同一 (user_id, image_name) 在一批内只写最后一次评分；事件日志要保留每次修改，传 False。
+    max_users: 按用户记的已保存 / 失败状态最多保留这么多用户，按 LRU 淘汰。
+    """
+
+    def __init__(self, write_batch, maxsize=1000, batch_size=50, flush_interval=0.2,
+                 max_retries=5, backoff=0.2, submit_timeout=5, collapse=True, max_users=5000):
+        self._write_batch = write_batch
+        self._queue = queue.Queue(maxsize=maxsize)
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        self.max_retries = max_retries
+        self.backoff = backoff
+        self.submit_timeout = submit_timeout
+        self.collapse = collapse
+        self.max_users = max_users
+
+        self._lock = threading.Lock()
+        self._pending = {}    # user_id -> {image_name: 尚未落库的次数}
+        # user_id -> [已保存条数, {保存失败、之后也没再保存成功的 image_name}]
+        self._users = OrderedDict()
+        self._stats = {"submitted": 0, "committed": 0, "batches": 0, "retries": 0, "failed": 0}
+        # 从提交 (submitted_us) 到事务提交成功的毫秒数：[条数, 总和, 最大值]
+        self._save_latency = [0, 0.0, 0.0]
+        self._closed = False
+
+        self._thread = threading.Thread(target=self._run, name="annotations-writer", daemon=True)
+        self._thread.start()
+        atexit.register(self.close)
+
+    # ---------- 前台接口 ----------
+
+    def submit(self, record):
+        """登记为 pending 后入队，立即返回；队列满时最多阻塞 submit_timeout 秒。"""
+        self.submit_many([record])
+
+    def submit_many(self, records):
+        """一次提交多条评分（批量评分模式），保证落在同一个 write_batch 里。"""
+        if self._closed:
+            raise RuntimeError("写入队列已关闭")
+        records = list(records)
+        if not records:
+            return
+        with self._lock:
+            for record in records:
+                per_user = self._pending.setdefault(record[0], {})
+                per_user[record[2]] = per_user.get(record[2], 0) + 1
+            self._stats["submitted"] += len(records)
+        try:
+            self._queue.put(records, timeout=self.submit_timeout)
+        except queue.Full:
+            with self._lock:
+                self._unmark_pending(records)
+            raise RuntimeError("写入队列已满，请稍后再试")
+
+    def pending_images(self, user_id):
+        with self._lock:
+            return set(self._pending.get(user_id, ()))
+
+    def user_status(self, user_id):
+        """某个用户的 pending / committed / failed 条数"""
+        with self._lock:
+            committed, failed = self._users.get(user_id, (0, ()))
+            return {
+                "pending": len(self._pending.get(user_id, ())),
+                "committed": committed,
+                "failed": len(failed),
+            }
+
+    def metrics(self):
+        with self._lock:
+            data = dict(self._stats)
+            count, total, worst = self._save_latency
+        data["save_latency_avg_ms"] = round(total / count, 2) if count else None
+        data["save_latency_max_ms"] = round(worst, 2)
+        data["queued"] = self._queue.qsize()
+        return data
+
+    def flush(self):
+        """阻塞直到当前队列里的记录全部处理完（成功或放弃）。"""
+        self._queue.join()
+
+    def close(self, timeout=30):
+        """停止接收新记录，把剩余记录写完后退出后台线程；最多等 timeout 秒，写线程卡在重试时不阻塞退出。"""
+        if self._closed:
+            return
+        self._closed = True
+        deadline = time.monotonic() + timeout
+        try:
+            self._queue.put(None, timeout=timeout)
+        except queue.Full:
+            print(f"写入队列关闭超时 ({timeout}s)，{self._queue.qsize()} 批评分未写入")
+            return
+        self._thread.join(max(0.0, deadline - time.monotonic()))
+        if self._thread.is_alive():
+            print(f"写入线程未在 {timeout}s 内结束，{self._queue.qsize()} 批评分未写入")
+
+    # ---------- 后台线程 ----------
+
+    def _run(self):
+        # 队列里每一项是一次提交的记录列表；一次提交不会被拆到两个批次里
+        while True:
+            item = self._queue.get()
+            if item is None:
+                self._drain()
+                self._queue.task_done()
+                return
+            batch = list(item)
+            items = 1
+            deadline = time.monotonic() + self.flush_interval
+            stop = False
+            while len(batch) < self.batch_size:
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    break
+                try:
+                    item = self._queue.get(timeout=remaining)
+                except queue.Empty:
+                    break
+                if item is None:
+                    stop = True
+                    break
+                batch.extend(item)
+                items += 1
+
+            self._write_with_retry(batch)
+            for _ in range(items):
+                self._queue.task_done()
+            if stop:
+                # 哨兵之后不会再有新记录，把残留的写完再退出
+                self._drain()
+                self._queue.task_done()
+                return
+
+    def _drain(self):
+        items = []
+        while True:
+            try:
+                items.append(self._queue.get_nowait())
+            except queue.Empty:
+                break
+        batch = []
+        for item in items:
+            batch.extend(item)
+            if len(batch) >= self.batch_size:
+                self._write_with_retry(batch)
+                batch = []
+        if batch:
+            self._write_with_retry(batch)
+        for _ in items:
+            self._queue.task_done()
+
+    def _write_with_retry(self, batch):
+        rows = batch
+        if self.collapse:
+            # 同一 (user_id, image_name) 在一批内只保留最后一次评分
+            latest = {}
+            for record in batch:
+                latest[(record[0], record[2])] = record
+            rows = list(latest.values())
+
+        delay = self.backoff
+        for attempt in range(self.max_retries + 1):
+            try:
+                self._write_batch(rows)
+                self._mark_committed(batch)
+                return
+            except Exception as e:
+                if attempt == self.max_retries:
+                    print(f"DB Write Error (放弃 {len(rows)} 条): {e}")
+                    self._mark_failed(batch)
+                    return
+                with self._lock:
+                    self._stats["retries"] += 1
+                time.sleep(delay)
+                delay *= 2
+
+    def _unmark_pending(self, batch):
+        for record in batch:
+            user_id, image_name = record[0], record[2]
+            per_user = self._pending.get(user_id)
+            if per_user is None or image_name not in per_user:
+                continue
+            per_user[image_name] -= 1
+            if per_user[image_name] <= 0:
+                del per_user[image_name]
+            if not per_user:
+                del self._pending[user_id]
+
+    def _user(self, user_id):
+        # 只在 self._lock 内调用
+        entry = self._users.get(user_id)
+        if entry is None:
+            entry = self._users[user_id] = [0, set()]
+            while len(self._users) > self.max_users:
+                self._users.popitem(last=False)
+        self._users.move_to_end(user_id)
+        return entry
+
+    def _mark_committed(self, batch):
+        now_us = time.time_ns() // 1000
+        latencies = [(now_us - record[9]) / 1000 for record in batch if record[9] is not None]
+        with self._lock:
+            if latencies:
+                self._save_latency[0] += len(latencies)
+                self._save_latency[1] += sum(latencies)
+                self._save_latency[2] = max(self._save_latency[2], max(latencies))
+            self._unmark_pending(batch)
+            for record in batch:
+                entry = self._user(record[0])
+                entry[0] += 1
+                entry[1].discard(record[2])
+            self._stats["committed"] += len(batch)
+            self._stats["batches"] += 1
+
+    def _mark_failed(self, batch):
+        with self._lock:
+            self._unmark_pending(batch)
+            for record in batch:
+                self._user(record[0])[1].add(record[2])
+            self._stats["failed"] += len(batch)